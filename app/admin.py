@@ -1,6 +1,12 @@
 from django.contrib import admin
 from django.contrib.auth.models import Group
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from .changelists import (
+    AutocompleteRelatedFilter,
+    EstimatedCountMixin,
+    IndexedSearchMixin,
+    autocomplete_filter_media,
+)
 from .forms import CustomUserChangeForm, PatientUserCreationForm, ClinicHistCreation, StaffUserCreationForm
 
 from .models import (
@@ -11,7 +17,7 @@ from .models import (
     Patient
 )
 
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(EstimatedCountMixin, IndexedSearchMixin, BaseUserAdmin):
     # The forms to add and change user instances
     form = CustomUserChangeForm
     add_form = StaffUserCreationForm
@@ -38,7 +44,7 @@ class UserAdmin(BaseUserAdmin):
             },
         ),
     ]
-    search_fields = ["email"]
+    search_fields = ["^email", "^last_name"]
     ordering = ["email"]
     filter_horizontal = []
 
@@ -50,26 +56,37 @@ admin.site.unregister(Group)
 
 
 @admin.register(Calendar)
-class CalendarAdmin(admin.ModelAdmin):
+class CalendarAdmin(EstimatedCountMixin, admin.ModelAdmin):
     list_display = ('id', 'patient', 'prof')
+    list_select_related = ('patient', 'prof')
+    autocomplete_fields = ('patient', 'prof')
+    raw_id_fields = ('cal_events',)
 
 @admin.register(ClinicalHistory)
-class ClinicAdmin(admin.ModelAdmin):
+class ClinicAdmin(EstimatedCountMixin, admin.ModelAdmin):
+    # The form's autocomplete widgets pick the professional and patient.
     form = ClinicHistCreation
     list_display = ('id',)
-    raw_id_fields = ('prof', 'patient')
 
 @admin.register(Staff)
-class StaffAdmin(admin.ModelAdmin):
+class StaffAdmin(EstimatedCountMixin, IndexedSearchMixin, admin.ModelAdmin):
     form = CustomUserChangeForm
     add_form = StaffUserCreationForm
     model = Staff
     list_display = ('id', 'first_name','last_name', 'is_active')
+    search_fields = ('^last_name', '^email')
+    ordering = ('last_name', 'first_name', 'id')
 
 @admin.register(Patient)
-class PatientAdmin(admin.ModelAdmin):
+class PatientAdmin(EstimatedCountMixin, IndexedSearchMixin, admin.ModelAdmin):
     form = CustomUserChangeForm
     add_form = PatientUserCreationForm
     model = Patient
-    list_display = ('id', 'first_name', 'last_name','social_sec_number', 'is_active')
-    list_filter = ('prof_in_charge', 'is_active')
+    list_display = ('id', 'first_name', 'last_name','social_sec_number', 'prof_in_charge', 'is_active')
+    list_select_related = ('prof_in_charge',)
+    list_filter = (('prof_in_charge', AutocompleteRelatedFilter), 'is_active')
+    search_fields = ('^last_name', '^email', '=social_sec_number')
+
+    @property
+    def media(self):
+        return super().media + autocomplete_filter_media()
@@ -0,0 +1,86 @@
+"""
+Autocomplete for patient and staff choices.
+
+A ``ModelChoiceField`` renders every row of its queryset as an ``<option>``.
+``AutocompleteSelect`` renders only the selected row and leaves the rest to
+``static/js/autocomplete.js``, which fetches matches page by page from the
+JSON endpoints below as the user types. Validating a submitted form still
+runs one ``queryset.get(pk=...)`` for the submitted value.
+
+Both endpoints answer ``{"results": [{"id", "text"}], "next": cursor}`` and
+are paginated by keyset, like the patient directory:
+
+* patients come from ``directory.search`` (name prefix, exact SSN or exact
+  e-mail), ordered by name;
+* staff are matched on a prefix of ``Upper(last_name)`` or ``Upper(email)``,
+  both indexed on CustomUser, and ordered by last name.
+"""
+from django import forms
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce, Upper
+from django.urls import reverse
+
+from . import directory
+from .models import Staff
+
+PAGE_SIZE = 20
+
+
+class AutocompleteSelect(forms.Select):
+    """A select of a ModelChoiceField that loads its options from ``url_name``."""
+
+    class Media:
+        js = ['js/autocomplete.js']
+
+    def __init__(self, url_name, attrs=None):
+        super().__init__(attrs)
+        self.url_name = url_name
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocomplete-url'] = reverse(self.url_name)
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        # Only the selected rows, instead of iterating the whole queryset.
+        field = self.choices.field
+        selected = {str(v) for v in value if v not in field.empty_values}
+        options = []
+        if field.empty_label is not None:
+            options.append(self.create_option(name, '', field.empty_label, not selected, 0))
+        if selected:
+            key = field.to_field_name or 'pk'
+            for obj in field.queryset.filter(**{f'{key}__in': selected}):
+                options.append(self.create_option(
+                    name, field.prepare_value(obj), field.label_from_instance(obj), True, len(options),
+                ))
+        return [(None, options, 0)]
+
+
+def patient_page(query, cursor=None, limit=PAGE_SIZE):
+    """One page of patient choices and the cursor of the next one; raises ValueError for a bad cursor."""
+    entries, next_cursor = directory.search(query, cursor=cursor, limit=limit)
+    return [
+        {'id': entry.patient_id, 'text': f'{directory.full_name(entry.first_name, entry.last_name)} <{entry.email}>'}
+        for entry in entries
+    ], next_cursor
+
+
+def staff_page(query, cursor=None, limit=PAGE_SIZE):
+    """One page of staff choices and the cursor of the next one; raises ValueError for a bad cursor."""
+    staff = Staff.objects.filter(is_active=True).alias(
+        upper_last_name=Upper('last_name'), upper_email=Upper('email'),
+    ).annotate(sort_name=Coalesce(Upper('last_name'), Value(''))).order_by('sort_name', 'pk')
+    query = ' '.join(query.split()).upper()
+    if query:
+        staff = staff.filter(
+            Q(upper_last_name__gte=query, upper_last_name__lt=query + '\U0010ffff')
+            | Q(upper_email__gte=query, upper_email__lt=query + '\U0010ffff')
+        )
+    if cursor:
+        name, pk = directory.decode_cursor(cursor)
+        staff = staff.filter(Q(sort_name__gt=name) | Q(sort_name=name, pk__gt=pk))
+
+    page = list(staff[:limit + 1])
+    next_cursor = directory.encode_key(page[limit - 1].sort_name, page[limit - 1].pk) if len(page) > limit else None
+    return [{'id': prof.pk, 'text': f'{prof.get_full_name()} <{prof.email}>'} for prof in page[:limit]], next_cursor
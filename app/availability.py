@@ -0,0 +1,124 @@
+"""
+Free-slot search for a professional's calendar.
+
+The busy intervals of a Staff member over the requested range are loaded with
+one indexed range query, then walked once alongside the working-hour windows
+to carve out the free gaps. Results are cached per professional and dropped
+whenever one of their events or calendar entries changes (see signals.py).
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .caching import bump_version, versioned_key
+
+CACHE_NAMESPACE = 'availability'
+
+
+def parse_working_hours(value):
+    """Parse ``"09:00-17:00"`` into a pair of ``datetime.time``."""
+    opening, closing = value.split('-')
+    return time.fromisoformat(opening.strip()), time.fromisoformat(closing.strip())
+
+
+def default_options():
+    return {
+        'working_hours': parse_working_hours(settings.CLINIC_WORKING_HOURS),
+        'workdays': tuple(settings.CLINIC_WORKDAYS),
+        'slot_minutes': settings.CLINIC_SLOT_MINUTES,
+    }
+
+
+def busy_intervals(prof, start, end):
+    """Return the sorted ``(start, end)`` pairs of ``prof`` events touching ``[start, end)``."""
+    from .models import CalendarEvent
+
+    return list(
+        CalendarEvent.objects.filter(prof=prof, start_time__lt=end, end_time__gt=start)
+        .order_by('start_time')
+        .values_list('start_time', 'end_time')
+    )
+
+
+def working_windows(start_date, end_date, working_hours, workdays, tz=None):
+    """Yield the ``(opening, closing)`` datetimes of every workday in the range, inclusive."""
+    tz = tz or timezone.get_current_timezone()
+    opening, closing = working_hours
+    day = start_date
+    while day <= end_date:
+        if day.weekday() in workdays:
+            yield (
+                datetime.combine(day, opening, tzinfo=tz),
+                datetime.combine(day, closing, tzinfo=tz),
+            )
+        day += timedelta(days=1)
+
+
+def compute_free_slots(windows, busy, slot_length):
+    """
+    Merge the sorted working ``windows`` with the sorted ``busy`` intervals
+    and split every free gap into ``slot_length`` slots aligned on the window
+    opening. Both inputs are consumed in a single forward pass.
+    """
+    slots = []
+    i = 0
+    for opening, closing in windows:
+        # Busy intervals that ended before this window are irrelevant from now on.
+        while i < len(busy) and busy[i][1] <= opening:
+            i += 1
+        cursor = opening
+        j = i
+        while cursor < closing:
+            if j < len(busy) and busy[j][0] < closing:
+                gap_end = max(busy[j][0], cursor)
+                next_cursor = max(busy[j][1], cursor)
+                j += 1
+            else:
+                gap_end = closing
+                next_cursor = closing
+            # Align the first slot of the gap on the window's slot grid.
+            offset = (cursor - opening) % slot_length
+            slot_start = cursor if not offset else cursor + (slot_length - offset)
+            while slot_start + slot_length <= gap_end:
+                slots.append((slot_start, slot_start + slot_length))
+                slot_start += slot_length
+            cursor = next_cursor
+    return slots
+
+
+def free_slots(prof, start_date, end_date, slot_minutes=None, working_hours=None, workdays=None, not_before=None):
+    """
+    Return the free ``(start, end)`` slots of ``prof`` between ``start_date``
+    and ``end_date`` (both inclusive dates). Slots starting before
+    ``not_before`` are dropped.
+    """
+    options = default_options()
+    slot_minutes = slot_minutes or options['slot_minutes']
+    working_hours = working_hours or options['working_hours']
+    workdays = tuple(workdays if workdays is not None else options['workdays'])
+
+    key = versioned_key(
+        CACHE_NAMESPACE, prof.pk, start_date, end_date, slot_minutes,
+        working_hours[0], working_hours[1], ''.join(map(str, workdays)),
+    )
+    slots = cache.get(key)
+    if slots is None:
+        windows = list(working_windows(start_date, end_date, working_hours, workdays))
+        if windows:
+            busy = busy_intervals(prof, windows[0][0], windows[-1][1])
+            slots = compute_free_slots(windows, busy, timedelta(minutes=slot_minutes))
+        else:
+            slots = []
+        cache.set(key, slots, settings.AVAILABILITY_CACHE_TIMEOUT)
+
+    if not_before is not None:
+        slots = [slot for slot in slots if slot[0] >= not_before]
+    return slots
+
+
+def invalidate(prof_id):
+    """Drop every cached availability result of a professional."""
+    if prof_id is not None:
+        bump_version(CACHE_NAMESPACE, prof_id)
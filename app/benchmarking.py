@@ -0,0 +1,148 @@
+"""
+Small helpers shared by the ``bench_*`` management commands.
+
+Benchmarks seed their own data inside a transaction that is rolled back at the
+end, so they can be pointed at a development database without leaving rows
+behind. The HTTP benchmarks instead serve the project from a subprocess, see
+``serve`` and ``wait_for``.
+"""
+import socket
+import time
+from itertools import accumulate
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from importlib import import_module
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.management.base import CommandError
+from django.db import transaction
+
+FIRST_NAMES = [
+    'james', 'mary', 'john', 'patricia', 'robert', 'jennifer', 'michael', 'linda', 'william', 'elizabeth',
+    'david', 'barbara', 'richard', 'susan', 'joseph', 'jessica', 'thomas', 'sarah', 'charles', 'karen',
+    'lucia', 'mateo', 'sofia', 'santiago', 'valentina', 'martina', 'benjamin', 'emma', 'joaquin', 'julieta',
+]
+SYLLABLES = ['al', 'ber', 'car', 'dor', 'es', 'fer', 'gar', 'her', 'ix', 'jo', 'ki', 'lo', 'mar', 'nez',
+             'or', 'pe', 'qui', 'ro', 'san', 'tor', 'ur', 'va', 'well', 'xi', 'ya', 'zo']
+
+# Accounts created by ``seed_bench`` and used by ``loadtest``.
+SEED_DOMAIN = 'bench.example.com'
+SEED_PASSWORD = 'Bench-passw0rd-42'
+
+
+def seed_email(kind, number):
+    """E-mail of the ``number``-th seeded ``kind`` ('doctor', 'patient' or 'admin')."""
+    return f'{kind}{number}@{SEED_DOMAIN}'
+
+
+def surname_pool(rng, size=5000):
+    """
+    Return ``(surnames, cum_weights)`` for ``rng.choices``: made-up surnames
+    with Zipf-like frequencies, as in real populations.
+    """
+    surnames = sorted({rng.choice(SYLLABLES) + rng.choice(SYLLABLES) + rng.choice(SYLLABLES) for _ in range(size)})
+    return surnames, list(accumulate(1 / (rank + 1) for rank in range(len(surnames))))
+
+
+@contextmanager
+def rolled_back(using=None):
+    """Run the block in a transaction that is always rolled back."""
+    with transaction.atomic(using=using):
+        yield
+        transaction.set_rollback(True, using=using)
+
+
+def timed(func, *args, **kwargs):
+    """Call ``func`` and return ``(result, elapsed_seconds)``."""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of ``samples`` (``pct`` in 0-100)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(samples):
+    """Return count, mean and p50/p95/p99 of a list of durations in seconds."""
+    count = len(samples)
+    return {
+        'count': count,
+        'mean_ms': (sum(samples) / count * 1000) if count else 0.0,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+    }
+
+
+def login_session(user):
+    """Save a session logged in as ``user`` and return it, for HTTP clients outside the test client."""
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return session
+
+
+class PooledWSGIServer(WSGIServer):
+    """wsgiref with a fixed set of worker threads, like gunicorn's gthread workers."""
+
+    # Hundreds of clients connect at once; the default backlog of 5 would refuse them.
+    request_queue_size = 1024
+
+    def __init__(self, *args, threads, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.executor = ThreadPoolExecutor(threads)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve(server, port, threads=4):
+    """Serve the project on 127.0.0.1 until killed, through wsgi.py (wsgiref) or asgi.py (uvicorn)."""
+    if server == 'asgi':
+        import uvicorn
+
+        from patient_management.asgi import application
+        uvicorn.run(application, host='127.0.0.1', port=port, log_level='warning', backlog=1024)
+        return
+
+    from patient_management.wsgi import application
+    httpd = PooledWSGIServer(('127.0.0.1', port), QuietHandler, threads=threads)
+    httpd.set_app(application)
+    httpd.serve_forever()
+
+
+def wait_for(port, process, timeout=30):
+    """Wait until the server ``process`` accepts connections on ``port``."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError("The benchmark server exited; see its output above.")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise CommandError(f"The benchmark server did not listen on port {port} within {timeout}s.")
@@ -0,0 +1,75 @@
+"""
+Batched inserts for models using multi-table inheritance.
+
+``QuerySet.bulk_create`` refuses models such as Patient and Staff because each
+row spans the ``app_customuser`` parent table and the child table. These
+helpers insert the parent rows with ``bulk_create`` (which returns their
+primary keys on PostgreSQL and SQLite >= 3.35), then the child rows with one
+multi-row INSERT per batch, the same low-level insert ``Model.save`` issues
+for each table.
+
+``bulk_insert_raw`` serves seeding, where rows must keep the timestamps they
+are generated with.
+"""
+from django.db import NotSupportedError, connections, router
+
+
+def bulk_create_inherited(model, objs, batch_size=None, using=None):
+    """
+    Insert unsaved instances of ``model``, a direct multi-table child of a
+    concrete parent, in batches. Primary keys are set on ``objs``.
+
+    Like ``bulk_create``, no ``save()`` is called and no signals are sent.
+    Callers are expected to run this inside a transaction.
+    """
+    objs = list(objs)
+    if not objs:
+        return objs
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    if not connection.features.can_return_rows_from_bulk_insert:
+        raise NotSupportedError(
+            f"{connection.vendor} cannot return primary keys from bulk inserts."
+        )
+
+    (parent, parent_link), = model._meta.parents.items()
+    parent_fields = [f for f in parent._meta.concrete_fields if not f.primary_key]
+    parents = [
+        parent(**{f.attname: getattr(obj, f.attname) for f in parent_fields})
+        for obj in objs
+    ]
+    parent._base_manager.using(using).bulk_create(parents, batch_size=batch_size)
+
+    for obj, parent_obj in zip(objs, parents):
+        setattr(obj, parent_link.attname, parent_obj.pk)
+        setattr(obj, parent._meta.pk.attname, parent_obj.pk)
+
+    fields = model._meta.local_concrete_fields
+    max_batch = connection.ops.bulk_batch_size(fields, objs)
+    batch_size = min(batch_size, max_batch) if batch_size else max_batch
+    for start in range(0, len(objs), batch_size):
+        model._base_manager._insert(objs[start:start + batch_size], fields=fields, using=using)
+
+    for obj in objs:
+        obj._state.adding = False
+        obj._state.db = using
+    return objs
+
+
+def bulk_insert_raw(model, objs, batch_size=None, using=None):
+    """
+    Insert unsaved instances of ``model`` with the values they carry, for
+    seeding history. Unlike ``bulk_create``, ``pre_save`` is skipped, so
+    ``auto_now_add`` fields keep the timestamps set on ``objs``. Primary keys
+    are not fetched.
+    """
+    objs = list(objs)
+    if not objs:
+        return objs
+    using = using or router.db_for_write(model)
+    fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+    max_batch = connections[using].ops.bulk_batch_size(fields, objs)
+    batch_size = min(batch_size, max_batch) if batch_size else max_batch
+    for start in range(0, len(objs), batch_size):
+        model._base_manager._insert(objs[start:start + batch_size], fields=fields, using=using, raw=True)
+    return objs
@@ -0,0 +1,42 @@
+"""
+Versioned cache keys.
+
+Instead of tracking and deleting every cached entry that depends on an object,
+entries embed a per-object version number in their key. Bumping the version
+makes all of them unreachable at once; the stale entries simply expire.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def _version_key(namespace, ident):
+    return f'{namespace}:version:{ident}'
+
+
+def get_version(namespace, ident):
+    """Return the current version of ``namespace``/``ident``, creating it if needed."""
+    key = _version_key(namespace, ident)
+    version = cache.get(key)
+    if version is None:
+        # Seed with a clock value so that an evicted counter never restarts at
+        # a number that stale entries were stored under.
+        version = time.time_ns() // 1000
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(namespace, ident):
+    """Invalidate every entry cached under ``namespace``/``ident``."""
+    key = _version_key(namespace, ident)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns() // 1000, None)
+
+
+def versioned_key(namespace, ident, *parts):
+    """Build a cache key tied to the current version of ``namespace``/``ident``."""
+    suffix = ':'.join(str(part) for part in parts)
+    return f'{namespace}:{ident}:{get_version(namespace, ident)}:{suffix}'
@@ -0,0 +1,116 @@
+"""
+Conditional GET and shared caching for the public pages: home, login, signup.
+
+Only requests without cookies, or with nothing but the CSRF cookie, are
+handled here; anything else (a session, messages) renders as before.
+
+* ``public_page``: the page is the same for every such visitor. It gets an
+  ETag naming the release, Last-Modified (the newest template) and
+  ``Cache-Control: public, max-age=PUBLIC_PAGE_MAX_AGE``, which lets the
+  proxy_cache in nginx/nginx.conf keep it in memory and answer it without
+  reaching Django.
+* ``public_form_page``: the page embeds a CSRF token, valid only with the
+  visitor's own csrftoken cookie, so it must never be shared. Its ETag adds
+  a hash of that cookie and it stays ``private``: a returning visitor's
+  browser revalidates its copy and gets a 304, whose token is still valid.
+  There is no Last-Modified, which would survive a rotated cookie.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.dispatch import receiver
+from django.utils.autoreload import file_changed
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .warmup import template_names, templates_root
+
+
+_modified = None
+
+
+def templates_modified():
+    """Modification time of the newest template, read once per process."""
+    global _modified
+    if _modified is None:
+        root = templates_root()
+        _modified = datetime.fromtimestamp(
+            max((root / name).stat().st_mtime for name in template_names()), timezone.utc,
+        )
+    return _modified
+
+
+@receiver(file_changed, dispatch_uid='app.conditional.template_changed')
+def template_changed(sender, file_path, **kwargs):
+    # runserver reloads edited templates without restarting; the ETags follow.
+    global _modified
+    if file_path.suffix == '.html':
+        _modified = None
+
+
+def release():
+    return settings.RELEASE_ID or format(int(templates_modified().timestamp()), 'x')
+
+
+def is_public(request):
+    return request.method in ('GET', 'HEAD') and set(request.COOKIES) <= {settings.CSRF_COOKIE_NAME}
+
+
+def _page_etag(request, *args, **kwargs):
+    return release() if is_public(request) else None
+
+
+def _page_modified(request, *args, **kwargs):
+    return templates_modified() if is_public(request) else None
+
+
+def _form_page_etag(request, *args, **kwargs):
+    # Set by CsrfViewMiddleware from a valid cookie only.
+    secret = request.META.get('CSRF_COOKIE')
+    if not is_public(request) or not secret:
+        return None
+    return f'{release()}-{hashlib.sha256(secret.encode()).hexdigest()[:16]}'
+
+
+def _share(request, response):
+    if is_public(request) and response.status_code in (200, 304):
+        patch_cache_control(response, public=True, max_age=settings.PUBLIC_PAGE_MAX_AGE)
+    else:
+        patch_cache_control(response, private=True)
+    return response
+
+
+def _keep_private(request, response):
+    if is_public(request) and response.status_code in (200, 304):
+        # Replaces the never_cache headers of LoginView: the form holds nothing
+        # before it is posted, and the browser may keep its copy to revalidate.
+        response.headers.pop('Expires', None)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _decorate(view, etag_func, last_modified_func, finish):
+    view = condition(etag_func, last_modified_func)(view)
+
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            return finish(request, await view(request, *args, **kwargs))
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return finish(request, view(request, *args, **kwargs))
+    return wrapper
+
+
+def public_page(view):
+    """For views rendering the same page to every anonymous visitor; sync or async."""
+    return _decorate(view, _page_etag, _page_modified, _share)
+
+
+def public_form_page(view):
+    """For anonymous views rendering a form with a CSRF token; sync or async."""
+    return _decorate(view, _form_page_etag, None, _keep_private)
@@ -0,0 +1,75 @@
+"""
+Denormalized unread-message counters.
+
+Every change to a message's read state or recipient goes through ``adjust``
+in the same transaction as the change itself, so the counter rolls back with
+it. Signals cover saves and deletes; code issuing bulk ``update()`` calls on
+Message must adjust the counters itself, as ``inbox.mark_read`` does.
+``manage.py rebuild_unread_counters`` recomputes everything from scratch.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Message, UnreadCounter
+
+
+def count_unread(staff_id):
+    return Message.objects.filter(recipient_id=staff_id, is_read=False).count()
+
+
+def unread_count(staff_id):
+    """Read the counter of ``staff_id`` with a single primary-key lookup."""
+    return UnreadCounter.objects.filter(pk=staff_id).values_list('unread', flat=True).first() or 0
+
+
+def adjust(staff_id, delta):
+    """Add ``delta`` to the counter of ``staff_id``, creating it on first use."""
+    if staff_id is None or not delta:
+        return
+    if UnreadCounter.objects.filter(pk=staff_id).update(unread=F('unread') + delta):
+        return
+    # No counter yet: seed it from the table, which already reflects this change.
+    with transaction.atomic():
+        _, created = UnreadCounter.objects.get_or_create(
+            staff_id=staff_id, defaults={'unread': count_unread(staff_id)}
+        )
+    if not created:
+        UnreadCounter.objects.filter(pk=staff_id).update(unread=F('unread') + delta)
+
+
+def message_saved(message, created):
+    unread = not message.is_read
+    if created:
+        adjust(message.recipient_id, 1 if unread else 0)
+    else:
+        was_unread = not getattr(message, '_loaded_is_read', message.is_read)
+        old_recipient_id = getattr(message, '_loaded_recipient_id', message.recipient_id)
+        if old_recipient_id == message.recipient_id:
+            adjust(message.recipient_id, unread - was_unread)
+        else:
+            adjust(old_recipient_id, -was_unread)
+            adjust(message.recipient_id, int(unread))
+    message._loaded_is_read = message.is_read
+    message._loaded_recipient_id = message.recipient_id
+
+
+def message_deleted(message):
+    if not getattr(message, '_loaded_is_read', message.is_read):
+        adjust(getattr(message, '_loaded_recipient_id', message.recipient_id), -1)
+
+
+def rebuild():
+    """Recompute every counter with one aggregate query. Returns the number of counters written."""
+    counts = (
+        Message.objects.filter(is_read=False, recipient__isnull=False)
+        .values('recipient')
+        .annotate(unread=Count('id'))
+        .values_list('recipient', 'unread')
+    )
+    counters = [UnreadCounter(staff_id=staff_id, unread=unread) for staff_id, unread in counts]
+    with transaction.atomic():
+        UnreadCounter.objects.exclude(pk__in=[counter.staff_id for counter in counters]).update(unread=0)
+        UnreadCounter.objects.bulk_create(
+            counters, batch_size=1000, update_conflicts=True, unique_fields=['staff'], update_fields=['unread'],
+        )
+    return len(counters)
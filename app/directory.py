@@ -0,0 +1,173 @@
+"""
+Maintenance and queries of the PatientDirectory read model.
+
+Rows are upserted from signals whenever a patient, or the name of their
+professional, changes (see signals). Bulk writes that bypass signals, such as
+``import_patients``, call ``refresh`` themselves, and ``manage.py
+rebuild_patient_directory`` recreates the whole table from scratch.
+
+Lists are ordered by ``(sort_name, patient_id)`` and paginated by keyset on
+that pair, so every page is a range scan of ``patientdir_name_idx`` (or
+``patientdir_prof_name_idx`` for one professional's patients), whatever the
+page number.
+"""
+import base64
+import json
+
+from django.db import transaction
+
+from .models import Patient, PatientDirectory, Staff
+
+PAGE_SIZE = 50
+MAX_SSN = 2 ** 31 - 1
+
+# Columns that, when saved, require the directory row to be refreshed.
+PATIENT_FIELDS = {
+    'first_name', 'last_name', 'email', 'date_of_birth', 'social_sec_number', 'is_active', 'prof_in_charge',
+}
+UPSERT_FIELDS = [
+    'first_name', 'last_name', 'sort_name', 'email', 'date_of_birth', 'social_sec_number', 'prof', 'prof_name',
+    'is_active',
+]
+_COLUMNS = (
+    'pk', 'first_name', 'last_name', 'email', 'date_of_birth', 'social_sec_number', 'is_active',
+    'prof_in_charge_id', 'prof_in_charge__first_name', 'prof_in_charge__last_name',
+)
+
+
+def full_name(first_name, last_name):
+    return ' '.join(part for part in (first_name, last_name) if part)
+
+
+def sort_name(first_name, last_name):
+    return f'{last_name or ""} {first_name or ""}'.strip().lower()
+
+
+def _entry(pk, first_name, last_name, email, date_of_birth, ssn, is_active, prof_id, prof_first, prof_last):
+    return PatientDirectory(
+        patient_id=pk,
+        first_name=first_name or '',
+        last_name=last_name or '',
+        sort_name=sort_name(first_name, last_name),
+        email=email,
+        date_of_birth=date_of_birth,
+        social_sec_number=ssn,
+        prof_id=prof_id,
+        prof_name=full_name(prof_first, prof_last),
+        is_active=is_active,
+    )
+
+
+def _upsert(entries, batch_size=1000):
+    PatientDirectory.objects.bulk_create(
+        entries, batch_size=batch_size, update_conflicts=True, unique_fields=['patient'], update_fields=UPSERT_FIELDS,
+    )
+
+
+## MAINTENANCE ##
+def sync_patient(patient):
+    """Upsert the directory row of a saved ``patient``."""
+    prof_first = prof_last = None
+    if patient.prof_in_charge_id:
+        if Patient.prof_in_charge.is_cached(patient):
+            prof_first, prof_last = patient.prof_in_charge.first_name, patient.prof_in_charge.last_name
+        else:
+            prof_first, prof_last = (
+                Staff.objects.filter(pk=patient.prof_in_charge_id).values_list('first_name', 'last_name').first()
+                or (None, None)
+            )
+    _upsert([_entry(
+        patient.pk, patient.first_name, patient.last_name, patient.email, patient.date_of_birth,
+        patient.social_sec_number, patient.is_active, patient.prof_in_charge_id, prof_first, prof_last,
+    )])
+
+
+def rename_prof(staff):
+    """Copy a professional's current name to the rows of their patients."""
+    PatientDirectory.objects.filter(prof_id=staff.pk).update(prof_name=full_name(staff.first_name, staff.last_name))
+
+
+def refresh(patient_ids, batch_size=500):
+    """Re-read and upsert the rows of ``patient_ids``. Returns the number written."""
+    patient_ids = list(patient_ids)
+    written = 0
+    for i in range(0, len(patient_ids), batch_size):
+        rows = Patient.objects.filter(pk__in=patient_ids[i:i + batch_size]).values_list(*_COLUMNS)
+        entries = [_entry(*row) for row in rows]
+        _upsert(entries)
+        written += len(entries)
+    return written
+
+
+def rebuild(batch_size=2000):
+    """Recreate the whole directory. Returns the number of rows written."""
+    rows = Patient.objects.order_by('pk').values_list(*_COLUMNS).iterator(chunk_size=batch_size)
+    written = 0
+    with transaction.atomic():
+        PatientDirectory.objects.all().delete()
+        batch = []
+        for row in rows:
+            batch.append(_entry(*row))
+            if len(batch) >= batch_size:
+                PatientDirectory.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        PatientDirectory.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+## QUERIES ##
+def encode_key(name, pk):
+    """An opaque cursor for the keyset ``(name, pk)``; read back by ``decode_cursor``."""
+    raw = json.dumps([name, pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def encode_cursor(entry):
+    return encode_key(entry.sort_name, entry.patient_id)
+
+
+def decode_cursor(cursor):
+    """Return ``(sort_name, patient_id)``; raises ValueError for a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        name, pk = json.loads(raw)
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(name, str) or not isinstance(pk, int):
+        raise ValueError('Invalid cursor')
+    return name, pk
+
+
+def search(query='', prof_id=None, cursor=None, limit=PAGE_SIZE, active_only=True):
+    """
+    One page of the directory and the cursor of the next page (or None).
+
+    ``query`` is matched as an exact social security number when it is all
+    digits, as an exact e-mail address when it contains ``@``, and otherwise as
+    a prefix of "last first" name.
+    """
+    entries = PatientDirectory.objects.order_by('sort_name', 'patient_id')
+    if active_only:
+        entries = entries.filter(is_active=True)
+    if prof_id is not None:
+        entries = entries.filter(prof_id=prof_id)
+
+    query = ' '.join(query.split())
+    if query.isdigit() and int(query) <= MAX_SSN:
+        entries = entries.filter(social_sec_number=int(query))
+    elif '@' in query:
+        entries = entries.filter(email=query)
+    elif query:
+        # A range instead of LIKE, so the name index is used on every backend.
+        query = query.lower()
+        entries = entries.filter(sort_name__gte=query, sort_name__lt=query + '\U0010ffff')
+
+    if cursor:
+        name, pk = decode_cursor(cursor)
+        entries = entries.filter(sort_name__gte=name).exclude(sort_name=name, patient_id__lte=pk)
+
+    page = list(entries[:limit + 1])
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return page[:limit], next_cursor
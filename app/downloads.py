@@ -0,0 +1,120 @@
+"""
+Authorized file delivery.
+
+Behind nginx (``settings.MEDIA_ACCEL_REDIRECT`` set), Django only checks
+permissions and answers with an ``X-Accel-Redirect`` header; nginx then
+serves the file from an ``internal`` location with sendfile and range support,
+so no file data passes through Python.
+
+Without nginx, ``ranged_file_response`` streams the file from disk in
+fixed-size chunks and honours single ``Range: bytes=`` requests, so memory use
+stays constant whatever the file size.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from django.views.static import serve
+
+CHUNK_SIZE = 64 * 1024
+# MEDIA_ROOT directory only reachable through the authorized download view.
+PROTECTED_MEDIA = 'clinic'
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def accel_redirect_response(field_file, filename):
+    """Hand the transfer of ``field_file`` over to nginx."""
+    response = HttpResponse()
+    response['Content-Type'] = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT.rstrip('/') + '/' + quote(field_file.name)
+    return response
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range ``Range`` header into inclusive ``(start, end)``.
+
+    Returns None when the header is absent or uses a form we do not serve
+    (multiple ranges), in which case the whole file is sent. Raises ValueError
+    for unsatisfiable ranges.
+    """
+    match = _RANGE_RE.match(header or '')
+    if match is None:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        # Suffix range: the final N bytes.
+        start = max(size - int(last), 0)
+        end = size - 1
+    else:
+        return None
+    if start > end or start >= size:
+        raise ValueError('Unsatisfiable range')
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def ranged_file_response(request, field_file, filename):
+    """Stream ``field_file`` from local storage, honouring a single byte range."""
+    path = field_file.path
+    size = os.path.getsize(path)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    try:
+        byte_range = parse_range(request.headers.get('Range'), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        # FileResponse uses the server's sendfile support when available.
+        response = FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(_read_range(path, start, length), status=206, content_type=content_type)
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def file_response(request, field_file, filename=None):
+    """Deliver ``field_file`` through nginx when configured, else stream it."""
+    filename = filename or os.path.basename(field_file.name)
+    if settings.MEDIA_ACCEL_REDIRECT:
+        return accel_redirect_response(field_file, filename)
+    return ranged_file_response(request, field_file, filename)
+
+
+def serve_public_media(request, path):
+    """
+    Development server for MEDIA_ROOT (DEBUG only), minus the clinical files.
+    The path is normalized first, as ``serve`` does, so ``//clinic/`` or
+    ``./clinic/`` cannot get around the check.
+    """
+    name = posixpath.normpath(path).lstrip('/')
+    if name.split('/', 1)[0] == PROTECTED_MEDIA:
+        raise Http404
+    return serve(request, name, document_root=settings.MEDIA_ROOT)
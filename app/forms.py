@@ -1,22 +1,27 @@
+from asgiref.sync import sync_to_async
 from django import forms
 from django.contrib.auth.forms import (
     UserCreationForm,
     UserChangeForm,
     ReadOnlyPasswordHashField
     )
+from django.db import transaction
 from django.forms import ValidationError
 
+from .autocomplete import AutocompleteSelect
+from .hashing import ahash_password, hash_password
 from .models import (
     CustomUser,
     ClinicalHistory,
     Patient,
     Staff,
     Calendar,
-    CalendarEvent,
     Message
     )
 
 class CustomUserCreationForm(UserCreationForm):
+    role = 'doctor'
+
     password1 = forms.CharField(label="Password", widget=forms.PasswordInput)
     password2 = forms.CharField(
         label="Password confirmation", widget=forms.PasswordInput
@@ -45,14 +50,36 @@ class CustomUserCreationForm(UserCreationForm):
             raise ValidationError("Passwords don't match")
         return password2
 
+    def set_password_and_save(self, user, password_field_name="password1", commit=True):
+        # The only place the password gets hashed, on the bounded hashing pool.
+        user.password = hash_password(self.cleaned_data[password_field_name])
+        user._password = self.cleaned_data[password_field_name]
+        if commit:
+            user.save()
+        return user
+
     def save(self, commit=True):
         user = super().save(commit=False)
-        user.set_password(self.cleaned_data["password1"])
-        user.role = 'doctor'
+        user.role = self.role
         if commit:
             user.save()
         return user
 
+    async def asave(self):
+        """Like save(), but awaits the hash instead of blocking the event loop."""
+        user = self.instance
+        user.password = await ahash_password(self.cleaned_data["password1"])
+        user._password = self.cleaned_data["password1"]
+        user.role = self.role
+        await sync_to_async(self._save_user)(user)
+        return user
+
+    @staticmethod
+    def _save_user(user):
+        # One transaction for the user rows and the directory, search and profile updates of its signals.
+        with transaction.atomic():
+            user.save()
+
 class StaffUserCreationForm(CustomUserCreationForm):
     class Meta:
         model = Staff
@@ -64,16 +91,10 @@ class StaffUserCreationForm(CustomUserCreationForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['license'].widget.attrs.update({'placeholder': 'License', 'class': 'form-control'})
-        
-    def save(self, commit=True):
-        user = super().save(commit=False)
-        user.set_password(self.cleaned_data["password1"])
-        user.role = 'doctor'
-        if commit:
-            user.save()
-        return user
 
 class PatientUserCreationForm(CustomUserCreationForm):
+    role = 'patient'
+
     class Meta:
         model = Patient
         fields = ['first_name', 'last_name', 'date_of_birth', 'email', 'password1', 'password2', 'social_sec_number']
@@ -85,14 +106,6 @@ class PatientUserCreationForm(CustomUserCreationForm):
         super().__init__(*args, **kwargs)
         self.fields['social_sec_number'].widget.attrs.update({'placeholder': 'Social Security Number', 'class': 'form-control'})
 
-    def save(self, commit=True):
-        user = super().save(commit=False)
-        user.set_password(self.cleaned_data["password1"])
-        user.role = 'patient'
-        if commit:
-            user.save()
-        return user
-
 
 class CustomUserChangeForm(UserChangeForm):
     """A form for updating users. Includes all the fields on
@@ -107,19 +120,24 @@ class CustomUserChangeForm(UserChangeForm):
         fields = ["email", "password", "date_of_birth", "first_name", "last_name", "is_active", "is_admin"]
 
 class ClinicHistCreation(forms.ModelForm):
-    model = ClinicalHistory
-    fields = '__all__'
-
-    prof = forms.ModelChoiceField(queryset=Staff.objects.all())
-    patient = forms.ModelChoiceField(queryset=Patient.objects.all())
+    class Meta:
+        model = ClinicalHistory
+        fields = '__all__'
+        widgets = {
+            'prof': AutocompleteSelect('staff_autocomplete'),
+            'patient': AutocompleteSelect('patient_autocomplete'),
+        }
 
 class CalendarCreation(forms.ModelForm):
-    model = Calendar
-    fields = '__all__'
-
-    cal_events = forms.ModelChoiceField(queryset=CalendarEvent.objects.all())
-    prof = forms.ModelChoiceField(queryset=Staff.objects.all())
-    patient = forms.ModelChoiceField(queryset=Patient.objects.all())
+    class Meta:
+        model = Calendar
+        fields = '__all__'
+        widgets = {
+            # Events are picked by id, as in the admin's raw id fields.
+            'cal_events': forms.NumberInput(attrs={'placeholder': 'Event ID', 'class': 'form-control'}),
+            'prof': AutocompleteSelect('staff_autocomplete'),
+            'patient': AutocompleteSelect('patient_autocomplete'),
+        }
 
 # class AppointmentRequestForm(forms.ModelForm):
 #     class Meta:
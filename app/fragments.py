@@ -0,0 +1,79 @@
+"""
+Per-user cached template fragments.
+
+``{% cached_fragment "name" %}...{% endcached_fragment %}`` (see
+templatetags/fragments.py) stores the rendered block in the default cache
+under a key versioned per user. Whatever a fragment shows about a user (their
+name, unread messages, appointments) changes through a Message, Calendar,
+CalendarEvent or user save, and the signals then call ``invalidate`` for the
+users concerned, so the next render misses and stores a fresh copy.
+Fragments that depend on the clock, such as upcoming appointments, are at most
+``settings.FRAGMENT_CACHE_TIMEOUT`` seconds old.
+
+Hits and misses are counted per process (``stats``) and per request in the
+instrumentation records, when that is enabled.
+
+``{% shared_fragment "name" %}`` is for blocks that are the same for every
+user of a template, such as the role sidebars: with TEMPLATE_PRODUCTION they
+are rendered once per process and kept in memory, without a cache lookup.
+"""
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import instrumentation
+from .caching import bump_version, versioned_key
+
+NAMESPACE = 'fragment'
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+_shared = {}
+
+
+def invalidate(*user_ids):
+    """Drop every cached fragment of ``user_ids``."""
+    for user_id in set(user_ids):
+        if user_id is not None:
+            bump_version(NAMESPACE, user_id)
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+    instrumentation.count_cache(outcome == 'hits')
+
+
+def stats():
+    """Hits and misses of this process since it started."""
+    with _stats_lock:
+        return {'hits': _stats['hits'], 'misses': _stats['misses']}
+
+
+def get_or_render(user_id, name, render):
+    """The cached fragment ``name`` of ``user_id``, rendering and storing it on a miss."""
+    timeout = settings.FRAGMENT_CACHE_TIMEOUT
+    if not timeout or user_id is None:
+        return render()
+    key = versioned_key(NAMESPACE, user_id, name)
+    content = cache.get(key)
+    if content is not None:
+        _count('hits')
+        return content
+    _count('misses')
+    content = render()
+    cache.set(key, content, timeout)
+    return content
+
+
+def get_or_render_shared(name, render):
+    """The fragment ``name``, rendered once per process and shared by every user."""
+    if not settings.TEMPLATE_PRODUCTION:
+        # Template edits show up without a restart.
+        return render()
+    content = _shared.get(name)
+    if content is None:
+        content = _shared[name] = render()
+    return content
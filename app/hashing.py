@@ -0,0 +1,41 @@
+"""
+Password hashing off the request thread.
+
+PBKDF2 is deliberately slow. Running it on a bounded pool caps how many
+hashes run at once per worker process, and lets async views await the result
+instead of blocking the event loop. ``hashlib`` releases the GIL while
+hashing, so the default thread pool hashes in parallel.
+"""
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                workers = settings.PASSWORD_HASH_WORKERS
+                if settings.PASSWORD_HASH_EXECUTOR == 'process':
+                    _executor = ProcessPoolExecutor(workers, initializer=django.setup)
+                else:
+                    _executor = ThreadPoolExecutor(workers, thread_name_prefix='password-hash')
+    return _executor
+
+
+def hash_password(raw_password):
+    """Hash ``raw_password`` on the pool and wait for the result."""
+    return get_executor().submit(make_password, raw_password).result()
+
+
+async def ahash_password(raw_password):
+    """Hash ``raw_password`` on the pool without blocking the event loop."""
+    return await asyncio.wrap_future(get_executor().submit(make_password, raw_password))
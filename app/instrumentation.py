@@ -0,0 +1,186 @@
+"""
+Per-request cost instrumentation.
+
+When ``settings.INSTRUMENTATION_ENABLED`` is set, ``InstrumentationMiddleware``
+measures for each request:
+
+* the number of SQL queries and the time spent in them, through a database
+  execute wrapper installed on every connection;
+* the time spent rendering templates, through the ``DjangoTemplates``
+  backend below;
+* hits and misses of the per-user fragment cache (see app.fragments);
+* the wall time of the whole request.
+
+Measurements are keyed by the resolved URL name, appended as JSON lines to
+``settings.INSTRUMENTATION_LOG`` and echoed in a ``Server-Timing`` header.
+``manage.py query_report`` aggregates the log and lists the worst offenders.
+
+The current request's counters live in a context variable, which Django
+copies into the threads running sync code for async views, so async views
+are measured too. Outside an instrumented request the wrappers do nothing.
+"""
+import json
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends import django as django_backend
+
+_current = ContextVar('request_stats', default=None)
+_log_lock = threading.Lock()
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.wall_time = 0.0
+        self.url_name = None
+
+    def finish(self, request, response):
+        self.wall_time = time.perf_counter() - self.started
+        match = getattr(request, 'resolver_match', None)
+        self.url_name = (match.view_name if match else None) or request.path
+        self.method = request.method
+        self.status = response.status_code
+
+    def as_dict(self):
+        return {
+            'url_name': self.url_name,
+            'method': self.method,
+            'status': self.status,
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 3),
+            'template_ms': round(self.template_time * 1000, 3),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'wall_ms': round(self.wall_time * 1000, 3),
+        }
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries", '
+            f'tpl;dur={self.template_time * 1000:.1f}, '
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses", '
+            f'total;dur={self.wall_time * 1000:.1f}'
+        )
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+def count_cache(hit):
+    stats = _current.get()
+    if stats is not None:
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def install():
+    """
+    Record queries on every connection, including the per-thread ones opened
+    later. Called at startup so connections opened before the first request
+    (and before the middleware is loaded) are covered.
+    """
+    if not settings.INSTRUMENTATION_ENABLED:
+        return
+    connection_created.connect(install_query_recorder, dispatch_uid='app.instrumentation')
+    for connection in connections.all(initialized_only=True):
+        install_query_recorder(connection)
+
+
+class InstrumentedTemplate:
+    """Wraps a backend template to time its top-level render."""
+
+    def __init__(self, template):
+        self.template = template
+        self.origin = template.origin
+
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return self.template.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The stock Django template backend, with render timing."""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return InstrumentedTemplate(super().get_template(template_name))
+
+
+def write_record(stats):
+    line = json.dumps(stats.as_dict()) + '\n'
+    with _log_lock, open(settings.INSTRUMENTATION_LOG, 'a', encoding='utf-8') as f:
+        f.write(line)
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.INSTRUMENTATION_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.process(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.process(request, response, stats)
+
+    def process(self, request, response, stats):
+        stats.finish(request, response)
+        response['Server-Timing'] = stats.server_timing()
+        write_record(stats)
+        return response
@@ -0,0 +1,42 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+
+from app.models import CustomUser
+from app.thumbnails import generate, thumbnails_exist
+
+
+def _generate(avatar_name):
+    try:
+        generate(avatar_name)
+        return avatar_name, None
+    except Exception as e:
+        return avatar_name, str(e)
+
+
+class Command(BaseCommand):
+    help = "Generate the thumbnails of every existing avatar that does not have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate existing thumbnails too.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+
+    def handle(self, *args, **options):
+        names = (
+            CustomUser.objects.exclude(avatar__isnull=True).exclude(avatar='')
+            .values_list('avatar', flat=True).distinct().iterator()
+        )
+        if not options['force']:
+            names = (name for name in names if not thumbnails_exist(name))
+
+        done = failed = 0
+        with ProcessPoolExecutor(options['workers'], initializer=django.setup) as executor:
+            for name, error in executor.map(_generate, names, chunksize=8):
+                if error:
+                    failed += 1
+                    self.stderr.write(f"{name}: {error}")
+                else:
+                    done += 1
+        self.stdout.write(self.style.SUCCESS(f"Generated thumbnails for {done} avatars ({failed} failed)."))
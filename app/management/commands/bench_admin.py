@@ -0,0 +1,80 @@
+import random
+
+from django.contrib import admin
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from app.admin import PatientAdmin
+from app.benchmarking import rolled_back, summarize, timed
+from app.bulk import bulk_create_inherited
+from app.models import CustomUser, Patient, Staff
+
+
+class StockPatientAdmin(admin.ModelAdmin):
+    """The former PatientAdmin: exact counts, a choice per professional, icontains search."""
+
+    list_display = ('id', 'first_name', 'last_name', 'social_sec_number', 'prof_in_charge', 'is_active')
+    list_filter = ('prof_in_charge', 'is_active')
+    search_fields = ('last_name', 'email', 'social_sec_number')
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a large patient table and time Patient changelist loads with the stock "
+        "ModelAdmin and the tuned PatientAdmin. All rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=100000)
+        parser.add_argument('--staff', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        with rolled_back():
+            password = make_password(None)
+            staff = bulk_create_inherited(Staff, [
+                Staff(email=f'bench-staff{i}@example.com', first_name=f'Staff{i}', last_name=f'Doc{i:04}',
+                      role='doctor', password=password)
+                for i in range(options['staff'])
+            ])
+            patients = [
+                Patient(email=f'bench-patient{i}@example.com', first_name=f'First{i % 997}',
+                        last_name=f'Last{rng.randrange(10000):04}', role='patient', password=password,
+                        social_sec_number=900000000 + i, prof_in_charge=rng.choice(staff))
+                for i in range(options['patients'])
+            ]
+            for i in range(0, len(patients), 5000):
+                bulk_create_inherited(Patient, patients[i:i + 5000])
+            superuser = CustomUser.objects.create(email='bench-admin@example.com', is_admin=True, password=password)
+            self.stdout.write(f"Seeded {len(patients)} patients and {len(staff)} professionals.")
+
+            factory = RequestFactory()
+            scenarios = [
+                ('first page', {}),
+                ('page 50', {'p': '50'}),
+                ('by professional', {'prof_in_charge__customuser_ptr__exact': str(staff[0].pk)}),
+                ('name prefix', {'q': 'last12'}),
+                ('ssn', {'q': str(900000000 + options['patients'] // 2)}),
+            ]
+            for label, model_admin in (
+                ('stock', StockPatientAdmin(Patient, admin.site)),
+                ('tuned', PatientAdmin(Patient, admin.site)),
+            ):
+                self.stdout.write(f"{label} admin:")
+                for scenario, params in scenarios:
+                    samples = []
+                    for _ in range(options['repeat']):
+                        request = factory.get('/admin/app/patient/', params)
+                        request.user = superuser
+                        with CaptureQueriesContext(connection) as queries:
+                            _, elapsed = timed(lambda: model_admin.changelist_view(request).render())
+                        samples.append(elapsed)
+                    stats = summarize(samples)
+                    self.stdout.write(
+                        f"  {scenario:<16} p50 {stats['p50_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f} ms  "
+                        f"{len(queries)} queries"
+                    )
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db.backends.signals import connection_created
+from django.urls import reverse
+
+from app.benchmarking import login_session, serve, summarize, wait_for
+from app.models import Message, Patient, Staff
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the staff dashboard and inbox through wsgi.py and asgi.py at high concurrency "
+        "and report throughput and latency percentiles. The WSGI server has --threads workers, "
+        "like gunicorn's sync workers; the ASGI server is one uvicorn process. Against SQLite, "
+        "--query-delay stands in for the network round trip of each PostgreSQL query."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', nargs='+', choices=('wsgi', 'asgi'), default=['wsgi', 'asgi'])
+        parser.add_argument('--threads', type=int, default=3, help="WSGI worker threads.")
+        parser.add_argument('--concurrency', type=int, default=500)
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--query-delay', type=float, default=0.0, help="Milliseconds added to each query.")
+        parser.add_argument('--port', type=int, default=8766)
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+        parser.add_argument('--serve', choices=('wsgi', 'asgi'), help="Internal: run one server.")
+
+    def handle(self, *args, **options):
+        if options['serve']:
+            return self.serve(options)
+
+        password = make_password(None)
+        doctor = Staff.objects.create(
+            email='bench-asgi-doctor@example.com', first_name='Doc', role='doctor', password=password,
+        )
+        patient = Patient.objects.create(
+            email='bench-asgi-patient@example.com', role='patient', password=password, social_sec_number=999999998,
+            prof_in_charge=doctor,
+        )
+        Message.objects.bulk_create([
+            Message(sender=patient, recipient=doctor, subject=f'bench {i}', content='Hello') for i in range(50)
+        ])
+        session = login_session(doctor)
+        results = {}
+        try:
+            for server in options['servers']:
+                results[server] = self.run(server, session.session_key, options)
+        finally:
+            session.delete()
+            # Deleting the users cascades to their messages.
+            patient.delete()
+            doctor.delete()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(
+            f"concurrency {options['concurrency']}, {options['requests']} requests, "
+            f"{options['threads']} WSGI threads, query delay {options['query_delay']} ms"
+        )
+        for server, stats in results.items():
+            self.stdout.write(
+                f"  {server:<5} {stats['rps']:7.0f} req/s  p50 {stats['p50_ms']:8.2f} ms  "
+                f"p99 {stats['p99_ms']:8.2f} ms  {stats['errors']} errors"
+            )
+
+    def run(self, server, session_key, options):
+        process = subprocess.Popen([
+            sys.executable, sys.argv[0], 'bench_asgi', '--serve', server, '--port', str(options['port']),
+            '--threads', str(options['threads']), '--query-delay', str(options['query_delay']),
+        ], env=os.environ)
+        try:
+            wait_for(options['port'], process)
+            requests = [
+                (
+                    f"GET {reverse(name)} HTTP/1.1\r\nHost: localhost\r\n"
+                    f"Cookie: {settings.SESSION_COOKIE_NAME}={session_key}\r\nConnection: close\r\n\r\n"
+                ).encode()
+                for name in ('dashboard', 'inbox_api')
+            ]
+            # Warm up: imports, template compilation and the first connection.
+            asyncio.run(self.load(options['port'], requests, 4, 20))
+            samples, elapsed = asyncio.run(
+                self.load(options['port'], requests, options['concurrency'], options['requests'])
+            )
+        finally:
+            process.terminate()
+            process.wait()
+        stats = summarize([duration for duration, _ in samples])
+        stats['rps'] = len(samples) / elapsed
+        stats['errors'] = sum(not ok for _, ok in samples)
+        return stats
+
+    async def load(self, port, requests, concurrency, total):
+        """Send ``total`` requests from ``concurrency`` clients; return ``([(seconds, ok)], elapsed)``."""
+        pending = iter(range(total))
+        samples = []
+
+        async def client():
+            for i in pending:
+                samples.append(await self.fetch(port, requests[i % len(requests)]))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return samples, time.perf_counter() - started
+
+    async def fetch(self, port, request):
+        started = time.perf_counter()
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), 60)
+            try:
+                writer.write(request)
+                response = await asyncio.wait_for(reader.read(), 60)
+            finally:
+                writer.close()
+            ok = response.split(b' ', 2)[1:2] == [b'200']
+        except (OSError, asyncio.TimeoutError):
+            ok = False
+        return time.perf_counter() - started, ok
+
+    def serve(self, options):
+        delay = options['query_delay'] / 1000
+        if delay:
+            def slow_query(execute, sql, params, many, context):
+                time.sleep(delay)
+                return execute(sql, params, many, context)
+
+            def install(connection, **kwargs):
+                # The wrapper object outlives its connections; add the delay once.
+                if slow_query not in connection.execute_wrappers:
+                    connection.execute_wrappers.append(slow_query)
+            connection_created.connect(install, weak=False)
+        serve(options['serve'], options['port'], options['threads'])
@@ -0,0 +1,123 @@
+import http.client
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from django.urls import reverse
+
+from app.benchmarking import login_session, serve, summarize, wait_for
+from app.models import Staff
+
+MODES = ('close', 'persistent', 'pool')
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the staff dashboard through a local HTTP server under each DB_CONN_MODE and "
+        "report latency percentiles. Against SQLite, --connect-delay stands in for the cost of "
+        "opening a PostgreSQL connection (TCP, TLS and authentication)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=None,
+                            help="Defaults to every mode the database and server support.")
+        parser.add_argument('--server', choices=('wsgi', 'asgi'), default='wsgi')
+        parser.add_argument('--threads', type=int, default=4, help="WSGI worker threads.")
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--connect-delay', type=float, default=0.0, help="Milliseconds added to each connect.")
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+        parser.add_argument('--serve', action='store_true', help="Internal: run the server for one mode.")
+
+    def handle(self, *args, **options):
+        if options['serve']:
+            return self.serve(options)
+
+        postgres = settings.DATABASES['default']['ENGINE'].endswith('postgresql')
+        modes = options['modes'] or [
+            mode for mode in MODES
+            if (mode != 'pool' or postgres) and (mode != 'persistent' or options['server'] == 'wsgi')
+        ]
+        if 'pool' in modes and not postgres:
+            raise CommandError("The pool mode needs PostgreSQL.")
+
+        doctor = Staff.objects.create(
+            email='bench-connections@example.com', first_name='Doc', role='doctor', password=make_password(None),
+        )
+        session = login_session(doctor)
+        results = {}
+        try:
+            for mode in modes:
+                results[mode] = self.run(mode, session.session_key, options)
+        finally:
+            session.delete()
+            doctor.delete()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(
+            f"{options['server']} server, {options['threads']} threads, concurrency {options['concurrency']}, "
+            f"connect delay {options['connect_delay']} ms"
+        )
+        for mode, stats in results.items():
+            self.stdout.write(
+                f"  {mode:<11} {stats['rps']:7.0f} req/s  p50 {stats['p50_ms']:7.2f} ms  "
+                f"p95 {stats['p95_ms']:7.2f} ms  p99 {stats['p99_ms']:7.2f} ms  {stats['errors']} errors"
+            )
+
+    def run(self, mode, session_key, options):
+        env = {**os.environ, 'DB_CONN_MODE': mode}
+        server = subprocess.Popen([
+            sys.executable, sys.argv[0], 'bench_connections', '--serve', '--server', options['server'],
+            '--port', str(options['port']), '--threads', str(options['threads']),
+            '--connect-delay', str(options['connect_delay']),
+        ], env=env)
+        try:
+            wait_for(options['port'], server)
+            path = reverse('dashboard')
+            headers = {'Host': 'localhost', 'Cookie': f'{settings.SESSION_COOKIE_NAME}={session_key}'}
+
+            def fetch(_):
+                connection = http.client.HTTPConnection('127.0.0.1', options['port'], timeout=30)
+                started = time.perf_counter()
+                try:
+                    connection.request('GET', path, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    ok = response.status == 200
+                except OSError:
+                    ok = False
+                finally:
+                    connection.close()
+                return time.perf_counter() - started, ok
+
+            with ThreadPoolExecutor(options['concurrency']) as pool:
+                # Warm up: let every worker thread load the code and open its connection.
+                list(pool.map(fetch, range(options['threads'] * 4)))
+                started = time.perf_counter()
+                samples = list(pool.map(fetch, range(options['requests'])))
+                elapsed = time.perf_counter() - started
+        finally:
+            server.terminate()
+            server.wait()
+        stats = summarize([duration for duration, _ in samples])
+        stats['rps'] = len(samples) / elapsed
+        stats['errors'] = sum(not ok for _, ok in samples)
+        return stats
+
+    def serve(self, options):
+        delay = options['connect_delay'] / 1000
+        if delay:
+            def slow_connect(**kwargs):
+                time.sleep(delay)
+            connection_created.connect(slow_connect, weak=False)
+        serve(options['server'], options['port'], options['threads'])
@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from app import fragments
+from app.benchmarking import rolled_back, summarize, timed
+from app.models import CalendarEvent, Message, Patient, Staff
+
+
+class Command(BaseCommand):
+    help = (
+        "Time staff dashboard requests with and without the per-user fragment cache, "
+        "using the configured CACHES backend. All rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--messages', type=int, default=200)
+        parser.add_argument('--events', type=int, default=200)
+
+    def handle(self, *args, **options):
+        with rolled_back(), override_settings(ALLOWED_HOSTS=['testserver']):
+            password = make_password(None)
+            doctor = Staff.objects.create(
+                email='bench-doctor@example.com', first_name='Doc', role='doctor', password=password,
+            )
+            patient = Patient.objects.create(
+                email='bench-patient@example.com', role='patient', password=password, social_sec_number=999999999,
+                prof_in_charge=doctor,
+            )
+            for i in range(options['messages']):
+                Message.objects.create(sender=patient, recipient=doctor, subject=f'bench {i}', content='Hello')
+            start = timezone.now() + timedelta(hours=1)
+            CalendarEvent.objects.bulk_create([
+                CalendarEvent(name=f'bench {i}', prof=doctor, start_time=start + timedelta(hours=i),
+                              end_time=start + timedelta(hours=i, minutes=30))
+                for i in range(options['events'])
+            ])
+
+            client = Client()
+            client.force_login(doctor)
+            url = reverse('dashboard')
+            self.stdout.write(f"Cache backend: {settings.CACHES['default']['BACKEND']}")
+            for label, timeout in (('uncached', 0), ('cached', settings.FRAGMENT_CACHE_TIMEOUT or 300)):
+                with override_settings(FRAGMENT_CACHE_TIMEOUT=timeout):
+                    before = fragments.stats()
+                    samples = [timed(client.get, url)[1] for _ in range(options['requests'])]
+                    after = fragments.stats()
+                stats = summarize(samples)
+                self.stdout.write(
+                    f"  {label:<9} p50 {stats['p50_ms']:6.2f} ms  p95 {stats['p95_ms']:6.2f} ms  "
+                    f"hits {after['hits'] - before['hits']}  misses {after['misses'] - before['misses']}"
+                )
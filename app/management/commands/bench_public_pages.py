@@ -0,0 +1,121 @@
+import http.client
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from app.benchmarking import serve, summarize, wait_for
+
+# X-Cache-Status values answered by nginx without a request to Django.
+NGINX_SERVED = {'HIT', 'STALE', 'UPDATING'}
+
+
+class Command(BaseCommand):
+    help = (
+        "Request the public pages from concurrent anonymous visitors and report, per page, the "
+        "latency, the status codes and the X-Cache-Status nginx adds. Point --url at nginx to "
+        "see the share of traffic answered from its page cache. Visitors arrive without cookies; "
+        "with --returning they keep the cookies and ETags of their previous visit, as browsers "
+        "do, and revalidate. Without --url a local server is started through wsgi.py (no nginx, "
+        "so only the 304s show)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Base URL of a running server, e.g. http://localhost:1337.")
+        parser.add_argument('--threads', type=int, default=4, help="Worker threads of the local WSGI server.")
+        parser.add_argument('--port', type=int, default=8768)
+        parser.add_argument('--clients', type=int, default=20)
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds.")
+        parser.add_argument('--pages', nargs='+', default=['home', 'login', 'patient_signup', 'staff_signup'])
+        parser.add_argument('--returning', action='store_true')
+        parser.add_argument('--serve', action='store_true', help="Internal: run the local server.")
+
+    def handle(self, *args, **options):
+        if options['serve']:
+            return serve('wsgi', options['port'], options['threads'])
+        server = None
+        if options['url']:
+            url = urlsplit(options['url'])
+            host, port, host_header = url.hostname, url.port or 80, url.netloc
+        else:
+            host, port, host_header = '127.0.0.1', options['port'], 'localhost'
+            server = subprocess.Popen([
+                sys.executable, sys.argv[0], 'bench_public_pages', '--serve',
+                '--port', str(port), '--threads', str(options['threads']),
+            ], env=os.environ)
+        try:
+            if server:
+                wait_for(port, server)
+            results, elapsed = self.run(host, port, host_header, options)
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+        total = served = 0
+        for page in options['pages']:
+            durations, statuses, cache = results[page]
+            stats = summarize(durations)
+            total += len(durations)
+            served += sum(cache[status] for status in NGINX_SERVED)
+            self.stdout.write(
+                f"  {page:<16} {stats['count'] / elapsed:8.1f} req/s  p50 {stats['p50_ms']:6.2f} ms  "
+                f"p95 {stats['p95_ms']:6.2f} ms  "
+                f"{'  '.join(f'{status}: {count}' for status, count in sorted(statuses.items()))}  "
+                f"cache {dict(cache) or '-'}"
+            )
+        self.stdout.write(f"{total / elapsed:.1f} req/s, {served / max(total, 1):.1%} answered from the nginx cache")
+
+    def run(self, host, port, host_header, options):
+        paths = {page: reverse(page) for page in options['pages']}
+        results = defaultdict(lambda: ([], Counter(), Counter()))
+        lock = threading.Lock()
+        stop_at = time.monotonic() + options['duration']
+
+        def client():
+            connection = http.client.HTTPConnection(host, port, timeout=60)
+            cookies, etags = {}, {}
+            while time.monotonic() < stop_at:
+                for page, path in paths.items():
+                    headers = {'Host': host_header}
+                    if options['returning']:
+                        if cookies:
+                            headers['Cookie'] = '; '.join(f'{key}={value}' for key, value in cookies.items())
+                        if page in etags:
+                            headers['If-None-Match'] = etags[page]
+                    started = time.perf_counter()
+                    try:
+                        connection.request('GET', path, headers=headers)
+                        response = connection.getresponse()
+                        response.read()
+                    except (OSError, http.client.HTTPException):
+                        connection.close()
+                        status, cache = 'connection', None
+                    else:
+                        status, cache = response.status, response.headers.get('X-Cache-Status')
+                        for header in response.headers.get_all('Set-Cookie') or []:
+                            cookies.update((key, morsel.value) for key, morsel in SimpleCookie(header).items())
+                        if response.headers.get('ETag'):
+                            etags[page] = response.headers['ETag']
+                    duration = time.perf_counter() - started
+                    with lock:
+                        durations, statuses, caches = results[page]
+                        durations.append(duration)
+                        statuses[status] += 1
+                        if cache:
+                            caches[cache] += 1
+
+        threads = [threading.Thread(target=client, daemon=True) for _ in range(options['clients'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.perf_counter() - started
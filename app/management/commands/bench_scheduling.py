@@ -0,0 +1,105 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.benchmarking import rolled_back, timed
+from app.models import CalendarEvent, Staff
+from app.scheduling import IntervalIndex, find_conflict
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark CalendarEvent conflict detection: the legacy clinic-wide "
+        "overlap query against the per-professional scheduling engine. "
+        "All seeded rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=20)
+        parser.add_argument('--events', type=int, default=2000, help='Events per doctor.')
+        parser.add_argument('--checks', type=int, default=500, help='Proposed slots to validate.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with rolled_back():
+            doctors = self.seed(options['doctors'], options['events'])
+            proposals = self.proposals(rng, doctors, options['events'], options['checks'])
+            self.run(doctors, proposals)
+
+    def seed(self, n_doctors, n_events):
+        password = make_password(None)
+        doctors = []
+        for i in range(n_doctors):
+            doctor = Staff(email=f'bench-doctor-{i}@example.com', role='doctor', password=password)
+            doctor.save()
+            doctors.append(doctor)
+
+        # Back-to-back 30 minute appointments with a 30 minute gap.
+        origin = timezone.now().replace(minute=0, second=0, microsecond=0)
+        events = []
+        for doctor in doctors:
+            for j in range(n_events):
+                start = origin + timedelta(hours=j)
+                events.append(CalendarEvent(
+                    name=f'bench-{doctor.pk}-{j}', slug=f'bench-{doctor.pk}-{j}', prof=doctor,
+                    start_time=start, end_time=start + timedelta(minutes=30),
+                ))
+        CalendarEvent.objects.bulk_create(events, batch_size=500)
+        self.origin = origin
+        return doctors
+
+    def proposals(self, rng, doctors, n_events, n_checks):
+        slots = []
+        for i in range(n_checks):
+            start = self.origin + timedelta(hours=rng.randrange(n_events), minutes=rng.choice((0, 15, 30, 45)))
+            slots.append((start, start + timedelta(minutes=30), ('proposed', i), rng.choice(doctors)))
+        return slots
+
+    def legacy_check(self, proposals):
+        conflicts = 0
+        for start, end, _, _ in proposals:
+            overlapping = CalendarEvent.objects.filter(start_time__lt=end, end_time__gt=start)
+            if overlapping.exists():
+                overlapping.first()
+                conflicts += 1
+        return conflicts
+
+    def engine_check(self, proposals):
+        return sum(
+            1 for start, end, _, doctor in proposals
+            if find_conflict(doctor, start, end) is not None
+        )
+
+    def batch_check(self, proposals):
+        by_doctor = {}
+        for start, end, key, doctor in proposals:
+            by_doctor.setdefault(doctor, []).append((start, end, key))
+        conflicting = set()
+        for doctor, batch in by_doctor.items():
+            index = IntervalIndex.for_staff(doctor)
+            # Count clashes with stored events only, like the other checks.
+            conflicting.update(
+                key for key, other in index.batch_conflicts(batch) if not isinstance(other, tuple)
+            )
+        return len(conflicting)
+
+    def run(self, doctors, proposals):
+        n = len(proposals)
+        legacy, legacy_time = timed(self.legacy_check, proposals)
+        engine, engine_time = timed(self.engine_check, proposals)
+        batch, batch_time = timed(self.batch_check, proposals)
+
+        self.stdout.write(f"{len(doctors)} doctors, {CalendarEvent.objects.count()} events, {n} proposed slots")
+        for label, conflicts, elapsed in (
+            ('legacy clean() query', legacy, legacy_time),
+            ('find_conflict (per prof)', engine, engine_time),
+            ('IntervalIndex batch', batch, batch_time),
+        ):
+            self.stdout.write(
+                f"  {label:<26} {elapsed * 1000:9.1f} ms  "
+                f"{n / elapsed if elapsed else 0:10.0f} checks/s  {conflicts} conflicts"
+            )
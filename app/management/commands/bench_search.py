@@ -0,0 +1,88 @@
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+
+from app import directory
+from app.benchmarking import FIRST_NAMES, rolled_back, summarize, surname_pool
+from app.bulk import bulk_create_inherited
+from app.models import Patient, Staff
+from app.search import DirectoryBackend, get_backend, looks_like_email, search_email
+
+BATCH = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a large rolled-back patient population and measure type-ahead search latency "
+        "with the configured search backend and the directory fallback."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=1000000)
+        parser.add_argument('--queries', type=int, default=300)
+        parser.add_argument('--target-p99', type=float, default=20.0, help="Milliseconds.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        surnames, weights = surname_pool(rng)
+        backend = get_backend()
+
+        with rolled_back():
+            password = make_password(None)
+            staff = bulk_create_inherited(Staff, [
+                Staff(email=f'bench-staff{i}@example.com', first_name='Doc', last_name=f'Tor{i}',
+                      role='doctor', password=password)
+                for i in range(50)
+            ])
+            started = time.perf_counter()
+            people = []
+            for start in range(0, options['patients'], BATCH):
+                batch = []
+                for i in range(start, min(start + BATCH, options['patients'])):
+                    first = rng.choice(FIRST_NAMES)
+                    last = rng.choices(surnames, cum_weights=weights)[0]
+                    batch.append(Patient(
+                        email=f'{first}.{last}{i}@example.com', first_name=first.title(), last_name=last.title(),
+                        role='patient', password=password, social_sec_number=100000000 + i,
+                        prof_in_charge=rng.choice(staff),
+                    ))
+                bulk_create_inherited(Patient, batch)
+                people += [(p.first_name, p.last_name, p.email, p.social_sec_number) for p in rng.sample(batch, 5)]
+            directory.rebuild()
+            backend.rebuild()
+            self.stdout.write(
+                f"Seeded and indexed {options['patients']} patients in {time.perf_counter() - started:.0f}s."
+            )
+
+            queries = []
+            for _ in range(options['queries']):
+                first, last, email, ssn = rng.choice(people)
+                queries += [
+                    ('surname prefix', last[:rng.randint(3, 6)]),
+                    ('first + surname', f'{first[:rng.randint(2, 4)]} {last[:rng.randint(3, 5)]}'),
+                    ('email prefix', email[:rng.randint(6, 12)]),
+                    ('ssn prefix', str(ssn)[:rng.randint(5, 9)]),
+                    ('first name', first[:rng.randint(3, 6)]),
+                ]
+
+            for label, candidate in ((type(backend).__name__, backend), ('DirectoryBackend', DirectoryBackend())):
+                self.stdout.write(f"{label}:")
+                samples = {}
+                for kind, query in queries:
+                    started = time.perf_counter()
+                    if looks_like_email(query):
+                        search_email(query, 10)
+                    else:
+                        candidate.search(query, 10)
+                    samples.setdefault(kind, []).append(time.perf_counter() - started)
+                for kind, durations in samples.items():
+                    stats = summarize(durations)
+                    verdict = 'ok' if stats['p99_ms'] < options['target_p99'] else 'OVER TARGET'
+                    self.stdout.write(
+                        f"  {kind:<16} p50 {stats['p50_ms']:6.2f} ms  p95 {stats['p95_ms']:6.2f} ms  "
+                        f"p99 {stats['p99_ms']:6.2f} ms  {verdict}"
+                    )
+                if candidate is backend and type(backend) is DirectoryBackend:
+                    break
@@ -0,0 +1,59 @@
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from app.benchmarking import rolled_back, summarize
+from app.models import Staff
+
+ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure requests/sec and session queries of the staff dashboard under each session mode, "
+        "with the configured CACHES backend. All rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--modes', nargs='+', choices=sorted(ENGINES), default=list(ENGINES))
+
+    def handle(self, *args, **options):
+        with rolled_back(), override_settings(ALLOWED_HOSTS=['testserver']):
+            doctor = Staff.objects.create(
+                email='bench-doctor@example.com', first_name='Doc', role='doctor', password=make_password(None),
+            )
+            url = reverse('dashboard')
+            for mode in options['modes']:
+                with override_settings(SESSION_ENGINE=ENGINES[mode]):
+                    cache.clear()
+                    # A new client loads SessionMiddleware, which reads the engine once.
+                    client = Client()
+                    client.force_login(doctor)
+                    client.get(url)
+                    with CaptureQueriesContext(connection) as queries:
+                        client.get(url)
+                    session_queries = sum('django_session' in query['sql'] for query in queries)
+
+                    samples = []
+                    started = time.perf_counter()
+                    for _ in range(options['requests']):
+                        request_started = time.perf_counter()
+                        client.get(url)
+                        samples.append(time.perf_counter() - request_started)
+                    elapsed = time.perf_counter() - started
+                stats = summarize(samples)
+                self.stdout.write(
+                    f"{mode:<15} {options['requests'] / elapsed:8.0f} req/s  p50 {stats['p50_ms']:6.2f} ms  "
+                    f"p95 {stats['p95_ms']:6.2f} ms  {session_queries} session queries/request"
+                )
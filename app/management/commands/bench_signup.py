@@ -0,0 +1,74 @@
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from app.benchmarking import rolled_back, timed
+from app.forms import PatientUserCreationForm
+
+
+class LegacyPatientUserCreationForm(PatientUserCreationForm):
+    """Reproduces the former save chain, which hashed the password three times."""
+
+    def set_password_and_save(self, user, password_field_name="password1", commit=True):
+        user.set_password(self.cleaned_data[password_field_name])
+        if commit:
+            user.save()
+        return user
+
+    def save(self, commit=True):
+        user = super().save(commit=False)
+        # CustomUserCreationForm.save and PatientUserCreationForm.save both re-hashed.
+        user.set_password(self.cleaned_data["password1"])
+        user.set_password(self.cleaned_data["password1"])
+        if commit:
+            user.save()
+        return user
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure patient signups/s in one worker with the former triple-hash "
+        "form and the current single-hash pipeline. All rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--signups', type=int, default=10)
+        parser.add_argument(
+            '--iterations', type=int,
+            help='Override PASSWORD_HASH_ITERATIONS for the run.',
+        )
+
+    def handle(self, *args, **options):
+        settings_override = {}
+        if options['iterations']:
+            settings_override['PASSWORD_HASH_ITERATIONS'] = options['iterations']
+        n = options['signups']
+
+        with override_settings(**settings_override):
+            make_password('warm-up')
+            results = []
+            for label, form_class in (
+                ('before (3 hashes)', LegacyPatientUserCreationForm),
+                ('after (1 hash)', PatientUserCreationForm),
+            ):
+                with rolled_back():
+                    _, elapsed = timed(self.signup, form_class, n, label)
+                results.append((label, elapsed))
+
+        for label, elapsed in results:
+            self.stdout.write(f"  {label:<18} {elapsed:7.2f}s  {n / elapsed:7.2f} signups/s")
+
+    def signup(self, form_class, n, label):
+        for i in range(n):
+            form = form_class({
+                'first_name': 'Bench',
+                'last_name': f'Patient {i}',
+                'date_of_birth': '1980-01-01',
+                'email': f'bench-signup-{i}@example.com',
+                'password1': 'correct-horse-battery',
+                'password2': 'correct-horse-battery',
+                'social_sec_number': 900000000 + i,
+            })
+            if not form.is_valid():
+                raise ValueError(f"{label}: {form.errors.as_text()}")
+            form.save()
@@ -0,0 +1,163 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from app.benchmarking import summarize
+from app.models import Patient, Staff
+
+PASSWORD = 'Bench-passw0rd-42'
+
+
+class Command(BaseCommand):
+    help = (
+        "Multi-process SQLite contention benchmark: worker processes sign patients up, send "
+        "messages and load the staff dashboard against a fresh database file, once with the "
+        "default settings and once with SQLITE_PRODUCTION."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds per profile.")
+        parser.add_argument('--profiles', nargs='+', choices=('default', 'production'),
+                            default=['default', 'production'])
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+        # Internal: the setup and worker steps, run in subprocesses against the benchmark database.
+        parser.add_argument('--setup', action='store_true')
+        parser.add_argument('--worker', type=int)
+        parser.add_argument('--start-at', type=float)
+        parser.add_argument('--doctor', type=int)
+        parser.add_argument('--patient', type=int)
+
+    def handle(self, *args, **options):
+        if options['setup']:
+            return self.setup()
+        if options['worker'] is not None:
+            return self.work(options)
+        if 'sqlite3' not in settings.DATABASES['default']['ENGINE']:
+            raise CommandError("This benchmark is for the SQLite backend.")
+
+        results = {}
+        for profile in options['profiles']:
+            with tempfile.TemporaryDirectory() as directory:
+                results[profile] = self.run(profile, Path(directory) / 'bench.sqlite3', options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for profile, kinds in results.items():
+            self.stdout.write(f"{profile} ({options['workers']} workers, {options['duration']:.0f}s):")
+            for kind, stats in kinds.items():
+                self.stdout.write(
+                    f"  {kind:<10} {stats['per_second']:7.1f}/s  p50 {stats['p50_ms']:7.2f} ms  "
+                    f"p99 {stats['p99_ms']:8.2f} ms  {stats['locked']} locked  {stats['failed']} failed"
+                )
+
+    def run(self, profile, path, options):
+        env = {
+            **os.environ,
+            'SQL_ENGINE': 'django.db.backends.sqlite3',
+            'SQL_DATABASE': str(path),
+            'SQLITE_PRODUCTION': str(profile == 'production'),
+            # Signup cost should be the database, not the password hash.
+            'PASSWORD_HASH_ITERATIONS': '1000',
+        }
+        manage = [sys.executable, sys.argv[0]]
+        subprocess.run([*manage, 'migrate', '-v0'], env=env, check=True)
+        ids = json.loads(subprocess.run(
+            [*manage, 'bench_sqlite', '--setup'], env=env, check=True, capture_output=True, text=True,
+        ).stdout)
+        start_at = time.time() + 3
+        workers = [
+            subprocess.Popen([
+                *manage, 'bench_sqlite', '--worker', str(i), '--duration', str(options['duration']),
+                '--start-at', str(start_at), '--doctor', str(ids['doctor']), '--patient', str(ids['patient']),
+            ], env=env, stdout=subprocess.PIPE, text=True)
+            for i in range(options['workers'])
+        ]
+        samples, locked, failed = defaultdict(list), defaultdict(int), defaultdict(int)
+        for worker in workers:
+            output, _ = worker.communicate()
+            if worker.returncode:
+                raise CommandError(f"A benchmark worker failed with exit code {worker.returncode}.")
+            report = json.loads(output)
+            for kind, durations in report['samples'].items():
+                samples[kind] += durations
+            for kind, count in report['locked'].items():
+                locked[kind] += count
+            for kind, count in report['failed'].items():
+                failed[kind] += count
+
+        results = {}
+        for kind in sorted(set(samples) | set(locked) | set(failed)):
+            stats = summarize(samples[kind])
+            stats['per_second'] = len(samples[kind]) / options['duration']
+            stats['locked'] = locked[kind]
+            stats['failed'] = failed[kind]
+            results[kind] = stats
+        return results
+
+    def setup(self):
+        password = make_password(PASSWORD)
+        doctor = Staff.objects.create(email='bench-doctor@example.com', role='doctor', password=password)
+        patient = Patient.objects.create(
+            email='bench-patient@example.com', role='patient', password=password, social_sec_number=1,
+            prof_in_charge=doctor,
+        )
+        self.stdout.write(json.dumps({'doctor': doctor.pk, 'patient': patient.pk}))
+
+    def work(self, options):
+        worker = options['worker']
+        rng = random.Random(worker)
+        samples, locked, failed = defaultdict(list), defaultdict(int), defaultdict(int)
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            patient_client, doctor_client, anonymous = Client(), Client(), Client()
+            patient_client.force_login(Patient.objects.get(pk=options['patient']))
+            doctor_client.force_login(Staff.objects.get(pk=options['doctor']))
+            time.sleep(max(0.0, options['start_at'] - time.time()))
+            deadline = options['start_at'] + options['duration']
+            i = 0
+            while time.time() < deadline:
+                i += 1
+                draw = rng.random()
+                if draw < 0.2:
+                    kind, expected = 'signup', 302
+                    request = lambda: anonymous.post(reverse('patient_signup'), {
+                        'first_name': 'Bench', 'last_name': f'Worker{worker}', 'date_of_birth': '1990-01-01',
+                        'email': f'bench-{worker}-{i}@example.com', 'password1': PASSWORD, 'password2': PASSWORD,
+                        'social_sec_number': (worker + 1) * 10 ** 7 + i,
+                    })
+                elif draw < 0.6:
+                    kind, expected = 'message', 302
+                    request = lambda: patient_client.post(
+                        reverse('send_message'), {'subject': f'Bench {i}', 'content': 'Hello'},
+                    )
+                else:
+                    kind, expected = 'dashboard', 200
+                    request = lambda: doctor_client.get(reverse('dashboard'))
+                started = time.perf_counter()
+                try:
+                    response = request()
+                except OperationalError as e:
+                    if 'locked' not in str(e):
+                        raise
+                    locked[kind] += 1
+                    continue
+                if response.status_code == expected:
+                    samples[kind].append(time.perf_counter() - started)
+                else:
+                    failed[kind] += 1
+        self.stdout.write(json.dumps({'samples': samples, 'locked': locked, 'failed': failed}))
@@ -0,0 +1,52 @@
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from app.staticfiles import HASHED_NAME
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the static asset bytes a first load of each page transfers, uncompressed and with "
+        "the .gz/.br siblings in STATIC_ROOT, and the assets a repeat load still requests: those "
+        "without a content-hashed, immutably cached name. Run collectstatic first; compare runs "
+        "with STATIC_COMPRESSED off and on."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', nargs='+', default=['home', 'login', 'patient_signup'])
+
+    def handle(self, *args, **options):
+        root = Path(settings.STATIC_ROOT)
+        if not root.is_dir():
+            raise CommandError(f"{root} does not exist; run collectstatic first.")
+        asset = re.compile(r'(?:href|src)="{}([^"?#]+)'.format(re.escape(settings.STATIC_URL)))
+        client = Client()
+        self.stdout.write(f"Storage: {settings.STORAGES['staticfiles']['BACKEND']}")
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for page in options['pages']:
+                html = client.get(reverse(page)).content.decode()
+                totals = {'raw': 0, 'gzip': 0, 'brotli': 0}
+                revalidated = []
+                for name in dict.fromkeys(asset.findall(html)):
+                    path = root / name
+                    if not path.exists():
+                        raise CommandError(f"{name} is not in {root}; run collectstatic again.")
+                    raw = path.stat().st_size
+                    totals['raw'] += raw
+                    # Without a sibling, nginx sends the file as is.
+                    for encoding, suffix in (('gzip', '.gz'), ('brotli', '.br')):
+                        sibling = path.with_name(path.name + suffix)
+                        totals[encoding] += sibling.stat().st_size if sibling.exists() else raw
+                    if not HASHED_NAME.search(name):
+                        revalidated.append(name)
+                self.stdout.write(
+                    f"  {page:<16} first load {totals['raw'] / 1024:7.1f} KiB raw  "
+                    f"{totals['gzip'] / 1024:6.1f} KiB gzip  {totals['brotli'] / 1024:6.1f} KiB brotli  "
+                    f"repeat load {len(revalidated)} asset requests"
+                )
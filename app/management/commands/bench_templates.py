@@ -0,0 +1,74 @@
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template import Engine, RequestContext, engines
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from app.benchmarking import rolled_back, summarize, timed
+from app.models import Patient, Staff
+from app.warmup import template_names
+
+LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the render of every template under app/templates, loading and compiling it (and "
+        "the templates it extends and includes) on each render, as without the cached loader, "
+        "and from compiled templates with shared fragments on, as with TEMPLATE_PRODUCTION. "
+        "Per-user fragment caching is off so both columns render the whole page."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--templates', nargs='+', help="Defaults to every template.")
+
+    def handle(self, *args, **options):
+        base = engines.all()[0].engine
+        uncached = Engine(
+            dirs=base.dirs, loaders=LOADERS, context_processors=base.context_processors,
+            libraries=base.libraries, debug=base.debug,
+        )
+        compiled = Engine(
+            dirs=base.dirs, loaders=[('django.template.loaders.cached.Loader', LOADERS)],
+            context_processors=base.context_processors, libraries=base.libraries, debug=False,
+        )
+        factory = RequestFactory()
+
+        with rolled_back(), override_settings(ALLOWED_HOSTS=['testserver'], FRAGMENT_CACHE_TIMEOUT=0):
+            password = make_password(None)
+            doctor = Staff.objects.create(
+                email='bench-doctor@example.com', first_name='Doc', role='doctor', password=password,
+            )
+            patient = Patient.objects.create(
+                email='bench-patient@example.com', first_name='Pat', role='patient', password=password,
+                social_sec_number=999999997, prof_in_charge=doctor,
+            )
+            users = {'doctor_assist/': doctor, 'patient/': patient}
+
+            def render(engine, name):
+                request = factory.get('/')
+                request.user = next(
+                    (user for prefix, user in users.items() if name.startswith(prefix)), AnonymousUser(),
+                )
+                return engine.get_template(name).render(RequestContext(request, {}))
+
+            for name in options['templates'] or template_names():
+                try:
+                    with override_settings(TEMPLATE_PRODUCTION=False):
+                        cold = [timed(render, uncached, name)[1] for _ in range(options['iterations'])]
+                    with override_settings(TEMPLATE_PRODUCTION=True):
+                        warm = [timed(render, compiled, name)[1] for _ in range(options['iterations'])]
+                except Exception as e:
+                    # Admin templates and the like need a view's context.
+                    self.stdout.write(f"{name:<48} skipped: {type(e).__name__}")
+                    continue
+                cold, warm = summarize(cold), summarize(warm)
+                self.stdout.write(
+                    f"{name:<48} uncached p50 {cold['p50_ms']:6.2f} ms  cached p50 {warm['p50_ms']:6.2f} ms  "
+                    f"p95 {cold['p95_ms']:6.2f} -> {warm['p95_ms']:6.2f} ms"
+                )
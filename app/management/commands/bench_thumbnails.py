@@ -0,0 +1,44 @@
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from app.thumbnails import FORMATS, SIZES, generate
+
+
+class Command(BaseCommand):
+    help = "Measure avatar thumbnails generated per second on synthetic photos, in a scratch directory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=20)
+        parser.add_argument('--width', type=int, default=2400)
+        parser.add_argument('--height', type=int, default=1600)
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        per_image = len(SIZES) * len(FORMATS)
+        with tempfile.TemporaryDirectory() as root:
+            storage = FileSystemStorage(location=root)
+            names = []
+            for i in range(options['images']):
+                image = Image.effect_noise((options['width'], options['height']), rng.randint(20, 80)).convert('RGB')
+                buffer = BytesIO()
+                image.save(buffer, 'JPEG', quality=90)
+                names.append(storage.save(f'avatar/bench_{i}.jpg', ContentFile(buffer.getvalue())))
+
+            for workers in options['workers']:
+                started = time.perf_counter()
+                with ThreadPoolExecutor(workers) as executor:
+                    list(executor.map(lambda name: generate(name, storage), names))
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"  {workers} worker(s): {len(names)} avatars in {elapsed:.2f}s, "
+                    f"{len(names) * per_image / elapsed:.1f} thumbnails/s"
+                )
@@ -0,0 +1,196 @@
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import date
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from app import directory, search
+from app.bulk import bulk_create_inherited
+from app.models import CustomUser, Patient, Staff
+
+FIELDS = ('email', 'first_name', 'last_name', 'date_of_birth', 'social_sec_number', 'password', 'prof_in_charge')
+# Checked here: a value the column cannot hold fails the whole batch's insert.
+MAX_LENGTHS = {name: Patient._meta.get_field(name).max_length for name in ('email', 'first_name', 'last_name')}
+
+
+def read_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+def read_jsonl(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream patients from a CSV or JSONL file into CustomUser + Patient rows "
+        "using batched multi-row inserts. Columns: " + ', '.join(FIELDS) + ". "
+        "prof_in_charge is the email of an existing Staff member; rows without "
+        "a password get an unusable one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or '-' for stdin.")
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Processes used to hash passwords (0 hashes in this process).',
+        )
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('jsonl' if options['path'].endswith(('.jsonl', '.ndjson')) else 'csv')
+        reader = read_jsonl if fmt == 'jsonl' else read_csv
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        self.verbosity = options['verbosity']
+        self.workers = options['workers']
+
+        # Every prof_in_charge is resolved from this dict instead of a query per row.
+        self.staff_by_email = {email.lower(): pk for email, pk in Staff.objects.values_list('email', 'pk')}
+        self.seen_emails = set()
+        self.seen_ssns = set()
+        self.imported = self.skipped = 0
+
+        try:
+            stream = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(e)
+        executor = ProcessPoolExecutor(self.workers, initializer=django.setup) if self.workers else None
+        started = time.perf_counter()
+        try:
+            self.run(batched(reader(stream), options['batch_size']), executor)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.perf_counter() - started
+        rate = self.imported / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.imported} patients, skipped {self.skipped} rows in {elapsed:.1f}s ({rate:.0f} rows/s)."
+        ))
+
+    def run(self, batches, executor):
+        # Hash the next batch in the pool while the current one is inserted.
+        pending = None
+        for batch in batches:
+            patients, passwords = self.build(batch)
+            hashing = self.hash(passwords, executor)
+            if pending is not None:
+                self.insert(*pending)
+            pending = (patients, hashing)
+        if pending is not None:
+            self.insert(*pending)
+
+    def hash(self, passwords, executor):
+        # Unusable passwords are cheap; only real ones are worth shipping to the pool.
+        if executor is None:
+            return [make_password(password) for password in passwords]
+        return [
+            executor.submit(make_password, password) if password else make_password(None)
+            for password in passwords
+        ]
+
+    def build(self, rows):
+        patients = []
+        passwords = []
+        existing_emails, existing_ssns = self.existing(rows)
+        for row in rows:
+            patient = self.build_patient(row, existing_emails, existing_ssns)
+            if patient is None:
+                self.skipped += 1
+                continue
+            patients.append(patient)
+            passwords.append(row.get('password') or None)
+        return patients, passwords
+
+    def existing(self, rows):
+        emails = [CustomUser.objects.normalize_email(row.get('email') or '') for row in rows]
+        ssns = []
+        for row in rows:
+            try:
+                ssns.append(int(row.get('social_sec_number')))
+            except (TypeError, ValueError):
+                pass
+        return (
+            set(CustomUser.objects.filter(email__in=emails).values_list('email', flat=True)),
+            set(Patient.objects.filter(social_sec_number__in=ssns).values_list('social_sec_number', flat=True)),
+        )
+
+    def build_patient(self, row, existing_emails, existing_ssns):
+        email = CustomUser.objects.normalize_email(row.get('email') or '')
+        try:
+            ssn = int(row.get('social_sec_number'))
+            dob = row.get('date_of_birth') or None
+            dob = date.fromisoformat(dob) if isinstance(dob, str) else dob
+        except (TypeError, ValueError) as e:
+            self.warn(row, f'skipped, invalid value ({e})')
+            return None
+        if not email:
+            self.warn(row, 'skipped, missing email')
+            return None
+        names = {'first_name': row.get('first_name') or None, 'last_name': row.get('last_name') or None}
+        for name, value in (('email', email), *names.items()):
+            if value is not None and len(value) > MAX_LENGTHS[name]:
+                self.warn(row, f'skipped, {name} longer than {MAX_LENGTHS[name]} characters')
+                return None
+        if email in existing_emails or email in self.seen_emails:
+            self.warn(row, 'skipped, email already exists')
+            return None
+        if ssn in existing_ssns or ssn in self.seen_ssns:
+            self.warn(row, 'skipped, social security number already exists')
+            return None
+
+        prof_id = None
+        prof_email = (row.get('prof_in_charge') or '').strip().lower()
+        if prof_email:
+            prof_id = self.staff_by_email.get(prof_email)
+            if prof_id is None:
+                self.warn(row, f'unknown professional {prof_email}, imported without one')
+
+        self.seen_emails.add(email)
+        self.seen_ssns.add(ssn)
+        return Patient(
+            email=email,
+            **names,
+            date_of_birth=dob,
+            role='patient',
+            prof_in_charge_id=prof_id,
+            social_sec_number=ssn,
+        )
+
+    def insert(self, patients, hashing):
+        for patient, password in zip(patients, hashing):
+            patient.password = password.result() if isinstance(password, Future) else password
+        with transaction.atomic():
+            bulk_create_inherited(Patient, patients)
+            # bulk_create_inherited sends no signals.
+            ids = [patient.pk for patient in patients]
+            directory.refresh(ids)
+            search.index(ids)
+        self.imported += len(patients)
+        if self.verbosity >= 2:
+            self.stdout.write(f"  {self.imported} imported")
+
+    def warn(self, row, reason):
+        if self.verbosity >= 2:
+            self.stderr.write(f"{row.get('email')!r}: {reason}")
@@ -0,0 +1,292 @@
+import http.client
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils import timezone
+
+from app.benchmarking import (
+    FIRST_NAMES, SEED_DOMAIN, SEED_PASSWORD, seed_email, serve, summarize, wait_for,
+)
+from app.models import CustomUser
+
+# Weights of the scenarios a virtual user picks from, see VirtualUser.
+SCENARIOS = {
+    'patient_message': 5,
+    'patient_appointment': 2,
+    'doctor_inbox': 3,
+    'doctor_search': 2,
+    'admin_changelist': 1,
+    'anonymous': 2,
+}
+CSRF_TOKEN = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+class VirtualUser:
+    """
+    One simulated browser: its own connection and cookies. Each scenario
+    starts logged out and records every request under ``"<METHOD> <url name>"``.
+    """
+
+    def __init__(self, host, port, host_header, users, rng, record):
+        self.connection = http.client.HTTPConnection(host, port, timeout=60)
+        self.host_header = host_header
+        self.users = users
+        self.rng = rng
+        self.record = record
+        self.cookies = {}
+
+    def request(self, method, name, path, data=None, expect=(200,)):
+        headers = {'Host': self.host_header}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{key}={value}' for key, value in self.cookies.items())
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.record(f'{method} {name}', time.perf_counter() - started, 'connection')
+            return None
+        self.record(
+            f'{method} {name}', time.perf_counter() - started, None if response.status in expect else response.status,
+        )
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for key, morsel in SimpleCookie(header).items():
+                if morsel.value:
+                    self.cookies[key] = morsel.value
+                else:
+                    self.cookies.pop(key, None)
+        return content.decode() if response.status in expect else None
+
+    def get(self, name, query=None, **kwargs):
+        path = reverse(name, kwargs=kwargs or None)
+        return self.request('GET', name, f'{path}?{urlencode(query)}' if query else path)
+
+    def post_form(self, name, page, data, expect=(302,)):
+        """POST ``data`` to ``name`` with the CSRF token of the form on ``page``."""
+        token = CSRF_TOKEN.search(page or '')
+        if token is None:
+            return None
+        return self.request('POST', name, reverse(name), {**data, 'csrfmiddlewaretoken': token[1]}, expect)
+
+    def login(self, email, name='login'):
+        self.cookies.clear()
+        page = self.get(name)
+        return self.post_form(name, page, {'username': email, 'password': SEED_PASSWORD}) is not None
+
+    def pick(self, kind):
+        return seed_email(kind, self.rng.randrange(self.users[kind]))
+
+    def patient_message(self):
+        if self.login(self.pick('patient')):
+            self.get('dashboard')
+            page = self.get('send_message')
+            self.post_form('send_message', page, {'subject': 'Load test', 'content': 'Hello doctor'})
+
+    def patient_appointment(self):
+        if self.login(self.pick('patient')):
+            self.get('dashboard')
+            self.get('request_appointment')
+
+    def doctor_inbox(self):
+        if self.login(self.pick('doctor')):
+            self.get('dashboard')
+            self.get('inbox')
+            self.get('inbox_api', {'unread': 1})
+
+    def doctor_search(self):
+        if self.login(self.pick('doctor')):
+            prefix = self.rng.choice(FIRST_NAMES)[:3]
+            self.get('view_patients', {'q': prefix})
+            self.get('patient_search', {'q': prefix})
+            self.get('patient_autocomplete', {'q': prefix})
+
+    def admin_changelist(self):
+        if self.login(seed_email('admin', 0), 'admin:login'):
+            self.get('admin:app_patient_changelist')
+            self.get('admin:app_patient_changelist', {'q': self.rng.choice(FIRST_NAMES)[:3]})
+            self.get('admin:app_calendar_changelist')
+
+    def anonymous(self):
+        self.cookies.clear()
+        self.get('home')
+        self.get('login')
+        self.get('patient_signup')
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay weighted scenarios (login, dashboard, messaging, inbox, search, admin changelists) "
+        "from concurrent virtual users against a server, and report throughput and p50/p95/p99 "
+        "per URL name as JSON. Run it on a database filled by seed_bench. Unless logins are what "
+        "is being measured, give seed_bench and the server the same low PASSWORD_HASH_ITERATIONS; "
+        "a server with more iterations upgrades each hash on login. Without --url a local server "
+        "is started through wsgi.py or asgi.py with this environment."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Base URL of a running server, e.g. http://127.0.0.1:8000.")
+        parser.add_argument('--server', choices=('wsgi', 'asgi'), default='asgi')
+        parser.add_argument('--threads', type=int, default=4, help="Worker threads of the local WSGI server.")
+        parser.add_argument('--port', type=int, default=8767)
+        parser.add_argument('--clients', type=int, default=20)
+        parser.add_argument('--duration', type=float, default=60.0, help="Seconds, after the warm-up.")
+        parser.add_argument('--warmup', type=float, default=5.0, help="Seconds of unrecorded traffic.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--scenarios', nargs='+', metavar='NAME=WEIGHT',
+                            help=f"Override the weights; known scenarios: {', '.join(SCENARIOS)}.")
+        parser.add_argument('--output', help="Write the report to this file instead of stdout.")
+        parser.add_argument('--baseline', help="A previous report to compare p95 latencies with.")
+        parser.add_argument('--max-regression', type=float,
+                            help="With --baseline, fail if any p95 grew by more than this many percent.")
+        parser.add_argument('--serve', action='store_true', help="Internal: run the local server.")
+
+    def handle(self, *args, **options):
+        if options['serve']:
+            return serve(options['server'], options['port'], options['threads'])
+        scenarios = self.scenarios(options['scenarios'])
+        users = {
+            kind: CustomUser.objects.filter(email__startswith=kind, email__endswith=f'@{SEED_DOMAIN}').count()
+            for kind in ('doctor', 'patient', 'admin')
+        }
+        if not all(users.values()):
+            raise CommandError("No seeded users found; run seed_bench first.")
+
+        server = None
+        if options['url']:
+            url = urlsplit(options['url'])
+            host, port, host_header = url.hostname, url.port or 80, url.netloc
+        else:
+            host, port, host_header = '127.0.0.1', options['port'], 'localhost'
+            server = subprocess.Popen([
+                sys.executable, sys.argv[0], 'loadtest', '--serve', '--server', options['server'],
+                '--port', str(port), '--threads', str(options['threads']),
+            ], env=os.environ)
+        try:
+            if server:
+                wait_for(port, server)
+            samples, errors, elapsed = self.run(host, port, host_header, users, scenarios, options)
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+        report = self.report(samples, errors, elapsed, scenarios, options)
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+        if options['baseline']:
+            self.compare(report, options)
+
+    def scenarios(self, overrides):
+        if not overrides:
+            return dict(SCENARIOS)
+        weights = {}
+        for item in overrides:
+            name, _, weight = item.partition('=')
+            if name not in SCENARIOS:
+                raise CommandError(f"Unknown scenario {name!r}.")
+            try:
+                weights[name] = float(weight or 1)
+            except ValueError:
+                raise CommandError(f"Invalid weight in {item!r}.")
+        return weights
+
+    def run(self, host, port, host_header, users, scenarios, options):
+        samples, errors = defaultdict(list), defaultdict(lambda: defaultdict(int))
+        lock = threading.Lock()
+        recording = threading.Event()
+        names, weights = list(scenarios), list(scenarios.values())
+
+        def record(key, duration, error):
+            """``error`` is None, an unexpected status code or 'connection'."""
+            if not recording.is_set():
+                return
+            with lock:
+                if error is None:
+                    samples[key].append(duration)
+                else:
+                    errors[key][str(error)] += 1
+
+        stop_at = time.monotonic() + options['warmup'] + options['duration']
+
+        def client(number):
+            user = VirtualUser(host, port, host_header, users, random.Random(options['seed'] * 1000 + number), record)
+            while time.monotonic() < stop_at:
+                getattr(user, user.rng.choices(names, weights)[0])()
+
+        threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(options['clients'])]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['warmup'])
+        recording.set()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        # The last scenarios may run past the deadline; their requests count too.
+        return samples, errors, time.perf_counter() - started
+
+    def report(self, samples, errors, elapsed, scenarios, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True,
+            ).stdout.strip() or None
+        except OSError:
+            commit = None
+        urls = {}
+        for key in sorted(set(samples) | set(errors)):
+            failed = sum(errors[key].values())
+            stats = summarize(samples[key])
+            stats['errors'] = failed
+            stats['error_statuses'] = dict(errors[key])
+            stats['rps'] = (len(samples[key]) + failed) / elapsed
+            urls[key] = stats
+        failed = sum(stats['errors'] for stats in urls.values())
+        total = sum(len(durations) for durations in samples.values()) + failed
+        return {
+            'commit': commit,
+            'finished': timezone.now().isoformat(),
+            'config': {
+                'url': options['url'], 'server': None if options['url'] else options['server'],
+                'clients': options['clients'], 'duration': options['duration'], 'seed': options['seed'],
+                'scenarios': scenarios,
+            },
+            'total': {'requests': total, 'errors': failed, 'rps': total / elapsed},
+            'urls': urls,
+        }
+
+    def compare(self, report, options):
+        with open(options['baseline']) as f:
+            baseline = json.load(f)
+        regressions = []
+        self.stderr.write(f"p95 against {options['baseline']} (commit {baseline.get('commit')}):")
+        for key, stats in report['urls'].items():
+            before = baseline['urls'].get(key)
+            if not before or not before['p95_ms']:
+                continue
+            change = stats['p95_ms'] / before['p95_ms'] - 1
+            self.stderr.write(f"  {key:<45} {before['p95_ms']:8.1f} -> {stats['p95_ms']:8.1f} ms  {change:+7.1%}")
+            if options['max_regression'] is not None and change * 100 > options['max_regression']:
+                regressions.append(key)
+        if regressions:
+            raise CommandError(f"p95 regressed by more than {options['max_regression']}%: {', '.join(regressions)}")
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.models import UploadSession
+from app.uploads import abandon
+
+
+class Command(BaseCommand):
+    help = "Delete chunked uploads that were never completed, along with their partial files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Idle time after which an upload is abandoned.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        stale = UploadSession.objects.filter(history__isnull=True, updated__lt=cutoff)
+        count = 0
+        for session in stale.iterator():
+            abandon(session)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Removed {count} abandoned uploads."))
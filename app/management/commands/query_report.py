@@ -0,0 +1,73 @@
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.benchmarking import percentile
+
+SORT_KEYS = {
+    'queries': 'max_queries',
+    'db': 'avg_db_ms',
+    'template': 'avg_template_ms',
+    'wall': 'p95_wall_ms',
+}
+
+
+class Command(BaseCommand):
+    help = "Summarize the per-request instrumentation log by URL name, worst offenders first."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=None, help="Defaults to settings.INSTRUMENTATION_LOG.")
+        parser.add_argument('--sort', choices=sorted(SORT_KEYS), default='queries')
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--json', action='store_true', help="Print the summary as JSON.")
+
+    def handle(self, *args, **options):
+        path = options['log'] or settings.INSTRUMENTATION_LOG
+        records = defaultdict(list)
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        records[record['url_name']].append(record)
+        except FileNotFoundError:
+            raise CommandError(f"No instrumentation log at {path}; set INSTRUMENTATION_ENABLED=True first.")
+
+        rows = []
+        for url_name, group in records.items():
+            count = len(group)
+            queries = [r['queries'] for r in group]
+            wall = [r['wall_ms'] for r in group]
+            # Records written before cache counting have neither key.
+            hits = sum(r.get('cache_hits', 0) for r in group)
+            lookups = hits + sum(r.get('cache_misses', 0) for r in group)
+            rows.append({
+                'url_name': url_name,
+                'requests': count,
+                'avg_queries': sum(queries) / count,
+                'max_queries': max(queries),
+                'avg_db_ms': sum(r['db_ms'] for r in group) / count,
+                'avg_template_ms': sum(r['template_ms'] for r in group) / count,
+                'p50_wall_ms': percentile(wall, 50),
+                'p95_wall_ms': percentile(wall, 95),
+                'cache_hit_ratio': hits / lookups if lookups else None,
+            })
+        rows.sort(key=lambda row: row[SORT_KEYS[options['sort']]], reverse=True)
+        rows = rows[:options['top']]
+
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+        self.stdout.write(
+            f"{'url name':<32} {'reqs':>6} {'avg q':>7} {'max q':>6} {'db ms':>8} "
+            f"{'tpl ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'hit %':>6}"
+        )
+        for row in rows:
+            hit_ratio = '-' if row['cache_hit_ratio'] is None else f"{row['cache_hit_ratio']:.0%}"
+            self.stdout.write(
+                f"{row['url_name'][:32]:<32} {row['requests']:>6} {row['avg_queries']:>7.1f} "
+                f"{row['max_queries']:>6} {row['avg_db_ms']:>8.2f} {row['avg_template_ms']:>8.2f} "
+                f"{row['p50_wall_ms']:>8.2f} {row['p95_wall_ms']:>8.2f} {hit_ratio:>6}"
+            )
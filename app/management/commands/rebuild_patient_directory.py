@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app import directory
+
+
+class Command(BaseCommand):
+    help = "Recreate the patient directory read model from the Patient and Staff tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        written = directory.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the patient directory with {written} patients."))
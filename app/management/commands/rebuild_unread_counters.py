@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from app import counters
+
+
+class Command(BaseCommand):
+    help = "Recompute every professional's unread-message counter from the Message table."
+
+    def handle(self, *args, **options):
+        written = counters.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt unread counters for {written} professionals."))
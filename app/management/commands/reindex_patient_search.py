@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from app import directory, search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the patient search index from the patient directory."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--with-directory', action='store_true', help="Rebuild the patient directory first.",
+        )
+
+    def handle(self, *args, **options):
+        if options['with_directory']:
+            self.stdout.write(f"Rebuilt the patient directory with {directory.rebuild()} patients.")
+        backend = search.get_backend()
+        written = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Reindexed {written} patients with {type(backend).__name__}."))
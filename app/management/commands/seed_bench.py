@@ -0,0 +1,186 @@
+import random
+import time
+from array import array
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from app import counters, directory, search
+from app.benchmarking import FIRST_NAMES, SEED_PASSWORD, seed_email, surname_pool
+from app.bulk import bulk_create_inherited, bulk_insert_raw
+from app.models import Calendar, CalendarEvent, ClinicalHistory, CustomUser, Message, Patient, Staff
+
+SUBJECTS = ['Test results', 'Prescription renewal', 'Appointment', 'Question about my treatment', 'Follow-up']
+# Appointments are half-hour slots from 08:00 to 16:00, from 60 days ago to 60 days ahead.
+SLOTS_PER_DAY = 16
+DAYS_BACK = DAYS_AHEAD = 60
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill an empty database with synthetic doctors, patients, messages, appointments and "
+        "clinical histories for load tests. Row contents are fully determined by --seed; dates "
+        "are relative to today. Every account uses the password in app.benchmarking.SEED_PASSWORD. "
+        "Rows are bulk inserted without signals, then the unread counters, the patient directory "
+        "and the search index are rebuilt."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--doctors', type=int, default=100)
+        parser.add_argument('--patients', type=int, default=1000000)
+        parser.add_argument('--messages', type=int, default=10000000)
+        parser.add_argument('--appointments', type=int, default=200000)
+        parser.add_argument('--histories', type=int, default=1000000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['doctors'] < 1 or options['patients'] < 1:
+            raise CommandError("Seed at least one doctor and one patient.")
+        slots = options['doctors'] * (DAYS_BACK + DAYS_AHEAD) * SLOTS_PER_DAY
+        if options['appointments'] > slots:
+            raise CommandError(f"{options['appointments']} appointments do not fit in {slots} slots; seed more doctors.")
+        if CustomUser.objects.filter(email=seed_email('admin', 0)).exists():
+            raise CommandError("This database is already seeded; seed a fresh one.")
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.password = make_password(SEED_PASSWORD)
+
+        self.step('admin', self.seed_admin)
+        self.step('doctors', self.seed_doctors, options['doctors'])
+        self.step('patients', self.seed_patients, options['patients'])
+        self.step('messages', self.seed_messages, options['messages'])
+        self.step('appointments', self.seed_appointments, options['appointments'])
+        self.step('clinical histories', self.seed_histories, options['histories'])
+        self.step('unread counters', counters.rebuild)
+        self.step('directory entries', directory.rebuild)
+        self.step('search entries', search.get_backend().rebuild)
+
+    def step(self, label, func, *args):
+        started = time.perf_counter()
+        written = func(*args)
+        self.stdout.write(f"{written:>10} {label} in {time.perf_counter() - started:.1f}s")
+
+    def batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield range(start, min(start + self.batch_size, total))
+
+    def seed_admin(self):
+        CustomUser.objects.create(
+            email=seed_email('admin', 0), first_name='Bench', last_name='Admin', password=self.password,
+            is_admin=True,
+        )
+        return 1
+
+    def seed_doctors(self, count):
+        rng = self.rng
+        surnames, weights = surname_pool(rng, 500)
+        with transaction.atomic():
+            doctors = bulk_create_inherited(Staff, [
+                Staff(
+                    email=seed_email('doctor', i), first_name=rng.choice(FIRST_NAMES).title(),
+                    last_name=rng.choices(surnames, cum_weights=weights)[0].title(), role='doctor',
+                    password=self.password, license=f'LIC-{i:06}',
+                )
+                for i in range(count)
+            ])
+        self.doctor_ids = [doctor.pk for doctor in doctors]
+        return count
+
+    def seed_patients(self, count):
+        rng = self.rng
+        surnames, weights = surname_pool(rng)
+        born_from = date(1930, 1, 1)
+        # Parallel arrays keep a million patients in a few megabytes.
+        self.patient_ids, self.patient_doctors = array('q'), array('q')
+        self.patients_by_doctor = defaultdict(lambda: array('q'))
+        for numbers in self.batches(count):
+            patients = []
+            for i in numbers:
+                first, last = rng.choice(FIRST_NAMES), rng.choices(surnames, cum_weights=weights)[0]
+                patients.append(Patient(
+                    email=seed_email('patient', i), first_name=first.title(), last_name=last.title(),
+                    date_of_birth=born_from + timedelta(days=rng.randrange(90 * 365)), role='patient',
+                    password=self.password, social_sec_number=700000000 + i,
+                    prof_in_charge_id=rng.choice(self.doctor_ids),
+                ))
+            with transaction.atomic():
+                bulk_create_inherited(Patient, patients)
+            for patient in patients:
+                self.patient_ids.append(patient.pk)
+                self.patient_doctors.append(patient.prof_in_charge_id)
+                self.patients_by_doctor[patient.prof_in_charge_id].append(patient.pk)
+        return count
+
+    def seed_messages(self, count):
+        rng = self.rng
+        year = 365 * 24 * 3600
+        for numbers in self.batches(count):
+            messages = []
+            for _ in numbers:
+                sender = rng.randrange(len(self.patient_ids))
+                age = timedelta(seconds=rng.randrange(year))
+                messages.append(Message(
+                    sender_id=self.patient_ids[sender], recipient_id=self.patient_doctors[sender],
+                    subject=rng.choice(SUBJECTS), content='Hello doctor, ' * rng.randint(1, 20),
+                    timestamp=self.now - age,
+                    # Doctors work through their inbox: only recent messages may still be unread.
+                    is_read=age > timedelta(days=7) or rng.random() < 0.5,
+                ))
+            with transaction.atomic():
+                bulk_insert_raw(Message, messages)
+        return count
+
+    def seed_appointments(self, count):
+        rng = self.rng
+        slots = len(self.doctor_ids) * (DAYS_BACK + DAYS_AHEAD) * SLOTS_PER_DAY
+        first_day = timezone.localtime(self.now).replace(hour=8, minute=0, second=0, microsecond=0)
+        first_day -= timedelta(days=DAYS_BACK)
+        # Each free slot is booked with the same probability, so appointments never overlap.
+        booked = 0
+        events, bookings = [], []
+        for doctor_id in self.doctor_ids:
+            patients = self.patients_by_doctor.get(doctor_id)
+            for day in range(DAYS_BACK + DAYS_AHEAD):
+                for slot in range(SLOTS_PER_DAY):
+                    if rng.random() >= count / slots:
+                        continue
+                    start = first_day + timedelta(days=day, minutes=30 * slot)
+                    events.append(CalendarEvent(
+                        name='Consultation', slug=slugify('Consultation'), prof_id=doctor_id,
+                        start_time=start, end_time=start + timedelta(minutes=30),
+                    ))
+                    bookings.append(rng.choice(patients) if patients else None)
+                    if len(events) >= self.batch_size:
+                        booked += self.book(events, bookings)
+                        events, bookings = [], []
+        return booked + self.book(events, bookings)
+
+    def book(self, events, bookings):
+        with transaction.atomic():
+            CalendarEvent.objects.bulk_create(events)
+            Calendar.objects.bulk_create([
+                Calendar(cal_events=event, prof_id=event.prof_id, patient_id=patient_id)
+                for event, patient_id in zip(events, bookings)
+                if patient_id is not None
+            ])
+        return len(events)
+
+    def seed_histories(self, count):
+        rng = self.rng
+        for numbers in self.batches(count):
+            histories = []
+            for i in numbers:
+                patient = rng.randrange(len(self.patient_ids))
+                histories.append(ClinicalHistory(
+                    name=f'History {i}', prof_id=self.patient_doctors[patient], patient_id=self.patient_ids[patient],
+                ))
+            with transaction.atomic():
+                ClinicalHistory.objects.bulk_create(histories)
+        return count
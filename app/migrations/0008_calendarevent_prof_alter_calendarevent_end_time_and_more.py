@@ -0,0 +1,43 @@
+# Generated by Django 5.1.5 on 2026-10-18 16:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_event_prof(apps, schema_editor):
+    # Events used to be tied to a professional only through Calendar rows.
+    Calendar = apps.get_model('app', 'Calendar')
+    CalendarEvent = apps.get_model('app', 'CalendarEvent')
+    rows = Calendar.objects.filter(cal_events__isnull=False, prof__isnull=False).values_list('cal_events_id', 'prof_id')
+    for event_id, prof_id in rows.iterator():
+        CalendarEvent.objects.filter(pk=event_id, prof__isnull=True).update(prof_id=prof_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_alter_staff_options_remove_staff_title_staff_license_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calendarevent',
+            name='prof',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='events', to='app.staff'),
+        ),
+        migrations.AlterField(
+            model_name='calendarevent',
+            name='end_time',
+            field=models.DateTimeField(verbose_name='End time'),
+        ),
+        migrations.AlterField(
+            model_name='calendarevent',
+            name='start_time',
+            field=models.DateTimeField(verbose_name='Starting time'),
+        ),
+        migrations.RunPython(backfill_event_prof, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='calendarevent',
+            index=models.Index(fields=['prof', 'start_time', 'end_time'], name='calevent_prof_start_end_idx'),
+        ),
+    ]
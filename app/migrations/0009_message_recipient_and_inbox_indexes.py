@@ -0,0 +1,35 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_recipient(apps, schema_editor):
+    Message = apps.get_model('app', 'Message')
+    Patient = apps.get_model('app', 'Patient')
+    prof = Patient.objects.filter(pk=models.OuterRef('sender_id')).values('prof_in_charge_id')[:1]
+    Message.objects.filter(recipient__isnull=True).update(recipient_id=models.Subquery(prof))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_calendarevent_prof_alter_calendarevent_end_time_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='recipient',
+            field=models.ForeignKey(blank=True, help_text='The professional in charge of the sender when the message was sent.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='received_messages', to='app.staff'),
+        ),
+        migrations.RunPython(backfill_recipient, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['recipient', '-timestamp', '-id'], name='message_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['recipient', '-timestamp', '-id'], name='message_unread_idx'),
+        ),
+    ]
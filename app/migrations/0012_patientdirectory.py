@@ -0,0 +1,54 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_directory(apps, schema_editor):
+    Patient = apps.get_model('app', 'Patient')
+    PatientDirectory = apps.get_model('app', 'PatientDirectory')
+    rows = Patient.objects.order_by('pk').values_list(
+        'pk', 'first_name', 'last_name', 'email', 'date_of_birth', 'social_sec_number', 'is_active',
+        'prof_in_charge_id', 'prof_in_charge__first_name', 'prof_in_charge__last_name',
+    )
+    entries = [
+        PatientDirectory(
+            patient_id=pk, first_name=first or '', last_name=last or '',
+            sort_name=f'{last or ""} {first or ""}'.strip().lower(),
+            email=email, date_of_birth=dob, social_sec_number=ssn, is_active=is_active,
+            prof_id=prof_id, prof_name=' '.join(part for part in (prof_first, prof_last) if part),
+        )
+        for pk, first, last, email, dob, ssn, is_active, prof_id, prof_first, prof_last in rows.iterator()
+    ]
+    PatientDirectory.objects.bulk_create(entries, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientDirectory',
+            fields=[
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='directory_entry', serialize=False, to='app.patient')),
+                ('first_name', models.CharField(blank=True, max_length=50)),
+                ('last_name', models.CharField(blank=True, max_length=50)),
+                ('sort_name', models.CharField(max_length=101)),
+                ('email', models.EmailField(db_index=True, max_length=255)),
+                ('date_of_birth', models.DateField(blank=True, null=True)),
+                ('social_sec_number', models.IntegerField(db_index=True)),
+                ('prof_name', models.CharField(blank=True, max_length=101)),
+                ('is_active', models.BooleanField(default=True)),
+                ('prof', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='app.staff')),
+            ],
+            options={
+                'verbose_name': 'Patient Directory Entry',
+                'verbose_name_plural': 'Patient Directory',
+                'indexes': [models.Index(fields=['sort_name', 'patient'], name='patientdir_name_idx'), models.Index(fields=['prof', 'sort_name', 'patient'], name='patientdir_prof_name_idx')],
+            },
+        ),
+        migrations.RunPython(populate_directory, migrations.RunPython.noop),
+    ]
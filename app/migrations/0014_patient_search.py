@@ -0,0 +1,39 @@
+from django.db import migrations
+
+FTS_COLUMNS = "name, ssn, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4 5 6'"
+TRIGRAM_EXPRESSION = "(lower(first_name || ' ' || last_name) || ' ' || social_sec_number::text)"
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f"CREATE VIRTUAL TABLE app_patient_fts USING fts5({FTS_COLUMNS})")
+        schema_editor.execute(
+            "INSERT INTO app_patient_fts (rowid, name, ssn) "
+            "SELECT patient_id, first_name || ' ' || last_name, social_sec_number FROM app_patientdirectory"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            f"CREATE INDEX patientdir_search_trgm_idx ON app_patientdirectory "
+            f"USING gin ({TRIGRAM_EXPRESSION} gin_trgm_ops)"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS app_patient_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS patientdir_search_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_customuser_upper_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,56 @@
+from django.db import migrations
+
+# The local part of the e-mail address joins the searched text, so "jdoe"
+# finds jdoe@example.com. The domain is left out: it is shared by too many
+# patients to tell them apart.
+FTS_COLUMNS = "name, ssn, email, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4 5 6'"
+TRIGRAM_EXPRESSION = (
+    "(lower(first_name || ' ' || last_name) || ' ' || social_sec_number::text "
+    "|| ' ' || lower(split_part(email, '@', 1)))"
+)
+OLD_FTS_COLUMNS = "name, ssn, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4 5 6'"
+OLD_TRIGRAM_EXPRESSION = "(lower(first_name || ' ' || last_name) || ' ' || social_sec_number::text)"
+
+
+def rebuild(schema_editor, fts_columns, insert, trigram_expression):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS app_patient_fts")
+        schema_editor.execute(f"CREATE VIRTUAL TABLE app_patient_fts USING fts5({fts_columns})")
+        schema_editor.execute(insert)
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS patientdir_search_trgm_idx")
+        schema_editor.execute(
+            f"CREATE INDEX patientdir_search_trgm_idx ON app_patientdirectory "
+            f"USING gin ({trigram_expression} gin_trgm_ops)"
+        )
+
+
+def add_email(apps, schema_editor):
+    rebuild(
+        schema_editor, FTS_COLUMNS,
+        "INSERT INTO app_patient_fts (rowid, name, ssn, email) "
+        "SELECT patient_id, first_name || ' ' || last_name, social_sec_number, "
+        "substr(email, 1, instr(email, '@') - 1) FROM app_patientdirectory",
+        TRIGRAM_EXPRESSION,
+    )
+
+
+def remove_email(apps, schema_editor):
+    rebuild(
+        schema_editor, OLD_FTS_COLUMNS,
+        "INSERT INTO app_patient_fts (rowid, name, ssn) "
+        "SELECT patient_id, first_name || ' ' || last_name, social_sec_number FROM app_patientdirectory",
+        OLD_TRIGRAM_EXPRESSION,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_patient_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_email, remove_email),
+    ]
@@ -1,8 +1,13 @@
+import uuid
+
 from django.db import models
+from django.db.models.functions import Upper
 from django.template.defaultfilters import slugify
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.core.exceptions import ValidationError
 
+from .scheduling import find_conflict
+
 ROLE_CHOICES = [
         ('doctor', 'Doctor'),
         ('assistant', 'Doctor\'s Assistant'),
@@ -63,12 +68,26 @@ class CustomUser(AbstractUser):
 
     objects = UserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Case-insensitive prefix search in the admin (see app.changelists).
+            models.Index(Upper('last_name'), name='customuser_upper_last_name_idx'),
+            models.Index(Upper('email'), name='customuser_upper_email_idx'),
+        ]
+
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["date_of_birth", "first_name", "last_name"]
 
     def __str__(self):
         return self.email
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Loaded avatar, compared on save to regenerate thumbnails only when it changes.
+        instance._loaded_avatar = instance.__dict__.get('avatar')
+        return instance
+
     def has_perm(self, perm, obj=None):
         "Does the user have a specific permission?"
         # Simplest possible answer: Yes, always
@@ -123,13 +142,24 @@ class CalendarEvent(models.Model):
     class Meta:
         verbose_name = 'Calendar Event'
         verbose_name_plural = 'Calendar Events'
+        indexes = [
+            models.Index(fields=['prof', 'start_time', 'end_time'], name='calevent_prof_start_end_idx'),
+        ]
 
     name = models.CharField(max_length=100)
-    start_time = models.DateTimeField(u'Starting time', auto_now=True)
-    end_time = models.DateTimeField(u'End time', auto_now=True)
+    prof = models.ForeignKey(Staff, on_delete=models.CASCADE, null=True, blank=True, related_name="events")
+    start_time = models.DateTimeField(u'Starting time')
+    end_time = models.DateTimeField(u'End time')
     description = models.CharField(max_length=500, blank=True)
     slug = models.SlugField(null=True, blank=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded professional so a reassignment can invalidate both calendars.
+        instance._loaded_prof_id = instance.__dict__.get('prof_id')
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.id:
             self.slug = slugify(self.name)
@@ -156,13 +186,9 @@ class CalendarEvent(models.Model):
         if self.end_time <= self.start_time:
             raise ValidationError("The end time must be after the start time.")
         
-        overlapping_events = CalendarEvent.objects.filter(
-            start_time__lt=self.end_time,
-            end_time__gt=self.start_time
-        ).exclude(pk=self.pk)
-        
-        if overlapping_events.exists():
-            overlap = overlapping_events.first()
+        # Only events of the same professional can conflict with each other.
+        overlap = find_conflict(self.prof, self.start_time, self.end_time, exclude_pk=self.pk)
+        if overlap is not None:
             raise ValidationError(
                 f"Overlap with event '{overlap.name}' from {overlap.start_time} to {overlap.end_time}."
             )
@@ -176,6 +202,12 @@ class Calendar(models.Model):
     prof = models.ForeignKey(Staff, on_delete=models.SET_NULL, null=True, related_name="calendars")
     patient = models.ForeignKey(Patient, on_delete=models.SET_NULL, null=True)
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Booked events belong to the professional's timeline.
+        if self.cal_events_id and self.prof_id:
+            CalendarEvent.objects.filter(pk=self.cal_events_id, prof__isnull=True).update(prof_id=self.prof_id)
+
 class Message(models.Model):
     sender = models.ForeignKey(
         Patient, 
@@ -183,6 +215,14 @@ class Message(models.Model):
         related_name='sent_messages',
         help_text='The user sending the message.'
     )
+    recipient = models.ForeignKey(
+        Staff,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='received_messages',
+        help_text="The professional in charge of the sender when the message was sent."
+    )
     subject = models.CharField(
         max_length=255, 
         help_text='The subject of the message.'
@@ -203,6 +243,119 @@ class Message(models.Model):
         ordering = ['-timestamp']  # Most recent messages first
         verbose_name = 'Message'
         verbose_name_plural = 'Messages'
+        indexes = [
+            # A doctor's inbox, newest first, and its unread subset.
+            models.Index(fields=['recipient', '-timestamp', '-id'], name='message_inbox_idx'),
+            models.Index(
+                fields=['recipient', '-timestamp', '-id'],
+                condition=models.Q(is_read=False),
+                name='message_unread_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender}: {self.subject}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Loaded state, compared on save to keep UnreadCounter in sync.
+        instance._loaded_is_read = instance.__dict__.get('is_read')
+        instance._loaded_recipient_id = instance.__dict__.get('recipient_id')
+        return instance
+
+    def _load_stored_state(self):
+        # The instance may predate a bulk update such as inbox.mark_read; the
+        # counters must follow the stored row, not what was loaded.
+        stored = Message.objects.filter(pk=self.pk).values_list('is_read', 'recipient_id').first()
+        if stored is not None:
+            self._loaded_is_read, self._loaded_recipient_id = stored
+
+    def save(self, *args, **kwargs):
+        if self.recipient_id is None and self.sender_id is not None:
+            self.recipient_id = self.sender.prof_in_charge_id
+        if not self._state.adding:
+            self._load_stored_state()
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        # Querysets and cascades delete freshly loaded rows; a held instance may be stale.
+        self._load_stored_state()
+        return super().delete(*args, **kwargs)
+
+class UnreadCounter(models.Model):
+    """
+    Number of unread messages addressed to a professional, maintained by
+    app.counters so dashboards read it with a primary-key lookup.
+    """
+    staff = models.OneToOneField(Staff, on_delete=models.CASCADE, primary_key=True, related_name='unread_counter')
+    unread = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Unread Counter'
+        verbose_name_plural = 'Unread Counters'
+
+    def __str__(self):
+        return f"{self.staff}: {self.unread} unread"
+
+class PatientDirectory(models.Model):
+    """
+    Flattened copy of the patient list: one row per patient with the fields
+    lists and searches need, including the name of the professional in charge,
+    so they read a single table instead of joining app_patient, app_customuser
+    and the professional's rows. Maintained by app.directory.
+    """
+    patient = models.OneToOneField(Patient, on_delete=models.CASCADE, primary_key=True, related_name='directory_entry')
+    first_name = models.CharField(max_length=50, blank=True)
+    last_name = models.CharField(max_length=50, blank=True)
+    # Lower-cased "last first", the list order and the name search key.
+    sort_name = models.CharField(max_length=101)
+    email = models.EmailField(max_length=255, db_index=True)
+    date_of_birth = models.DateField(blank=True, null=True)
+    social_sec_number = models.IntegerField(db_index=True)
+    # Covered by patientdir_prof_name_idx.
+    prof = models.ForeignKey(Staff, on_delete=models.SET_NULL, null=True, blank=True, db_index=False, related_name='+')
+    prof_name = models.CharField(max_length=101, blank=True)
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        verbose_name = 'Patient Directory Entry'
+        verbose_name_plural = 'Patient Directory'
+        indexes = [
+            models.Index(fields=['sort_name', 'patient'], name='patientdir_name_idx'),
+            models.Index(fields=['prof', 'sort_name', 'patient'], name='patientdir_prof_name_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.last_name}, {self.first_name}"
+
+class UploadSession(models.Model):
+    """
+    A resumable, chunked upload of a clinical history file (see app.uploads).
+
+    Chunks are appended to ``storage_name`` in place; the ClinicalHistory row
+    is only created once ``offset`` reaches ``size``.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='upload_sessions')
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='pending_uploads')
+    prof = models.ForeignKey(Staff, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    name = models.CharField(max_length=100, blank=True)
+    filename = models.CharField(max_length=255)
+    storage_name = models.CharField(max_length=255, help_text='Path of the file being assembled, relative to MEDIA_ROOT.')
+    size = models.BigIntegerField(help_text='Expected size of the complete file, in bytes.')
+    offset = models.BigIntegerField(default=0, help_text='Bytes received so far.')
+    history = models.OneToOneField(ClinicalHistory, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_session')
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Upload Session'
+        verbose_name_plural = 'Upload Sessions'
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+    @property
+    def is_complete(self):
+        return self.offset >= self.size
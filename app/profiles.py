@@ -0,0 +1,132 @@
+"""
+Request-scoped role profiles.
+
+``request.user`` is the plain CustomUser row loaded by AuthenticationMiddleware.
+Most views need the concrete Patient or Staff row instead, and for patients
+their professional in charge. ``ProfileMiddleware`` exposes it lazily as
+``request.profile``: the first access runs a single query picked by
+``user.role`` (with ``prof_in_charge`` joined for patients), later accesses in
+the same request reuse it. ``request.profile`` is falsy for anonymous users
+and for users without a profile row.
+
+With ``settings.PROFILE_SESSION_CACHE`` the loaded rows are also kept in the
+session, tagged with the cache versions of the profile and of its professional.
+Saving either one bumps its version (see signals), so the session copy is
+dropped and reloaded on the next request.
+"""
+import json
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.functional import SimpleLazyObject
+
+from .caching import bump_version, get_version
+from .models import Patient, Staff
+
+SESSION_KEY = '_profile'
+STAFF_ROLES = ('doctor', 'assistant')
+
+
+def load_profile(user):
+    """Fetch the Patient or Staff row of ``user`` in one query, or None."""
+    if user.role == 'patient':
+        return Patient.objects.select_related('prof_in_charge').filter(pk=user.pk).first()
+    if user.role in STAFF_ROLES:
+        return Staff.objects.filter(pk=user.pk).first()
+    return None
+
+
+## SESSION CACHE ##
+def invalidate(user_id):
+    if settings.PROFILE_SESSION_CACHE:
+        bump_version('profile', user_id)
+
+
+def _dump(instance):
+    # The password hash stays out of the session; it is loaded on access.
+    fields = [f for f in instance._meta.concrete_fields if f.attname != 'password']
+    values = {f.attname: f.get_prep_value(getattr(instance, f.attname)) for f in fields}
+    return json.loads(json.dumps(values, cls=DjangoJSONEncoder))
+
+
+def _load(model, values):
+    fields = [f for f in model._meta.concrete_fields if f.attname in values]
+    attnames = [f.attname for f in fields]
+    return model.from_db(DEFAULT_DB_ALIAS, attnames, [f.to_python(values[f.attname]) for f in fields])
+
+
+def _versions(profile_id, prof_id):
+    return [get_version('profile', profile_id), get_version('profile', prof_id) if prof_id else None]
+
+
+def _from_session(session, user):
+    cached = session.get(SESSION_KEY)
+    if not cached or cached['user'] != user.pk:
+        return None
+    prof = cached.get('prof')
+    if cached['versions'] != _versions(user.pk, prof and prof['id']):
+        return None
+    model = Patient if cached['model'] == 'patient' else Staff
+    profile = _load(model, cached['fields'])
+    if model is Patient and profile.prof_in_charge_id:
+        profile.prof_in_charge = _load(Staff, prof)
+    return profile
+
+
+def _to_session(session, user, profile):
+    prof = getattr(profile, 'prof_in_charge', None)
+    session[SESSION_KEY] = {
+        'user': user.pk,
+        'model': 'patient' if isinstance(profile, Patient) else 'staff',
+        'versions': _versions(user.pk, prof and prof.pk),
+        'fields': _dump(profile),
+        'prof': _dump(prof) if prof else None,
+    }
+
+
+## ACCESSORS ##
+def _resolve(request, user):
+    profile = None
+    if user.is_authenticated:
+        use_session = settings.PROFILE_SESSION_CACHE and hasattr(request, 'session')
+        profile = _from_session(request.session, user) if use_session else None
+        if profile is None:
+            profile = load_profile(user)
+            if use_session and profile is not None:
+                _to_session(request.session, user, profile)
+    request._cached_profile = profile
+    return profile
+
+
+def get_profile(request):
+    """The current user's Patient or Staff row, memoized on the request."""
+    if not hasattr(request, '_cached_profile'):
+        _resolve(request, request.user)
+    return request._cached_profile
+
+
+async def aget_profile(request):
+    if not hasattr(request, '_cached_profile'):
+        user = await request.auser()
+        await sync_to_async(_resolve)(request, user)
+    return request._cached_profile
+
+
+class ProfileMiddleware:
+    """Sets the lazy ``request.profile`` and the coroutine ``request.aprofile()``."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.profile = SimpleLazyObject(lambda: get_profile(request))
+        request.aprofile = lambda: aget_profile(request)
+        # In async mode this returns the coroutine of the next handler.
+        return self.get_response(request)
@@ -0,0 +1,208 @@
+"""
+Publish/subscribe used to push events to connected clients.
+
+Publishers call ``get_broker().publish(channel, message)`` from ordinary sync
+code. Subscribers are coroutines (one per open Server-Sent Events stream)
+awaiting ``Subscription.get()``; an idle subscriber is a parked coroutine on
+the worker's event loop, not a thread.
+
+The backend is chosen with ``settings.PUBSUB_BACKEND``:
+
+* ``LocalBroker`` delivers within the current process. It is enough for a
+  single worker and for tests.
+* ``PostgresBroker`` relays messages between worker processes and hosts
+  through PostgreSQL ``LISTEN``/``NOTIFY``.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.PUBSUB_BACKEND)()
+    return _broker
+
+
+class Subscription:
+    """A bounded queue of messages for one subscriber, bound to its event loop."""
+
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def deliver(self, message):
+        # Called on the subscriber's loop. A client that cannot keep up loses
+        # the oldest events rather than growing the queue without bound.
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class BaseBroker:
+    def publish(self, channel, message):
+        """Send a JSON-serializable ``message`` to every subscriber of ``channel``."""
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        """Return a Subscription; must be called from a running event loop."""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class LocalBroker(BaseBroker):
+    """In-process fan-out. Safe to publish from any thread."""
+
+    queue_size = 100
+
+    def __init__(self):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # The subscriber's loop is closed; it will unsubscribe itself.
+                pass
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.queue_size)
+        with self._lock:
+            self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscriptions.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[subscription.channel]
+
+
+class PostgresBroker(LocalBroker):
+    """
+    Cross-process fan-out through PostgreSQL ``NOTIFY``.
+
+    ``publish`` runs ``pg_notify`` on the request's own connection, so inside
+    a transaction the notification is only sent on commit. Each process keeps
+    one extra connection that ``LISTEN``s to the channels its subscribers
+    need, and hands the notifications to the in-process fan-out.
+    Channel names must be valid unquoted PostgreSQL identifiers.
+    """
+
+    poll_interval = 1.0
+    max_backoff = 30.0
+
+    def __init__(self, using='default'):
+        super().__init__()
+        self.using = using
+        self._listening = set()
+        self._pending = set()
+        self._thread = None
+
+    def publish(self, channel, message):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [channel, json.dumps(message)])
+
+    def subscribe(self, channel):
+        subscription = super().subscribe(channel)
+        with self._lock:
+            if channel not in self._listening:
+                self._pending.add(channel)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, name='pubsub-listener', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def _listen(self):
+        # Reconnect on any error, waiting longer after each failure in a row.
+        backoff = self.poll_interval
+        while True:
+            connection = None
+            try:
+                connection = self._connect()
+                while True:
+                    self._listen_pending(connection)
+                    for channel, payload in self._notifications(connection):
+                        LocalBroker.publish(self, channel, json.loads(payload))
+                    backoff = self.poll_interval
+            except Exception:
+                logger.exception("PostgreSQL notification listener failed; reconnecting in %.0fs", backoff)
+            finally:
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _connect(self):
+        wrapper = connections[self.using]
+        # A dedicated connection, outside of any pool: it LISTENs for the process' lifetime.
+        connection = wrapper.Database.connect(**wrapper.get_connection_params())
+        connection.autocommit = True
+        # A new connection listens to nothing yet.
+        with self._lock:
+            self._pending |= self._listening
+            self._listening = set()
+        return connection
+
+    def _listen_pending(self, connection):
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        if not pending:
+            return
+        try:
+            with connection.cursor() as cursor:
+                for channel in pending:
+                    cursor.execute(f'LISTEN "{channel}"')
+        except Exception:
+            with self._lock:
+                self._pending |= pending
+            raise
+        with self._lock:
+            self._listening |= pending
+
+    def _notifications(self, connection):
+        if hasattr(connection, 'poll'):
+            # psycopg2
+            if select.select([connection], [], [], self.poll_interval)[0]:
+                connection.poll()
+                while connection.notifies:
+                    notify = connection.notifies.pop(0)
+                    yield notify.channel, notify.payload
+        else:
+            # psycopg 3
+            for notify in connection.notifies(timeout=self.poll_interval):
+                yield notify.channel, notify.payload
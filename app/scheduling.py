@@ -0,0 +1,141 @@
+"""
+Per-professional scheduling engine.
+
+Every Staff member owns an independent timeline of CalendarEvent rows. Events
+are half-open intervals ``[start, end)``: an event ending at 10:00 does not
+conflict with one starting at 10:00.
+
+Two complementary tools live here:
+
+* ``find_conflict`` answers "does this slot conflict?" with a single query
+  on the ``(prof, start_time)`` index.
+* ``IntervalIndex`` holds a professional's timeline in memory, sorted by start
+  time, and answers the same question with a binary search. It is meant for
+  checking a batch of N proposed events without N round-trips.
+"""
+from bisect import bisect_left, bisect_right
+
+
+def find_conflict(prof, start, end, exclude_pk=None):
+    """
+    Return the latest event of ``prof`` overlapping ``[start, end)`` or None.
+
+    Events are walked back from ``end`` on the composite index. When the
+    timeline is disjoint the first event walked decides, but rows written
+    without ``clean()`` (bulk inserts, ``update()``, legacy data) may overlap,
+    so every candidate is checked for ``end_time > start`` rather than only
+    the latest one. Unassigned events (``prof`` None) belong to no timeline
+    and never conflict.
+    """
+    from .models import CalendarEvent
+
+    if prof is None:
+        return None
+    candidates = CalendarEvent.objects.filter(prof=prof, start_time__lt=end, end_time__gt=start)
+    if exclude_pk is not None:
+        candidates = candidates.exclude(pk=exclude_pk)
+    return candidates.order_by('-start_time').first()
+
+
+class IntervalIndex:
+    """
+    A sorted index of ``(start, end, key)`` intervals for one professional.
+
+    While the stored intervals are disjoint their ends are sorted as well, so
+    every lookup is two binary searches. If legacy rows overlap, the index
+    still answers correctly but falls back to scanning the candidates that
+    start before the queried slot ends.
+    """
+
+    def __init__(self, intervals=()):
+        self._starts = []
+        self._ends = []
+        self._keys = []
+        self._disjoint = True
+        for start, end, key in sorted(intervals, key=lambda item: item[0]):
+            self._append(start, end, key)
+
+    @classmethod
+    def for_staff(cls, prof, start=None, end=None, exclude_pks=()):
+        """
+        Load the timeline of ``prof`` with a single range query, optionally
+        restricted to events touching ``[start, end)``.
+        """
+        from .models import CalendarEvent
+
+        events = CalendarEvent.objects.filter(prof=prof)
+        if start is not None:
+            events = events.filter(end_time__gt=start)
+        if end is not None:
+            events = events.filter(start_time__lt=end)
+        if exclude_pks:
+            events = events.exclude(pk__in=exclude_pks)
+        rows = events.order_by('start_time').values_list('start_time', 'end_time', 'pk')
+        return cls(rows)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def _append(self, start, end, key):
+        if self._ends and start < self._ends[-1]:
+            self._disjoint = False
+        self._starts.append(start)
+        self._ends.append(end)
+        self._keys.append(key)
+
+    def conflicts(self, start, end):
+        """Return the keys of every stored interval overlapping ``[start, end)``."""
+        hi = bisect_left(self._starts, end)
+        if self._disjoint:
+            lo = bisect_right(self._ends, start)
+            return self._keys[lo:hi]
+        return [
+            self._keys[i] for i in range(hi) if self._ends[i] > start
+        ]
+
+    def has_conflict(self, start, end):
+        hi = bisect_left(self._starts, end)
+        if hi == 0:
+            return False
+        if self._disjoint:
+            return self._ends[hi - 1] > start
+        return any(self._ends[i] > start for i in range(hi))
+
+    def add(self, start, end, key):
+        """
+        Insert an interval, keeping the index sorted.
+
+        Raises ValueError if it overlaps a stored interval, which keeps the
+        index disjoint and its lookups logarithmic.
+        """
+        if end <= start:
+            raise ValueError("The end time must be after the start time.")
+        if self.has_conflict(start, end):
+            raise ValueError(f"Interval {start} - {end} overlaps an existing event.")
+        i = bisect_left(self._starts, start)
+        self._starts.insert(i, start)
+        self._ends.insert(i, end)
+        self._keys.insert(i, key)
+
+    def batch_conflicts(self, proposed):
+        """
+        Check a batch of proposed ``(start, end, key)`` intervals.
+
+        Returns a list of ``(key, conflicting_key)`` pairs covering conflicts
+        with stored events as well as conflicts between proposed events
+        themselves. Stored events are matched with one binary search per
+        proposal; the proposals are checked against each other with a sort
+        and a single sweep.
+        """
+        proposed = list(proposed)
+        found = []
+        for start, end, key in proposed:
+            found.extend((key, other) for other in self.conflicts(start, end))
+
+        # Sweep the proposals in start order, keeping the ones still open.
+        active = []
+        for start, end, key in sorted(proposed, key=lambda item: item[0]):
+            active = [item for item in active if item[0] > start]
+            found.extend((key, other_key) for _, other_key in active)
+            active.append((end, key))
+        return found
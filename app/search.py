@@ -0,0 +1,213 @@
+"""
+Ranked patient search for type-ahead.
+
+Queries that look like an e-mail address are answered by a prefix range on
+the directory's e-mail index. Other queries go to the configured backend,
+which matches every word as a prefix of the patient's names, social security
+number or the local part of the e-mail address (before the ``@``) and returns
+the best matches first:
+
+* ``SQLiteFTSBackend`` keeps an FTS5 table, ``app_patient_fts``, whose rowid is
+  the patient id, with prefix indexes up to six characters. Matches are
+  ranked with bm25.
+* ``PostgresTrigramBackend`` needs no extra table: a ``pg_trgm`` GIN index on
+  the directory's search text serves ``<%`` (word similarity) matches, and
+  whole-word regular expressions, ranked by ``word_similarity``.
+
+Ranking every match of a short common prefix costs hundreds of milliseconds
+at a million patients, so both rank at most ``CANDIDATES`` rows from each of
+two indexed lookups: patients having every query word as a whole word, then
+patients matching every word as a prefix. Exact matches come first, so a
+complete name finds its patient however many longer names share its prefix.
+* ``DirectoryBackend`` is the fallback for other databases: the indexed name
+  prefix and SSN lookups of ``app.directory.search``. It does not search
+  e-mail local parts.
+
+``settings.PATIENT_SEARCH_BACKEND`` picks the backend; when empty it follows
+the database vendor. Migration 0014 creates the FTS table or the trigram
+index and 0015 adds the e-mail to it. The FTS table is kept in sync from the same signals as the directory,
+and ``manage.py reindex_patient_search`` rebuilds it.
+"""
+import re
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from . import directory
+from .models import PatientDirectory
+
+FTS_TABLE = 'app_patient_fts'
+# The expression covered by the trigram index; queries must repeat it verbatim.
+TRIGRAM_EXPRESSION = (
+    "(lower(first_name || ' ' || last_name) || ' ' || social_sec_number::text "
+    "|| ' ' || lower(split_part(email, '@', 1)))"
+)
+CANDIDATES = 200
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Queries shorter than this match too many rows to rank; they use the
+# directory's indexed prefix lookups instead.
+MIN_RANKED_LENGTH = 3
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = settings.PATIENT_SEARCH_BACKEND or {
+                    'sqlite': 'app.search.SQLiteFTSBackend',
+                    'postgresql': 'app.search.PostgresTrigramBackend',
+                }.get(connection.vendor, 'app.search.DirectoryBackend')
+                _backend = import_string(path)()
+    return _backend
+
+
+def tokenize(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def looks_like_email(query):
+    return '@' in query or ('.' in query and not any(char.isspace() for char in query))
+
+
+def search_email(query, limit, prof_id=None):
+    """Patients whose e-mail starts with ``query``, in e-mail order."""
+    entries = PatientDirectory.objects.filter(
+        email__gte=query, email__lt=query + '\U0010ffff', is_active=True,
+    ).order_by('email')
+    if prof_id is not None:
+        entries = entries.filter(prof_id=prof_id)
+    return list(entries[:limit])
+
+
+def search(query, limit=DEFAULT_LIMIT, prof_id=None):
+    """Up to ``limit`` PatientDirectory rows matching ``query``, best first."""
+    query = query.strip()
+    limit = min(limit, MAX_LIMIT)
+    if looks_like_email(query):
+        return search_email(query, limit, prof_id=prof_id)
+    return get_backend().search(query, limit, prof_id=prof_id)
+
+
+def index(patient_ids):
+    get_backend().index(list(patient_ids))
+
+
+def remove(patient_ids):
+    get_backend().remove(list(patient_ids))
+
+
+class DirectoryBackend:
+    """Prefix search on the directory's B-tree indexes; needs no index of its own."""
+
+    def search(self, query, limit, prof_id=None):
+        return directory.search(query, prof_id=prof_id, limit=limit)[0]
+
+    def index(self, patient_ids):
+        pass
+
+    def remove(self, patient_ids):
+        pass
+
+    def rebuild(self):
+        return 0
+
+
+class SQLiteFTSBackend(DirectoryBackend):
+    batch_size = 500
+
+    def search(self, query, limit, prof_id=None):
+        tokens = tokenize(query)
+        if len(''.join(tokens)) < MIN_RANKED_LENGTH:
+            return super().search(query, limit, prof_id=prof_id)
+        table = PatientDirectory._meta.db_table
+
+        def candidates(match, tier):
+            sql = (
+                f'SELECT * FROM (SELECT f.rowid AS id, {tier} AS tier, f.rank AS rank FROM {FTS_TABLE} f '
+                f'JOIN {table} d ON d.patient_id = f.rowid WHERE {FTS_TABLE} MATCH %s AND d.is_active'
+            )
+            params = [match]
+            if prof_id is not None:
+                sql += ' AND d.prof_id = %s'
+                params.append(prof_id)
+            return f'{sql} LIMIT %s)', params + [CANDIDATES]
+
+        exact, exact_params = candidates(' '.join(f'"{token}"' for token in tokens), 0)
+        prefix, prefix_params = candidates(' '.join(f'"{token}"*' for token in tokens), 1)
+        # SQLite takes the bare rank column from the row holding MIN(tier).
+        sql = (
+            f'SELECT d.* FROM (SELECT id, MIN(tier) AS tier, rank FROM ({exact} UNION ALL {prefix}) GROUP BY id) c '
+            f'JOIN {table} d ON d.patient_id = c.id ORDER BY c.tier, c.rank LIMIT %s'
+        )
+        return list(PatientDirectory.objects.raw(sql, exact_params + prefix_params + [limit]))
+
+    def _insert_sql(self, where=''):
+        return (
+            f'INSERT INTO {FTS_TABLE} (rowid, name, ssn, email) '
+            f"SELECT patient_id, first_name || ' ' || last_name, social_sec_number, "
+            f"substr(email, 1, instr(email, '@') - 1) "
+            f'FROM {PatientDirectory._meta.db_table} {where}'
+        )
+
+    def index(self, patient_ids):
+        for i in range(0, len(patient_ids), self.batch_size):
+            batch = patient_ids[i:i + self.batch_size]
+            placeholders = ', '.join(['%s'] * len(batch))
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', batch)
+                cursor.execute(self._insert_sql(f'WHERE patient_id IN ({placeholders})'), batch)
+
+    def remove(self, patient_ids):
+        for i in range(0, len(patient_ids), self.batch_size):
+            batch = patient_ids[i:i + self.batch_size]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({", ".join(["%s"] * len(batch))})', batch,
+                )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(self._insert_sql())
+            written = cursor.rowcount
+            # Merge the index segments for faster queries.
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        return written
+
+
+class PostgresTrigramBackend(DirectoryBackend):
+    def search(self, query, limit, prof_id=None):
+        text = ' '.join(tokenize(query))
+        if len(text) < MIN_RANKED_LENGTH:
+            return super().search(query, limit, prof_id=prof_id)
+        table = PatientDirectory._meta.db_table
+
+        def candidates(conditions, params, tier):
+            sql = (
+                f'SELECT * FROM (SELECT patient_id AS id, {tier} AS tier, '
+                f'word_similarity(%s, {TRIGRAM_EXPRESSION}) AS score FROM {table} '
+                f'WHERE {" AND ".join(conditions)} AND is_active'
+            )
+            params = [text, *params]
+            if prof_id is not None:
+                sql += ' AND prof_id = %s'
+                params.append(prof_id)
+            return f'{sql} LIMIT %s) t{tier}', params + [CANDIDATES]
+
+        tokens = text.split()
+        exact, exact_params = candidates(
+            [f'{TRIGRAM_EXPRESSION} ~ %s'] * len(tokens), [rf'\m{token}\M' for token in tokens], 0,
+        )
+        prefix, prefix_params = candidates([f'%s <%% {TRIGRAM_EXPRESSION}'], [text], 1)
+        sql = (
+            f'SELECT d.* FROM (SELECT DISTINCT ON (id) * FROM ({exact} UNION ALL {prefix}) u ORDER BY id, tier) c '
+            f'JOIN {table} d ON d.patient_id = c.id ORDER BY c.tier, c.score DESC, d.sort_name LIMIT %s'
+        )
+        return list(PatientDirectory.objects.raw(sql, exact_params + prefix_params + [limit]))
@@ -0,0 +1,131 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import availability, counters, directory, fragments, inbox, profiles, search, thumbnails
+from .models import Calendar, CalendarEvent, CustomUser, Message, Patient, Staff
+from .pubsub import get_broker
+
+
+def _touches(update_fields, fields):
+    return update_fields is None or not fields.isdisjoint(update_fields)
+
+
+## AVAILABILITY CACHE ##
+@receiver([post_save, post_delete], sender=CalendarEvent)
+def invalidate_event_availability(sender, instance, **kwargs):
+    availability.invalidate(instance.prof_id)
+    loaded_prof_id = getattr(instance, '_loaded_prof_id', None)
+    if loaded_prof_id != instance.prof_id:
+        availability.invalidate(loaded_prof_id)
+
+
+@receiver([post_save, post_delete], sender=Calendar)
+def invalidate_calendar_availability(sender, instance, **kwargs):
+    availability.invalidate(instance.prof_id)
+
+
+## DASHBOARD FRAGMENTS ##
+# Connected before the unread counters, which reset _loaded_recipient_id.
+@receiver([post_save, post_delete], sender=Message)
+def invalidate_message_fragments(sender, instance, **kwargs):
+    fragments.invalidate(instance.recipient_id, getattr(instance, '_loaded_recipient_id', None))
+
+
+@receiver([post_save, post_delete], sender=Calendar)
+def invalidate_calendar_fragments(sender, instance, **kwargs):
+    fragments.invalidate(instance.patient_id, instance.prof_id)
+
+
+@receiver([post_save, post_delete], sender=CalendarEvent)
+def invalidate_event_fragments(sender, instance, **kwargs):
+    patient_ids = Calendar.objects.filter(cal_events_id=instance.pk).values_list('patient_id', flat=True)
+    fragments.invalidate(instance.prof_id, getattr(instance, '_loaded_prof_id', None), *patient_ids)
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+@receiver([post_save, post_delete], sender=Staff)
+@receiver([post_save, post_delete], sender=Patient)
+def invalidate_user_fragments(sender, instance, update_fields=None, **kwargs):
+    if _touches(update_fields, {'first_name', 'role'}):
+        fragments.invalidate(instance.pk)
+
+
+## UNREAD COUNTERS ##
+@receiver(post_save, sender=Message)
+def count_saved_message(sender, instance, created, **kwargs):
+    counters.message_saved(instance, created)
+
+
+@receiver(post_delete, sender=Message)
+def count_deleted_message(sender, instance, **kwargs):
+    counters.message_deleted(instance)
+
+
+## PUSH NOTIFICATIONS ##
+@receiver(post_save, sender=Message)
+def announce_new_message(sender, instance, created, **kwargs):
+    if created and instance.recipient_id is not None:
+        channel = inbox.channel_name(instance.recipient_id)
+        event = inbox.message_event(instance)
+        transaction.on_commit(lambda: get_broker().publish(channel, event))
+
+
+## PROFILE CACHE ##
+@receiver([post_save, post_delete], sender=CustomUser)
+@receiver([post_save, post_delete], sender=Staff)
+@receiver([post_save, post_delete], sender=Patient)
+def invalidate_profile(sender, instance, **kwargs):
+    profiles.invalidate(instance.pk)
+
+
+## PATIENT DIRECTORY ##
+@receiver(post_save, sender=Patient)
+def sync_directory_patient(sender, instance, update_fields=None, **kwargs):
+    if _touches(update_fields, directory.PATIENT_FIELDS):
+        directory.sync_patient(instance)
+        search.index([instance.pk])
+
+
+@receiver(post_save, sender=Staff)
+def sync_directory_prof_name(sender, instance, update_fields=None, **kwargs):
+    if _touches(update_fields, {'first_name', 'last_name'}):
+        directory.rename_prof(instance)
+
+
+@receiver(post_save, sender=CustomUser)
+def sync_directory_user(sender, instance, update_fields=None, **kwargs):
+    # Saves through the base model, e.g. the user admin or last_login updates.
+    if not _touches(update_fields, directory.PATIENT_FIELDS):
+        return
+    if instance.role == 'patient':
+        if directory.refresh([instance.pk]):
+            search.index([instance.pk])
+    elif instance.role in profiles.STAFF_ROLES:
+        directory.rename_prof(instance)
+
+
+@receiver(post_delete, sender=Patient)
+@receiver(post_delete, sender=CustomUser)
+def remove_from_search(sender, instance, **kwargs):
+    # The directory row goes with the patient's by cascade.
+    search.remove([instance.pk])
+
+
+## AVATAR THUMBNAILS ##
+@receiver(post_save, sender=CustomUser)
+@receiver(post_save, sender=Staff)
+@receiver(post_save, sender=Patient)
+def refresh_avatar_thumbnails(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_avatar', None) or ''
+    current = instance.avatar.name or ''
+    if current == loaded:
+        return
+    instance._loaded_avatar = current
+
+    def refresh():
+        if loaded:
+            thumbnails.delete_thumbnails(loaded)
+        if current:
+            thumbnails.schedule(current)
+    transaction.on_commit(refresh)
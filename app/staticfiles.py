@@ -0,0 +1,85 @@
+"""
+Production static files: content-hashed names, no source maps, precompressed.
+
+``CompressedManifestStaticFilesStorage`` extends Django's manifest storage,
+which copies every file to a name containing a hash of its content
+(``css/style.3f2a9c1b7e4d.css``) and rewrites ``{% static %}`` URLs to it.
+Those names can be cached forever, see the ``/static/`` location in
+nginx/nginx.conf. On top of that, collectstatic:
+
+* drops ``*.map`` files and the ``sourceMappingURL`` comments pointing at
+  them, so production never ships or requests source maps;
+* writes ``.gz`` (and ``.br`` when the ``brotli`` package is installed)
+  siblings of each compressible hashed file, served as-is by nginx's
+  ``gzip_static``/``brotli_static`` instead of being compressed per request.
+"""
+import gzip
+import re
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SOURCE_MAP_COMMENT = re.compile(rb'^[ \t]*(?:/\*|//)# sourceMappingURL=[^\r\n]*\r?\n?', re.MULTILINE)
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.xml', '.html', '.ico', '.ttf', '.otf', '.eot')
+# The 12 hex digits ManifestStaticFilesStorage adds; nginx matches the same pattern.
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+# Below this, the compressed file and its headers save next to nothing.
+MIN_COMPRESS_SIZE = 512
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        paths = self.strip_source_maps(paths)
+        yield from super().post_process(paths, dry_run, **options)
+        for name in sorted(set(self.hashed_files.values())):
+            for compressed_name in self.compress(name):
+                yield name, compressed_name, True
+
+    def strip_source_maps(self, paths):
+        """
+        Remove the copied ``*.map`` files and the comments referencing them.
+        Stripped files are rewritten in place, then hashed from that copy.
+        """
+        kept = {}
+        for path, (storage, source) in paths.items():
+            if path.endswith('.map'):
+                self.delete(path)
+                continue
+            if path.endswith(('.css', '.js')):
+                with storage.open(source) as f:
+                    content = f.read()
+                stripped = SOURCE_MAP_COMMENT.sub(b'', content)
+                if stripped != content:
+                    self.delete(path)
+                    self._save(path, ContentFile(stripped))
+                    storage, source = self, path
+            kept[path] = (storage, source)
+        return kept
+
+    def compress(self, name):
+        """Write the compressed siblings of ``name`` worth keeping and return their names."""
+        if not name.endswith(COMPRESSIBLE):
+            return []
+        with self.open(name) as f:
+            content = f.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return []
+        variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(content, quality=11)))
+        written = []
+        for suffix, compressed in variants:
+            if len(compressed) >= len(content) * 0.95:
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(compressed))
+            written.append(name + suffix)
+        return written
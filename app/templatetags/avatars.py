@@ -0,0 +1,39 @@
+from django import template
+from django.core.files.storage import default_storage
+
+from app.thumbnails import pick_size, thumbnail_name, thumbnails_ready
+
+register = template.Library()
+
+
+def _variant_url(user, size, ext, ready):
+    if not user.avatar:
+        return ''
+    if ready:
+        return default_storage.url(thumbnail_name(user.avatar.name, pick_size(size), ext))
+    # Thumbnails are still being generated: fall back to the original upload.
+    return user.avatar.url
+
+
+def _ready(user):
+    return bool(user.avatar) and thumbnails_ready(user.avatar.name)
+
+
+@register.simple_tag
+def avatar_url(user, size=64, ext='jpg'):
+    """URL of the ``user``'s avatar variant closest to ``size`` pixels."""
+    return _variant_url(user, size, ext, _ready(user))
+
+
+@register.inclusion_tag('partials/avatar.html')
+def avatar(user, size=64):
+    """``<picture>`` with WebP and JPEG sources, plus a 2x variant for dense screens."""
+    ready = _ready(user)
+    return {
+        'user': user,
+        'size': size,
+        'webp': _variant_url(user, size, 'webp', ready),
+        'webp_2x': _variant_url(user, size * 2, 'webp', ready),
+        'jpg': _variant_url(user, size, 'jpg', ready),
+        'jpg_2x': _variant_url(user, size * 2, 'jpg', ready),
+    }
@@ -0,0 +1,57 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from app.fragments import get_or_render, get_or_render_shared
+
+register = template.Library()
+
+
+class CachedFragmentNode(template.Node):
+    def __init__(self, nodelist, name):
+        self.nodelist = nodelist
+        self.name = name
+
+    def render(self, context):
+        user = context.get('user')
+        user_id = user.pk if user is not None and user.is_authenticated else None
+        return mark_safe(get_or_render(user_id, self.name.resolve(context), lambda: self.nodelist.render(context)))
+
+
+@register.tag
+def cached_fragment(parser, token):
+    """
+    Cache the enclosed block per user until one of their objects changes::
+
+        {% cached_fragment "sidebar" %}...{% endcached_fragment %}
+    """
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes one argument: the fragment name.")
+    nodelist = parser.parse(('endcached_fragment',))
+    parser.delete_first_token()
+    return CachedFragmentNode(nodelist, parser.compile_filter(bits[1]))
+
+
+class SharedFragmentNode(template.Node):
+    def __init__(self, nodelist, name):
+        self.nodelist = nodelist
+        self.name = name
+
+    def render(self, context):
+        return mark_safe(get_or_render_shared(self.name.resolve(context), lambda: self.nodelist.render(context)))
+
+
+@register.tag
+def shared_fragment(parser, token):
+    """
+    Render the enclosed block once per process for every user. Only for
+    content that depends on nothing in the context, such as a role's links::
+
+        {% shared_fragment "patient-sidebar" %}...{% endshared_fragment %}
+    """
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes one argument: the fragment name.")
+    nodelist = parser.parse(('endshared_fragment',))
+    parser.delete_first_token()
+    return SharedFragmentNode(nodelist, parser.compile_filter(bits[1]))
@@ -0,0 +1,44 @@
+"""
+Test helpers for keeping per-view query counts in check.
+
+``assertNumQueries`` pins an exact count, which breaks on every harmless
+change; a budget only fails when a view starts issuing more queries than it
+is allowed, which is how N+1 regressions show up.
+
+    with query_budget(5):
+        client.get(url)
+
+    @max_queries(5)
+    def test_dashboard(self): ...
+"""
+from contextlib import contextmanager
+from functools import wraps
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(limit, using='default'):
+    """Fail if the block runs more than ``limit`` queries on ``using``."""
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+    executed = len(context)
+    if executed > limit:
+        queries = '\n'.join(f'{i}. {query["sql"]}' for i, query in enumerate(context.captured_queries, start=1))
+        raise QueryBudgetExceeded(f'{executed} queries executed, the budget is {limit}:\n{queries}')
+
+
+def max_queries(limit, using='default'):
+    """Decorator form of ``query_budget`` for whole test methods."""
+    def decorator(test):
+        @wraps(test)
+        def wrapper(*args, **kwargs):
+            with query_budget(limit, using=using):
+                return test(*args, **kwargs)
+        return wrapper
+    return decorator
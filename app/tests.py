@@ -1,3 +1,856 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import hashlib
+import tempfile
+from contextlib import nullcontext
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db.models import F
+from django.http import Http404
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import counters, directory, fragments, search, thumbnails
+from .changelists import EstimatedCountPaginator
+from .counters import count_unread, unread_count
+from .downloads import serve_public_media
+from .inbox import mark_read
+from .models import (
+    Calendar, CalendarEvent, ClinicalHistory, CustomUser, Message, Patient, PatientDirectory, Staff, UploadSession,
+)
+from .forms import ClinicHistCreation
+from .profiles import get_profile
+from .scheduling import IntervalIndex, find_conflict
+from .pubsub import PostgresBroker
+from .staticfiles import HASHED_NAME
+from .testing import QueryBudgetExceeded, max_queries, query_budget
+from .warmup import compile_templates, template_names
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Query budgets of the main views, measured with enough rows that a query
+    per row would blow them. Each request costs two queries before the view
+    runs: the session and the user. Cached fragments start cold.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = Staff.objects.create(email='doctor@example.com', first_name='Ann', last_name='Doe', role='doctor')
+        cls.patients = [
+            Patient.objects.create(
+                email=f'patient{i}@example.com', first_name='Pat', last_name=f'Ient{i}',
+                social_sec_number=1000 + i, prof_in_charge=cls.doctor,
+            )
+            for i in range(5)
+        ]
+        cls.patient = cls.patients[0]
+        for i, patient in enumerate(cls.patients * 4):
+            Message.objects.create(sender=patient, subject=f'Subject {i}', content='Hello')
+        start = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        for i, patient in enumerate(cls.patients):
+            event = CalendarEvent.objects.create(
+                name=f'Visit {i}', prof=cls.doctor,
+                start_time=start + timedelta(days=i), end_time=start + timedelta(days=i, minutes=30),
+            )
+            Calendar.objects.create(cal_events=event, prof=cls.doctor, patient=patient)
+
+    def get(self, user, name, budget, **kwargs):
+        self.client.force_login(user)
+        with query_budget(budget):
+            response = self.client.get(reverse(name, kwargs=kwargs))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_patient_dashboard(self):
+        self.get(self.patient, 'dashboard', 3)
+
+    def test_staff_dashboard(self):
+        self.get(self.doctor, 'dashboard', 4)
+
+    def test_send_message_form(self):
+        self.get(self.patient, 'send_message', 3)
+
+    def test_send_message_post(self):
+        self.client.force_login(self.patient)
+        # Inside TestCase the atomic save adds a SAVEPOINT and its RELEASE.
+        with query_budget(7):
+            response = self.client.post(reverse('send_message'), {'subject': 'Hi', 'content': 'Hello'})
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+    def test_request_appointment(self):
+        self.get(self.patient, 'request_appointment', 4)
+
+    def test_staff_availability(self):
+        # Cold: the professional and their events; then the events come from the cache.
+        self.get(self.doctor, 'staff_availability', 4, staff_id=self.doctor.pk)
+        self.get(self.doctor, 'staff_availability', 3, staff_id=self.doctor.pk)
+
+    def test_inbox(self):
+        self.get(self.doctor, 'inbox', 3)
+
+    def test_inbox_api(self):
+        self.get(self.doctor, 'inbox_api', 3)
+
+    def test_view_patients(self):
+        self.get(self.doctor, 'view_patients', 3)
+
+    def test_admin_changelists(self):
+        superuser = CustomUser.objects.create(email='admin@example.com', is_admin=True)
+        # Session, user, bounded count and the page itself.
+        self.get(superuser, 'admin:app_patient_changelist', 4)
+        self.get(superuser, 'admin:app_staff_changelist', 4)
+        self.get(superuser, 'admin:app_calendar_changelist', 4)
+
+    def test_admin_search_and_filter(self):
+        superuser = CustomUser.objects.create(email='admin@example.com', is_admin=True)
+        self.client.force_login(superuser)
+        url = reverse('admin:app_patient_changelist')
+        for params, expected in (
+            ({'q': 'ient1'}, 1),
+            ({'q': 'IENT'}, 5),
+            ({'q': 'ent'}, 0),
+            ({'q': '1003'}, 1),
+            ({'prof_in_charge__customuser_ptr__exact': self.doctor.pk}, 5),
+        ):
+            with query_budget(5):
+                response = self.client.get(url, params)
+            self.assertEqual(response.context['cl'].result_count, expected, params)
+
+    def test_estimated_count(self):
+        patients = Patient.objects.order_by('pk')
+        with mock.patch.object(EstimatedCountPaginator, 'count_limit', 3):
+            self.assertEqual(EstimatedCountPaginator(patients.filter(social_sec_number__lt=1002), 2).count, 2)
+            # SQLite has no estimate: past the limit the count is exact.
+            self.assertEqual(EstimatedCountPaginator(patients, 2).count, 5)
+            with mock.patch('app.changelists.estimate_count', return_value=100):
+                self.assertEqual(EstimatedCountPaginator(patients, 2).count, 100)
+            with mock.patch('app.changelists.estimate_count', return_value=1):
+                self.assertEqual(EstimatedCountPaginator(patients, 2).count, 4)
+
+
+class SchedulingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = Staff.objects.create(email='doctor@example.com', role='doctor')
+        cls.day = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        # Overlapping rows, as bulk inserts or update() can leave them.
+        cls.long, cls.short = CalendarEvent.objects.bulk_create([
+            CalendarEvent(name='Surgery', prof=cls.doctor, start_time=cls.at(8), end_time=cls.at(12)),
+            CalendarEvent(name='Call', prof=cls.doctor, start_time=cls.at(9), end_time=cls.at(9.5)),
+        ])
+
+    @classmethod
+    def at(cls, hour):
+        return cls.day + timedelta(hours=hour)
+
+    def assertConflict(self, start, end, expected, **kwargs):
+        found = find_conflict(self.doctor, self.at(start), self.at(end), **kwargs)
+        self.assertEqual(found and found.pk, expected and expected.pk)
+        index = IntervalIndex.for_staff(self.doctor, exclude_pks=[kwargs['exclude_pk']] if kwargs else ())
+        self.assertEqual(index.has_conflict(self.at(start), self.at(end)), expected is not None)
+
+    def test_find_conflict(self):
+        self.assertConflict(11, 11.5, self.long)
+        self.assertConflict(9, 10, self.short)
+        self.assertConflict(12, 13, None)
+        self.assertConflict(7, 8, None)
+        self.assertConflict(9, 9.5, self.long, exclude_pk=self.short.pk)
+
+    def test_unassigned_events_never_conflict(self):
+        CalendarEvent.objects.create(name='Open', start_time=self.at(8), end_time=self.at(9))
+        self.assertIsNone(find_conflict(None, self.at(8), self.at(9)))
+        CalendarEvent(name='Open', start_time=self.at(8), end_time=self.at(9)).clean()
+
+
+class PatientDirectoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = Staff.objects.create(email='doctor@example.com', first_name='Ann', last_name='Doe', role='doctor')
+        for i, (first, last) in enumerate([('Ada', 'Byron'), ('Alan', 'Turing'), ('Grace', 'Hopper'), ('Ken', 'Thompson')]):
+            Patient.objects.create(
+                email=f'{first.lower()}@example.com', first_name=first, last_name=last,
+                social_sec_number=100 + i, prof_in_charge=cls.doctor if i % 2 else None,
+            )
+
+    def test_maintained_on_save(self):
+        entry = PatientDirectory.objects.get(last_name='Turing')
+        self.assertEqual((entry.sort_name, entry.prof_name), ('turing alan', 'Ann Doe'))
+
+        self.doctor.last_name = 'Smith'
+        self.doctor.save()
+        user = CustomUser.objects.get(email='alan@example.com')
+        user.first_name = 'Alan M.'
+        user.save()
+        entry.refresh_from_db()
+        self.assertEqual((entry.first_name, entry.prof_name), ('Alan M.', 'Ann Smith'))
+
+        Patient.objects.get(email='alan@example.com').delete()
+        self.assertFalse(PatientDirectory.objects.filter(last_name='Turing').exists())
+
+    def test_rebuild(self):
+        PatientDirectory.objects.all().delete()
+        self.assertEqual(directory.rebuild(), 4)
+        self.assertEqual(PatientDirectory.objects.get(social_sec_number=103).prof_id, self.doctor.pk)
+
+    def test_search_and_pages(self):
+        names = []
+        cursor = None
+        while True:
+            page, cursor = directory.search(cursor=cursor, limit=3)
+            names += [entry.last_name for entry in page]
+            if cursor is None:
+                break
+        self.assertEqual(names, ['Byron', 'Hopper', 'Thompson', 'Turing'])
+        self.assertEqual([e.last_name for e in directory.search('t')[0]], ['Thompson', 'Turing'])
+        self.assertEqual([e.last_name for e in directory.search('102')[0]], ['Hopper'])
+        self.assertEqual([e.last_name for e in directory.search('ada@example.com')[0]], ['Byron'])
+        self.assertEqual([e.last_name for e in directory.search(prof_id=self.doctor.pk)[0]], ['Thompson', 'Turing'])
+
+
+class PatientSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = Staff.objects.create(email='doctor@example.com', first_name='Ann', last_name='Doe', role='doctor')
+        for i, (first, last) in enumerate([('Ada', 'Byron'), ('Alan', 'Turing'), ('Alana', 'Turner'), ('Grace', 'Hopper')]):
+            Patient.objects.create(
+                email=f'{first.lower()}.{last.lower()}@example.com', first_name=first, last_name=last,
+                social_sec_number=123450 + i, prof_in_charge=cls.doctor if i % 2 else None,
+            )
+
+    def names(self, query, **kwargs):
+        return sorted(entry.last_name for entry in search.search(query, **kwargs))
+
+    def test_prefixes(self):
+        self.assertEqual(self.names('tur'), ['Turing', 'Turner'])
+        self.assertEqual(self.names('alan tur'), ['Turing', 'Turner'])
+        self.assertEqual(self.names('alana'), ['Turner'])
+        self.assertEqual(self.names('12345'), ['Byron', 'Hopper', 'Turing', 'Turner'])
+        self.assertEqual(self.names('grace.h'), ['Hopper'])
+        self.assertEqual(self.names('tur', prof_id=self.doctor.pk), ['Turing'])
+        self.assertEqual(self.names('tu'), ['Turing', 'Turner'])
+
+    def test_email_local_part(self):
+        Patient.objects.create(email='jdoe@example.com', first_name='John', last_name='Smith', social_sec_number=7)
+        self.assertEqual(self.names('jdoe'), ['Smith'])
+        self.assertEqual(self.names('jdo'), ['Smith'])
+        self.assertEqual(self.names('grace hop'), ['Hopper'])
+        # The shared domain is not indexed.
+        self.assertEqual(self.names('example'), [])
+
+    def test_exact_match_beyond_candidates(self):
+        # Created last, so every prefix-only match comes before it in rowid order.
+        patient = Patient.objects.create(
+            email='ada.tur@example.com', first_name='Ada', last_name='Tur', social_sec_number=999,
+        )
+        with mock.patch('app.search.CANDIDATES', 2):
+            self.assertEqual(search.search('tur')[0].pk, patient.pk)
+            self.assertEqual(search.search('ada tur')[0].pk, patient.pk)
+            self.assertEqual(self.names('tur', limit=5), ['Tur', 'Turing', 'Turner'])
+
+    def test_kept_in_sync(self):
+        patient = Patient.objects.get(last_name='Hopper')
+        patient.last_name = 'Murray'
+        patient.email = 'grace.murray@example.com'
+        patient.save()
+        self.assertEqual(self.names('hop'), [])
+        self.assertEqual(self.names('murr'), ['Murray'])
+        patient.delete()
+        self.assertEqual(self.names('murr'), [])
+        self.assertEqual(search.get_backend().rebuild(), 3)
+        self.assertEqual(self.names('tur'), ['Turing', 'Turner'])
+
+    def test_api(self):
+        self.client.force_login(self.doctor)
+        with query_budget(4):
+            response = self.client.get(reverse('patient_search'), {'q': 'byr'})
+        self.assertEqual(response.json()['results'][0]['name'], 'Ada Byron')
+        self.assertEqual(self.client.get(reverse('patient_search'), {'limit': 'x'}).status_code, 400)
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = Staff.objects.create(email='doctor@example.com', first_name='Ann', last_name='Doe', role='doctor')
+        for i in range(25):
+            Staff.objects.create(email=f'staff{i}@example.com', first_name='Sam', last_name=f'Staff{i:02}', role='assistant')
+            Patient.objects.create(
+                email=f'patient{i}@example.com', first_name='Pat', last_name=f'Ient{i:02}', social_sec_number=i,
+            )
+
+    def test_form_renders_selected_choice_only(self):
+        patient = Patient.objects.get(social_sec_number=7)
+        form = ClinicHistCreation(initial={'patient': patient.pk})
+        with self.assertNumQueries(1):
+            html = str(form['patient']) + str(form['prof'])
+        self.assertEqual(html.count('<option'), 3)
+        self.assertIn('Pat Ient07', html)
+
+        form = ClinicHistCreation(data={'name': 'x', 'prof': self.doctor.pk, 'patient': patient.pk})
+        # The field and the model's foreign key check each look up the submitted pk.
+        with self.assertNumQueries(4):
+            self.assertTrue(form.is_valid())
+
+    def test_endpoints(self):
+        self.client.force_login(self.doctor)
+        response = self.client.get(reverse('staff_autocomplete'), {'q': 'staff'}).json()
+        self.assertEqual(len(response['results']), 20)
+        response = self.client.get(reverse('staff_autocomplete'), {'q': 'staff', 'after': response['next']}).json()
+        self.assertEqual([r['text'] for r in response['results']][0], 'Sam Staff20 <staff20@example.com>')
+        self.assertIsNone(response['next'])
+        response = self.client.get(reverse('patient_autocomplete'), {'q': 'ient1'}).json()
+        self.assertEqual(len(response['results']), 10)
+        self.assertEqual(self.client.get(reverse('patient_autocomplete'), {'after': '!'}).status_code, 400)
+
+        self.client.force_login(Patient.objects.get(social_sec_number=1))
+        self.assertEqual(self.client.get(reverse('staff_autocomplete')).status_code, 403)
+
+
+class DashboardFragmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = Staff.objects.create(email='doctor@example.com', first_name='Ann', last_name='Doe', role='doctor')
+        cls.patient = Patient.objects.create(
+            email='patient@example.com', first_name='Pat', last_name='Ient', social_sec_number=1,
+            prof_in_charge=cls.doctor,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.doctor)
+
+    def test_cached_until_invalidated(self):
+        self.client.get(reverse('dashboard'))
+        hits = fragments.stats()['hits']
+        # Session and user only: the counters come from the cached fragments.
+        with self.assertNumQueries(2):
+            self.client.get(reverse('dashboard'))
+        self.assertEqual(fragments.stats()['hits'], hits + 3)
+
+        Message.objects.create(sender=self.patient, recipient=self.doctor, subject='Hi', content='Hello')
+        start = timezone.now() + timedelta(days=1)
+        CalendarEvent.objects.create(name='Visit', prof=self.doctor, start_time=start, end_time=start + timedelta(hours=1))
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'Inbox (1)')
+        self.assertContains(response, 'Upcoming appointments: 1')
+
+        self.doctor.first_name = 'Anna'
+        self.doctor.save(update_fields=['first_name'])
+        self.assertContains(self.client.get(reverse('dashboard')), 'Welcome, Anna!')
+
+    @override_settings(TEMPLATE_PRODUCTION=True)
+    def test_shared_sidebar(self):
+        self.addCleanup(fragments._shared.clear)
+        self.assertContains(self.client.get(reverse('dashboard')), 'Upload Clinical History')
+        sidebar = fragments._shared['staff-sidebar']
+        self.client.force_login(self.patient)
+        self.assertContains(self.client.get(reverse('dashboard')), 'Send Message to Doctor')
+        self.assertIs(fragments._shared['staff-sidebar'], sidebar)
+        self.assertIn('patient-sidebar', fragments._shared)
+
+    def test_templates_compile(self):
+        self.assertEqual(compile_templates(), len(template_names()))
+
+    @override_settings(FRAGMENT_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        self.client.get(reverse('dashboard'))
+        with self.assertNumQueries(4):
+            self.client.get(reverse('dashboard'))
+
+
+class UnreadCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, cls.other = [Staff.objects.create(email=f'doctor{i}@example.com', role='doctor') for i in range(2)]
+        cls.patient = Patient.objects.create(email='patient@example.com', social_sec_number=1, prof_in_charge=cls.doctor)
+
+    def assertInSync(self):
+        for staff in (self.doctor, self.other):
+            self.assertEqual(unread_count(staff.pk), count_unread(staff.pk))
+
+    def send(self, **kwargs):
+        return Message.objects.create(sender=self.patient, recipient=self.doctor, subject='Hi', content='Hello', **kwargs)
+
+    def test_kept_in_sync(self):
+        first, second, third = self.send(), self.send(), self.send(is_read=True)
+        self.assertEqual(unread_count(self.doctor.pk), 2)
+        self.assertInSync()
+
+        first.is_read = True
+        first.save()
+        self.assertInSync()
+        third.is_read = False
+        third.save()
+        self.assertInSync()
+
+        second.recipient = self.other
+        second.save()
+        self.assertEqual(unread_count(self.other.pk), 1)
+        self.assertInSync()
+
+        mark_read(self.doctor.pk, [third.pk])
+        self.assertInSync()
+        # A stale instance, still unread in memory, saved and deleted after mark_read.
+        third.save()
+        self.assertInSync()
+        mark_read(self.doctor.pk, [third.pk])
+        mark_read(self.other.pk, None)
+        self.assertInSync()
+
+        fourth = self.send()
+        fourth.delete()
+        third.delete()
+        self.assertInSync()
+
+    def test_rebuild(self):
+        self.send()
+        self.send()
+        Message.objects.update(is_read=True)  # Bypasses the counters.
+        self.assertEqual(unread_count(self.doctor.pk), 2)
+        self.assertEqual(counters.rebuild(), 0)
+        self.assertInSync()
+        self.send()
+        counters.rebuild()
+        self.assertEqual(unread_count(self.doctor.pk), 1)
+
+
+class AsyncViewTests(TestCase):
+    """The async views, driven through the ASGI handler."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = Staff.objects.create(email='doctor@example.com', first_name='Ann', last_name='Doe', role='doctor')
+        cls.patient = Patient.objects.create(
+            email='patient@example.com', first_name='Pat', last_name='Ient', social_sec_number=1,
+            prof_in_charge=cls.doctor,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_inbox_round_trip(self):
+        await self.async_client.aforce_login(self.patient)
+        response = await self.async_client.post(reverse('send_message'), {'subject': 'Hi', 'content': 'Hello'})
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+        await self.async_client.aforce_login(self.doctor)
+        response = await self.async_client.get(reverse('inbox_api'))
+        self.assertEqual([message['subject'] for message in response.json()['messages']], ['Hi'])
+        response = await self.async_client.post(reverse('inbox_mark_read'), {'all': '1'}, headers={'Accept': 'application/json'})
+        self.assertEqual(response.json(), {'updated': 1})
+        response = await self.async_client.get(reverse('dashboard'))
+        self.assertContains(response, 'Welcome, Ann!')
+
+    async def test_inbox_rejects_bad_cursors(self):
+        await self.async_client.aforce_login(self.doctor)
+        for cursor in ('999999999999999999999999-1', '1-99999999999999999999', 'x-1', '1'):
+            with self.subTest(cursor=cursor):
+                response = await self.async_client.get(reverse('inbox'), {'before': cursor})
+                self.assertEqual(response.status_code, 400)
+                response = await self.async_client.get(reverse('inbox_api'), {'before': cursor})
+                self.assertEqual(response.status_code, 400)
+
+    async def test_mark_read_redirects_locally(self):
+        await self.async_client.aforce_login(self.doctor)
+        for next_url, expected in (('https://evil.example/', reverse('inbox')), ('/app/inbox/?unread=1', '/app/inbox/?unread=1')):
+            with self.subTest(next=next_url):
+                response = await self.async_client.post(reverse('inbox_mark_read'), {'all': '1', 'next': next_url})
+                self.assertRedirects(response, expected, fetch_redirect_response=False)
+
+    async def test_availability_rejects_bad_slots(self):
+        await self.async_client.aforce_login(self.patient)
+        for slot in ('0', '1441', '99999999999999', 'x'):
+            with self.subTest(slot=slot):
+                response = await self.async_client.get(
+                    reverse('staff_availability', kwargs={'staff_id': self.doctor.pk}), {'slot': slot},
+                )
+                self.assertEqual(response.status_code, 400)
+
+    async def test_staff_only(self):
+        await self.async_client.aforce_login(self.patient)
+        response = await self.async_client.get(reverse('inbox'))
+        self.assertEqual(response.status_code, 403)
+
+    async def test_signup(self):
+        response = await self.async_client.post(reverse('patient_signup'), {
+            'first_name': 'New', 'last_name': 'Patient', 'date_of_birth': '1990-01-01', 'email': 'new@example.com',
+            'password1': 'Sup3r-secret-pw', 'password2': 'Sup3r-secret-pw', 'social_sec_number': 2,
+        })
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+        patient = await Patient.objects.aget(email='new@example.com')
+        self.assertEqual(patient.role, 'patient')
+        self.assertTrue(await sync_to_async(patient.check_password)('Sup3r-secret-pw'))
+
+
+class PostgresBrokerTests(SimpleTestCase):
+    async def test_listener_reconnects(self):
+        opened = []
+
+        class Connection:
+            def __init__(self):
+                self.executed = []
+                opened.append(self)
+
+            def cursor(self):
+                return nullcontext(SimpleNamespace(execute=self.executed.append))
+
+            def close(self):
+                pass
+
+        class Broker(PostgresBroker):
+            poll_interval = 0.01
+
+            def _notifications(self, connection):
+                if len(opened) == 1:
+                    raise OSError('connection lost')
+                if not hasattr(self, 'delivered'):
+                    self.delivered = True
+                    yield 'inbox_1', '{"id": 1}'
+                    return
+                raise SystemExit  # Ends the listener thread.
+
+        wrapper = SimpleNamespace(Database=SimpleNamespace(connect=lambda **params: Connection()), get_connection_params=dict)
+        with mock.patch('app.pubsub.connections', {'default': wrapper}), self.assertLogs('app.pubsub', 'ERROR'):
+            subscription = Broker().subscribe('inbox_1')
+            self.assertEqual(await asyncio.wait_for(subscription.get(), 5), {'id': 1})
+        self.assertEqual([connection.executed for connection in opened], [['LISTEN "inbox_1"']] * 2)
+
+
+class ChunkedUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = Patient.objects.create(email='patient@example.com', first_name='Pat', social_sec_number=1)
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.client.force_login(self.patient)
+
+    def start(self, filename='scan.pdf', size=10):
+        return self.client.post(reverse('upload_start'), {'filename': filename, 'size': size})
+
+    def put(self, session_id, data, start, size=10, checksum=None):
+        return self.client.put(
+            reverse('upload_session', kwargs={'pk': session_id}), data, content_type='application/octet-stream',
+            headers={
+                'Content-Range': f'bytes {start}-{start + len(data) - 1}/{size}',
+                'X-Chunk-SHA256': checksum or hashlib.sha256(data).hexdigest(),
+            },
+        )
+
+    def test_chunks(self):
+        session_id = self.start().json()['id']
+        self.assertEqual(self.put(session_id, b'01234', 0).json()['offset'], 5)
+
+        response = self.put(session_id, b'789', 7)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 5)
+
+        response = self.put(session_id, b'56789', 5, checksum='0' * 64)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['offset'], 5)
+
+        response = self.put(session_id, b'56789', 5)
+        self.assertTrue(response.json()['complete'])
+        history = ClinicalHistory.objects.get(pk=response.json()['history'])
+        self.assertEqual(history.patient_id, self.patient.pk)
+        with history.file.open('rb') as f:
+            self.assertEqual(f.read(), b'0123456789')
+
+    def test_filenames(self):
+        for filename in ('', '  ', 'x' * 256):
+            with self.subTest(filename=filename):
+                response = self.start(filename)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+        self.assertEqual(self.start('..').status_code, 400)
+
+        session_id = self.start('a' * 200 + '.pdf').json()['id']
+        session = UploadSession.objects.get(pk=session_id)
+        self.assertLessEqual(len(session.storage_name), ClinicalHistory._meta.get_field('file').max_length)
+        self.assertTrue(session.storage_name.endswith('.pdf'))
+
+
+class AvatarTagTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_readiness_memoized(self):
+        user = CustomUser(email='a@example.com', avatar='avatar/jane.png')
+        template = Template('{% load avatars %}{% avatar user 32 %}')
+        with mock.patch.object(thumbnails.default_storage, 'exists', return_value=False) as exists:
+            for _ in range(3):
+                self.assertIn('/media/avatar/jane.png', template.render(Context({'user': user})))
+            self.assertEqual(exists.call_count, 1)
+            # The background job records the thumbnails once written.
+            cache.set(thumbnails._ready_key('avatar/jane.png'), True)
+            self.assertIn('/media/thumbs/avatar/jane_32.webp', template.render(Context({'user': user})))
+            self.assertEqual(exists.call_count, 1)
+
+    def test_generate_and_delete(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        buffer = BytesIO()
+        Image.new('RGB', (200, 150), 'red').save(buffer, 'PNG')
+        name = default_storage.save('avatar/jane.png', ContentFile(buffer.getvalue()))
+        self.assertFalse(thumbnails.thumbnails_exist(name))
+        thumbnails.generate(name)
+        self.assertTrue(thumbnails.thumbnails_exist(name))
+        self.assertTrue(thumbnails.thumbnails_ready(name))
+        thumbnails.delete_thumbnails(name)
+        self.assertFalse(thumbnails.thumbnails_exist(name))
+        self.assertFalse(thumbnails.thumbnails_ready(name))
+
+
+class ClinicalHistoryDownloadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.doctor, cls.other_doctor = [
+            Staff.objects.create(email=f'doctor{i}@example.com', role='doctor') for i in range(3)
+        ]
+        cls.patient, cls.other_patient = [
+            Patient.objects.create(email=f'patient{i}@example.com', social_sec_number=i, prof_in_charge=cls.doctor)
+            for i in range(2)
+        ]
+        cls.history = ClinicalHistory.objects.create(
+            name='Report', file='clinic/report.txt', patient=cls.patient, prof=cls.author,
+        )
+        cls.url = reverse('clinical_history_file', kwargs={'pk': cls.history.pk})
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name, MEDIA_ACCEL_REDIRECT=''))
+        (Path(media.name) / 'clinic').mkdir()
+        (Path(media.name) / 'clinic' / 'report.txt').write_bytes(b'0123456789')
+
+    def get(self, user, **headers):
+        self.client.force_login(user)
+        return self.client.get(self.url, headers=headers)
+
+    def test_authorization(self):
+        for user, status in (
+            (self.patient, 200), (self.author, 200), (self.doctor, 200),
+            (self.other_patient, 404), (self.other_doctor, 404),
+        ):
+            with self.subTest(user=user.email):
+                response = self.get(user)
+                self.assertEqual(response.status_code, status)
+                if status == 200:
+                    self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_ranges(self):
+        for header, content, content_range in (
+            ('bytes=2-4', b'234', 'bytes 2-4/10'), ('bytes=-3', b'789', 'bytes 7-9/10'), ('bytes=8-', b'89', 'bytes 8-9/10'),
+        ):
+            with self.subTest(range=header):
+                response = self.get(self.patient, Range=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(b''.join(response.streaming_content), content)
+        response = self.get(self.patient, Range='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    @override_settings(MEDIA_ACCEL_REDIRECT='/protected-media/')
+    def test_accel_redirect(self):
+        response = self.get(self.patient)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/clinic/report.txt')
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.get(self.other_patient).status_code, 404)
+
+
+class PublicMediaTests(SimpleTestCase):
+    def test_clinical_files_hidden(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(MEDIA_ROOT=root):
+            for directory_name in ('avatar', 'clinic'):
+                (Path(root) / directory_name).mkdir()
+                (Path(root) / directory_name / 'x.txt').write_text('data')
+            request = RequestFactory().get('/')
+            self.assertEqual(serve_public_media(request, 'avatar/x.txt').status_code, 200)
+            for path in ('clinic/x.txt', '/clinic/x.txt', './clinic/x.txt', 'avatar/../clinic/x.txt'):
+                with self.subTest(path=path), self.assertRaises(Http404):
+                    serve_public_media(request, path)
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+class PurgeSessionsTests(TestCase):
+    def test_deletes_expired_in_batches(self):
+        now = timezone.now()
+        Session.objects.bulk_create([
+            Session(session_key=f'key{i:037}', session_data='', expire_date=now + timedelta(days=1 if i < 2 else -1))
+            for i in range(7)
+        ])
+        call_command('purge_sessions', batch_size=2, stdout=StringIO())
+        self.assertEqual(Session.objects.count(), 2)
+
+
+class SeedBenchTests(TestCase):
+    def test_seeds_consistent_rows(self):
+        call_command(
+            'seed_bench', doctors=2, patients=30, messages=200, appointments=40, histories=10, stdout=StringIO(),
+        )
+        self.assertEqual(Staff.objects.count(), 2)
+        self.assertEqual(Patient.objects.count(), 30)
+        self.assertEqual(Message.objects.count(), 200)
+        self.assertEqual(PatientDirectory.objects.count(), 30)
+        self.assertFalse(Message.objects.exclude(recipient=F('sender__prof_in_charge')).exists())
+        # Seeded history keeps its timestamps, and the counters match it.
+        self.assertTrue(Message.objects.filter(timestamp__lt=timezone.now() - timedelta(days=30)).exists())
+        for doctor in Staff.objects.all():
+            self.assertEqual(unread_count(doctor.pk), doctor.received_messages.filter(is_read=False).count())
+        with self.assertRaises(CommandError):
+            call_command('seed_bench', doctors=1, patients=1, stdout=StringIO())
+
+
+class ImportPatientsTests(TestCase):
+    def import_rows(self, lines):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+            f.write('\n'.join(lines))
+        self.addCleanup(Path(f.name).unlink)
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_patients', f.name, workers=0, batch_size=2, verbosity=2, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_skips_and_reports_invalid_rows(self):
+        doctor = Staff.objects.create(email='doc@example.com', first_name='Doc')
+        Patient.objects.create(email='taken@example.com', social_sec_number=99)
+        out, err = self.import_rows([
+            '{"email": "ok@example.com", "first_name": "Ann", "social_sec_number": "1", "prof_in_charge": "DOC@example.com"}',
+            '{"email": "ok2@example.com", "social_sec_number": "2", "date_of_birth": "1990-01-31"}',
+            '{"email": "date@example.com", "social_sec_number": "3", "date_of_birth": "31/01/1990"}',
+            '{"email": "ssn@example.com", "social_sec_number": "x"}',
+            '{"email": "", "social_sec_number": "4"}',
+            '{"email": "taken@example.com", "social_sec_number": "5"}',
+            '{"email": "dupe@example.com", "social_sec_number": "1"}',
+            '{"email": "first@example.com", "first_name": "%s", "social_sec_number": "6"}' % ('a' * 51),
+            '{"email": "last@example.com", "last_name": "%s", "social_sec_number": "7"}' % ('a' * 51),
+            '{"email": "%s@example.com", "social_sec_number": "8"}' % ('a' * 250),
+        ])
+        self.assertIn('Imported 2 patients, skipped 8 rows', out)
+        for reason in (
+            'invalid value', 'missing email', 'email already exists', 'social security number already exists',
+            'first_name longer than 50 characters', 'last_name longer than 50 characters',
+            'email longer than 255 characters',
+        ):
+            self.assertIn(reason, err)
+        self.assertQuerySetEqual(
+            Patient.objects.order_by('social_sec_number').values_list('email', flat=True),
+            ['ok@example.com', 'ok2@example.com', 'taken@example.com'],
+        )
+        self.assertEqual(Patient.objects.get(email='ok@example.com').prof_in_charge, doctor)
+        self.assertEqual(PatientDirectory.objects.count(), 3)
+
+
+class CompressedStaticFilesTests(SimpleTestCase):
+    def test_collectstatic(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(STATIC_ROOT=root, STORAGES={
+            **settings.STORAGES,
+            'staticfiles': {'BACKEND': 'app.staticfiles.CompressedManifestStaticFilesStorage'},
+        }):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            hashed = staticfiles_storage.stored_name('css/bootstrap.min.css')
+            self.assertRegex(hashed, HASHED_NAME)
+            path = Path(root) / hashed
+            content = path.read_bytes()
+            self.assertNotIn(b'sourceMappingURL', content)
+            self.assertEqual(gzip.decompress((Path(root) / f'{hashed}.gz').read_bytes()), content)
+            self.assertFalse(list(Path(root).rglob('*.map')))
+
+
+class PublicPageTests(TestCase):
+    def test_home_shared_with_anonymous_visitors(self):
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response['Cache-Control'], f'public, max-age={settings.PUBLIC_PAGE_MAX_AGE}')
+        self.assertIn('Last-Modified', response)
+        self.assertNotContains(response, 'csrf-token')
+        self.assertFalse(response.cookies)
+        response = self.client.get(reverse('home'), headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+        self.client.force_login(Staff.objects.create(email='doctor@example.com', role='doctor'))
+        response = self.client.get(reverse('home'))
+        self.assertNotIn('ETag', response)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_form_pages_revalidated_per_csrf_cookie(self):
+        for name in ('login', 'patient_signup'):
+            self.client.cookies.clear()
+            response = self.client.get(reverse(name))
+            self.assertEqual(response['Cache-Control'], 'private, no-cache')
+            # The token the page embeds needs this visitor's new cookie.
+            self.assertNotIn('ETag', response)
+            etag = self.client.get(reverse(name))['ETag']
+            response = self.client.get(reverse(name), headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            self.client.cookies[settings.CSRF_COOKIE_NAME] = 'x' * 32
+            response = self.client.get(reverse(name), headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200)
+
+
+class QueryBudgetHelperTests(TestCase):
+    def test_over_budget_lists_queries(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, '2 queries executed, the budget is 1'):
+            with query_budget(1):
+                Staff.objects.count()
+                Patient.objects.count()
+
+    @max_queries(1)
+    def test_decorator_within_budget(self):
+        Staff.objects.count()
+
+
+class ProfileTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = Staff.objects.create(email='doctor@example.com', first_name='Ann', last_name='Doe', role='doctor')
+        cls.patient = Patient.objects.create(
+            email='patient@example.com', first_name='Pat', last_name='Ient',
+            social_sec_number=1, prof_in_charge=cls.doctor,
+        )
+
+    def test_resolved_once_per_request(self):
+        request = RequestFactory().get('/')
+        request.user = self.patient.customuser_ptr
+        with self.assertNumQueries(1):
+            self.assertEqual(get_profile(request), self.patient)
+            self.assertEqual(get_profile(request).prof_in_charge, self.doctor)
+
+    @override_settings(PROFILE_SESSION_CACHE=True)
+    def test_session_cache(self):
+        self.client.force_login(self.patient)
+        self.client.get(reverse('send_message'))
+        # Session and user only; the profile comes from the session.
+        with self.assertNumQueries(2):
+            self.client.get(reverse('send_message'))
+
+        self.doctor.last_name = 'Smith'
+        self.doctor.save()
+        # The doctor's version changed: the profile is loaded again and stored.
+        with query_budget(6):
+            self.client.get(reverse('send_message'))
+        self.assertEqual(self.client.session['_profile']['prof']['last_name'], 'Smith')
+        with self.assertNumQueries(2):
+            self.client.get(reverse('send_message'))
@@ -0,0 +1,119 @@
+"""
+Avatar thumbnails.
+
+Every uploaded avatar gets square derivatives in ``SIZES``, each encoded as
+WebP and JPEG, stored at deterministic paths next to a ``thumbs/`` prefix
+(see ``thumbnail_name``). They are generated on a background pool after the
+upload is committed, so requests never wait on Pillow; until they exist the
+``avatars`` template tags fall back to the original image. Whether they exist
+is remembered in the cache (``thumbnails_ready``), so rendering an avatar does
+not touch the storage.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+SIZES = (32, 64, 128)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# How long a missing thumbnail is remembered before the storage is checked again.
+PENDING_RECHECK = 10
+
+_executor = None
+_lock = threading.Lock()
+
+
+def thumbnail_name(avatar_name, size, ext):
+    """``avatar/jane.png`` -> ``thumbs/avatar/jane_64.webp``."""
+    stem = os.path.splitext(avatar_name)[0]
+    return f'thumbs/{stem}_{size}.{ext}'
+
+
+def _ready_key(avatar_name):
+    return f'thumbs-ready:{avatar_name}'
+
+
+def thumbnails_exist(avatar_name, storage=None):
+    """Whether every thumbnail of ``avatar_name`` is on the storage."""
+    # generate() writes the smallest JPEG last.
+    return (storage or default_storage).exists(thumbnail_name(avatar_name, SIZES[0], 'jpg'))
+
+
+def thumbnails_ready(avatar_name):
+    """Like ``thumbnails_exist``, but checked on the storage at most once."""
+    ready = cache.get(_ready_key(avatar_name))
+    if ready is None:
+        ready = thumbnails_exist(avatar_name)
+        cache.set(_ready_key(avatar_name), ready, None if ready else PENDING_RECHECK)
+    return ready
+
+
+def pick_size(size):
+    """Smallest generated size that is at least ``size`` pixels."""
+    return next((candidate for candidate in SIZES if candidate >= size), SIZES[-1])
+
+
+def generate(avatar_name, storage=None):
+    """Write every thumbnail of ``avatar_name``; returns the names written."""
+    storage = storage or default_storage
+    with storage.open(avatar_name, 'rb') as f:
+        image = Image.open(f)
+        # Let the JPEG decoder downscale while decoding when it can.
+        image.draft('RGB', (SIZES[-1] * 2, SIZES[-1] * 2))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+    written = []
+    for size in sorted(SIZES, reverse=True):
+        image = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        for ext, (fmt, options) in FORMATS.items():
+            buffer = BytesIO()
+            image.save(buffer, fmt, **options)
+            name = thumbnail_name(avatar_name, size, ext)
+            # Overwrite in place: storage.save() would pick a new name instead.
+            storage.delete(name)
+            written.append(storage.save(name, ContentFile(buffer.getvalue())))
+    cache.set(_ready_key(avatar_name), True, None)
+    return written
+
+
+def delete_thumbnails(avatar_name, storage=None):
+    storage = storage or default_storage
+    cache.delete(_ready_key(avatar_name))
+    for size in SIZES:
+        for ext in FORMATS:
+            storage.delete(thumbnail_name(avatar_name, size, ext))
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                # Pillow releases the GIL while resizing and encoding.
+                _executor = ThreadPoolExecutor(settings.THUMBNAIL_WORKERS, thread_name_prefix='thumbnails')
+    return _executor
+
+
+def _generate_logged(avatar_name):
+    try:
+        return generate(avatar_name)
+    except Exception:
+        logger.exception("Could not generate thumbnails for %s", avatar_name)
+
+
+def schedule(avatar_name):
+    """Queue thumbnail generation for ``avatar_name`` on the background pool."""
+    return get_executor().submit(_generate_logged, avatar_name)
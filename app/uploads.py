@@ -0,0 +1,136 @@
+"""
+Chunked, resumable uploads of clinical history files.
+
+Protocol:
+
+1. ``POST /app/uploads/`` with ``patient``, ``filename``, ``size`` (and
+   optionally ``name``) opens an UploadSession and returns its id.
+2. ``PUT /app/uploads/<id>/`` sends one chunk as the raw request body, with
+   ``Content-Range: bytes <start>-<end>/<size>`` and
+   ``X-Chunk-SHA256: <hex digest of the chunk>``. ``start`` must equal the
+   session offset, otherwise 409 is returned along with the current offset.
+3. ``GET /app/uploads/<id>/`` returns the offset to resume from after a
+   dropped connection.
+
+Each chunk is copied from the request stream to its place in the final file
+in ``COPY_SIZE`` pieces while being hashed, so memory use does not depend on
+the file or chunk size. A chunk with a bad checksum is cut off again. The
+ClinicalHistory row is created in the transaction that stores the last chunk.
+"""
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.text import get_valid_filename
+
+from .models import ClinicalHistory, UploadSession
+
+COPY_SIZE = 64 * 1024
+
+_CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, session=None):
+        super().__init__(message)
+        self.status = status
+        self.session = session
+
+
+def start_upload(owner, patient, filename, size, name='', prof_id=None):
+    """Open an upload session and reserve the file's final name in storage."""
+    if size <= 0 or size > settings.UPLOAD_MAX_SIZE:
+        raise UploadError(f'The file size must be between 1 and {settings.UPLOAD_MAX_SIZE} bytes.')
+    try:
+        # The final name must fit ClinicalHistory.file; storage shortens it when needed.
+        storage_name = default_storage.save(
+            f'clinic/{get_valid_filename(filename)}', ContentFile(b''),
+            max_length=ClinicalHistory._meta.get_field('file').max_length,
+        )
+    except SuspiciousFileOperation:
+        raise UploadError('Invalid file name.')
+    return UploadSession.objects.create(
+        owner=owner, patient=patient, prof_id=prof_id, name=name, filename=filename,
+        storage_name=storage_name, size=size,
+    )
+
+
+def parse_content_range(header):
+    match = _CONTENT_RANGE_RE.match(header or '')
+    if match is None:
+        raise UploadError('A "Content-Range: bytes start-end/size" header is required.')
+    start, end, total = map(int, match.groups())
+    if end < start:
+        raise UploadError('Invalid Content-Range.')
+    return start, end, total
+
+
+def append_chunk(session_id, stream, content_range, checksum):
+    """
+    Append one chunk read from ``stream`` (a file-like request) to the upload.
+    Returns the updated session.
+    """
+    start, end, total = parse_content_range(content_range)
+    length = end - start + 1
+    if length > settings.UPLOAD_CHUNK_MAX_SIZE:
+        raise UploadError(f'Chunks are limited to {settings.UPLOAD_CHUNK_MAX_SIZE} bytes.', status=413)
+
+    with transaction.atomic():
+        # Serializes concurrent chunks of the same upload.
+        session = UploadSession.objects.select_for_update().get(pk=session_id)
+        if session.is_complete:
+            raise UploadError('The upload is already complete.', status=409, session=session)
+        if total != session.size or end >= session.size:
+            raise UploadError('The chunk does not match the declared file size.', session=session)
+        if start != session.offset:
+            raise UploadError(f'Expected a chunk starting at byte {session.offset}.', status=409, session=session)
+
+        digest = hashlib.sha256()
+        with open(default_storage.path(session.storage_name), 'r+b') as f:
+            # Drop whatever a previously interrupted attempt left past the offset.
+            f.seek(start)
+            f.truncate()
+            remaining = length
+            while remaining:
+                data = stream.read(min(COPY_SIZE, remaining))
+                if not data:
+                    break
+                digest.update(data)
+                f.write(data)
+                remaining -= len(data)
+            if remaining or digest.hexdigest() != (checksum or '').lower():
+                f.truncate(start)
+                raise UploadError('The chunk is incomplete or its checksum does not match.', session=session)
+
+        session.offset = end + 1
+        if session.is_complete:
+            session.history = ClinicalHistory.objects.create(
+                name=session.name or session.filename[:100],
+                file=session.storage_name,
+                patient_id=session.patient_id,
+                prof_id=session.prof_id,
+            )
+        session.save(update_fields=['offset', 'history', 'updated'])
+    return session
+
+
+def abandon(session):
+    """Delete an unfinished upload and its partial file."""
+    if session.history_id is None:
+        default_storage.delete(session.storage_name)
+    session.delete()
+
+
+def session_state(session):
+    return {
+        'id': str(session.pk),
+        'offset': session.offset,
+        'size': session.size,
+        'complete': session.is_complete,
+        'chunk_size': settings.UPLOAD_CHUNK_MAX_SIZE,
+        'history': session.history_id,
+    }
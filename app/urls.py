@@ -7,8 +7,20 @@ urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
     path('add_patient/', views.add_patient, name='add_patient'),
     path('view_patients/', views.view_patient, name='view_patients'),
+    path('patients/search/', views.patient_search_api, name='patient_search'),
+    path('autocomplete/patients/', views.patient_autocomplete, name='patient_autocomplete'),
+    path('autocomplete/staff/', views.staff_autocomplete, name='staff_autocomplete'),
     path('manage_appointments/', views.manage_appointments, name='manage_appointments'),
     path('request_appointment/', views.request_appointment, name='request_appointment'),
     path('view_medications/', views.view_medications, name='view_medications'),
     path('send_message/', views.send_message, name='send_message'),
+    path('inbox/', views.inbox, name='inbox'),
+    path('inbox/messages/', views.inbox_api, name='inbox_api'),
+    path('inbox/mark_read/', views.inbox_mark_read, name='inbox_mark_read'),
+    path('inbox/stream/', views.inbox_stream, name='inbox_stream'),
+    path('clinical_history/<int:pk>/file/', views.clinical_history_file, name='clinical_history_file'),
+    path('uploads/', views.upload_start, name='upload_start'),
+    path('uploads/new/', views.upload_clinical_history, name='upload_clinical_history'),
+    path('uploads/<uuid:pk>/', views.upload_session, name='upload_session'),
+    path('staff/<int:staff_id>/availability/', views.staff_availability, name='staff_availability'),
 ]
\ No newline at end of file
@@ -1,87 +1,233 @@
-from django.shortcuts import render, redirect
+import asyncio
+import json
+from datetime import date, timedelta
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_http_methods, require_POST
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
 from django.urls import reverse_lazy
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.views.generic.edit import CreateView
 from django.contrib.auth.decorators import login_required
 
+from . import directory, search as patient_search
+from .autocomplete import patient_page, staff_page
+from .availability import free_slots
+from .conditional import public_form_page
+from .counters import unread_count
+from .downloads import file_response
+from .inbox import PAGE_SIZE, ainbox_page, channel_name, mark_read, message_event
+from .profiles import STAFF_ROLES
+from .pubsub import get_broker
 from .forms import PatientUserCreationForm, MessageForm, StaffUserCreationForm
-from .models import Patient
+from .models import Calendar, CalendarEvent, ClinicalHistory, Patient, Staff, UploadSession
+from .uploads import UploadError, abandon as abandon_upload, append_chunk, session_state, start_upload
+
+AVAILABILITY_DAYS = 14
+AVAILABILITY_MAX_DAYS = 92
+
+async def auser(request):
+    """Await the user and keep it as ``request.user``, so rendering does not load it again."""
+    request.user = await request.auser()
+    return request.user
+
+async def arender(request, template_name, context=None, status=None):
+    """render() for async views. Templates may evaluate lazy querysets, so it runs in a thread."""
+    await auser(request)
+    return await sync_to_async(render)(request, template_name, context, status=status)
 
-def patient_signup(request):
+@sync_to_async
+def save_atomic(instance):
+    # The row and the counter, directory and search updates of its signals commit together.
+    with transaction.atomic():
+        instance.save()
+
+def staff_required(view):
+    """Restrict a view, sync or async, to logged-in doctors and assistants."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        @login_required
+        async def async_wrapper(request, *args, **kwargs):
+            user = await auser(request)
+            if user.role not in STAFF_ROLES:
+                return await arender(
+                    request, 'error.html', {'error': 'You are not registered as a staff member.'}, status=403,
+                )
+            return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    @login_required
+    def wrapper(request, *args, **kwargs):
+        if request.user.role not in STAFF_ROLES:
+            return render(request, 'error.html', {'error': 'You are not registered as a staff member.'}, status=403)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+@public_form_page
+async def patient_signup(request):
     if request.method == 'POST':
         form = PatientUserCreationForm(request.POST)
-        if form.is_valid():
-            form.save()
+        # Validation queries for a taken e-mail; asave() hashes the password on the hashing pool.
+        if await sync_to_async(form.is_valid)():
+            await form.asave()
             return redirect(reverse_lazy('login'))
     else:
         form = PatientUserCreationForm()
-    return render(request, 'signup.html', {'form': form})
+    return await arender(request, 'signup.html', {'form': form})
 
-def staff_signup(request):
+@public_form_page
+async def staff_signup(request):
     if request.method == 'POST':
         form = StaffUserCreationForm(request.POST)
-        if form.is_valid():
-            form.save()
+        if await sync_to_async(form.is_valid)():
+            await form.asave()
             return redirect(reverse_lazy('login'))
     else:
         form = StaffUserCreationForm()
-    return render(request, 'signup.html', {'form': form})
+    return await arender(request, 'signup.html', {'form': form})
 
 @login_required
-def dashboard(request):
+async def dashboard(request):
     # Get the user's role
-    user_role = request.user.role  # or use request.user.groups if you're using groups
-    
+    user = await auser(request)
+    user_role = user.role  # or use request.user.groups if you're using groups
+    user_id = user.pk
+    now = timezone.now()
+
+    # Counters are lazy: cached fragments (see app.fragments) only query them on a miss.
     if user_role == 'doctor' or user_role == 'assistant':
-        return render(request, 'doctor_assist/doctor_assistant_dashboard.html')
+        return await arender(request, 'doctor_assist/doctor_assistant_dashboard.html', {
+            'unread_count': SimpleLazyObject(lambda: unread_count(user_id)),
+            'upcoming_count': SimpleLazyObject(
+                lambda: CalendarEvent.objects.filter(prof_id=user_id, start_time__gte=now).count()
+            ),
+        })
     elif user_role == 'patient':
-        return render(request, 'patient/patient_dashboard.html')
+        return await arender(request, 'patient/patient_dashboard.html', {
+            'upcoming_count': SimpleLazyObject(
+                lambda: Calendar.objects.filter(patient_id=user_id, cal_events__start_time__gte=now).count()
+            ),
+        })
     else:
         # Default to patient view if no role is set
-        return render(request, 'home.html')
+        return await arender(request, 'home.html')
 
 ## PATIENT VIEWS ##
 @login_required
-def send_message(request):
-    try:
-        # Ensure the logged-in user is a Patient
-        patient = Patient.objects.filter(customuser_ptr=request.user).first()
-        print(patient)
-    except Patient.DoesNotExist:
-        return render(request, 'error.html', {'error': 'You are not registered as a patient.'})
+async def send_message(request):
+    # Ensure the logged-in user is a Patient
+    patient = await request.aprofile()
+    if not isinstance(patient, Patient):
+        return await arender(request, 'error.html', {'error': 'You are not registered as a patient.'})
+    if not patient.prof_in_charge:
+        return await arender(request, 'error.html', {'error': 'No doctor is assigned to you.'})
+
+    # Retrieve the doctor assigned to the patient
+    doctor = patient.prof_in_charge
+
+    if request.method == 'POST':
+        form = MessageForm(request.POST)
+        if form.is_valid():
+            message = form.save(commit=False)
+            message.sender = patient  # Set the sender to the logged-in patient
+            message.recipient = doctor  # Deliver to the doctor's inbox
+            await save_atomic(message)
+            return redirect('dashboard')  # Redirect to a success page
     else:
-        if not patient.prof_in_charge:
-            return render(request, 'error.html', {'error': 'No doctor is assigned to you.'})
-        
-        # Retrieve the doctor assigned to the patient
-        doctor = patient.prof_in_charge
-
-        if request.method == 'POST':
-            form = MessageForm(request.POST)
-            if form.is_valid():
-                message = form.save(commit=False)
-                message.sender = request.user  # Set the sender to the logged-in patient
-                message.recipient = doctor.user  # Set the recipient to the doctor's user account
-                message.save()
-                return redirect('dashboard')  # Redirect to a success page
-        else:
-            form = MessageForm()
-
-        return render(request, 'patient/send_message.html', {'form': form})
+        form = MessageForm()
+
+    return await arender(request, 'patient/send_message.html', {'form': form})
 
 @login_required
 def add_patient(request):
     form = MessageForm(request.POST)
     return render(request, 'patient/add_patient.html', {'form': form})
 
-@login_required
+@staff_required
 def view_patient(request):
-    form = MessageForm(request.POST)
-    return render(request, 'patient/view_patient.html', {'form': form})
+    """Patient list from the directory: ``?q=<name, email or SSN>&mine=1&after=<cursor>``."""
+    query = request.GET.get('q', '').strip()
+    mine = bool(request.GET.get('mine'))
+    prof_id = request.user.pk if mine else None
+    if query:
+        # Ranked matches; the best page is all a search needs.
+        patients, next_cursor = patient_search.search(query, limit=directory.PAGE_SIZE, prof_id=prof_id), None
+    else:
+        try:
+            patients, next_cursor = directory.search(prof_id=prof_id, cursor=request.GET.get('after'))
+        except ValueError:
+            return render(request, 'error.html', {'error': 'Invalid patient list page.'}, status=400)
+    return render(request, 'doctor_assist/view_patients.html', {
+        'patients': patients,
+        'next_cursor': next_cursor,
+        'query': query,
+        'mine': mine,
+    })
+
+@staff_required
+def patient_search_api(request):
+    """Type-ahead JSON: ``?q=<words>&mine=1&limit=10``."""
+    try:
+        limit = int(request.GET.get('limit', patient_search.DEFAULT_LIMIT))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit.'}, status=400)
+    patients = patient_search.search(
+        request.GET.get('q', ''), limit=max(limit, 1),
+        prof_id=request.user.pk if request.GET.get('mine') else None,
+    )
+    return JsonResponse({'results': [
+        {
+            'id': patient.patient_id,
+            'name': directory.full_name(patient.first_name, patient.last_name),
+            'email': patient.email,
+            'social_sec_number': patient.social_sec_number,
+            'prof': patient.prof_name,
+        }
+        for patient in patients
+    ]})
+
+def autocomplete_response(request, page):
+    try:
+        results, next_cursor = page(request.GET.get('q', ''), cursor=request.GET.get('after'))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor.'}, status=400)
+    return JsonResponse({'results': results, 'next': next_cursor})
 
 @login_required
-def request_appointment(request):
-    form = MessageForm(request.POST)
-    return render(request, 'patient/request_appointment.html', {'form': form})
+def patient_autocomplete(request):
+    """Patient choices for AutocompleteSelect: ``?q=<name, email or SSN>&after=<cursor>``."""
+    # Admins edit the same forms from the admin site.
+    if request.user.role not in STAFF_ROLES and not request.user.is_staff:
+        return JsonResponse({'error': 'You are not registered as a staff member.'}, status=403)
+    return autocomplete_response(request, patient_page)
+
+@login_required
+def staff_autocomplete(request):
+    """Staff choices for AutocompleteSelect: ``?q=<last name or email>&after=<cursor>``."""
+    if request.user.role not in STAFF_ROLES and not request.user.is_staff:
+        return JsonResponse({'error': 'You are not registered as a staff member.'}, status=403)
+    return autocomplete_response(request, staff_page)
+
+@login_required
+async def request_appointment(request):
+    patient = await request.aprofile()
+    if not isinstance(patient, Patient):
+        return await arender(request, 'error.html', {'error': 'You are not registered as a patient.'})
+    if not patient.prof_in_charge:
+        return await arender(request, 'error.html', {'error': 'No doctor is assigned to you.'})
+
+    today = timezone.localdate()
+    slots = await sync_to_async(free_slots)(
+        patient.prof_in_charge, today, today + timedelta(days=AVAILABILITY_DAYS - 1), not_before=timezone.now()
+    )
+    return await arender(request, 'patient/request_appointment.html', {'doctor': patient.prof_in_charge, 'slots': slots})
 
 @login_required
 def view_medications(request):
@@ -89,8 +235,189 @@ def view_medications(request):
     return render(request, 'patient/view_medications.html', {'form': form})
 
 
+@login_required
+async def staff_availability(request, staff_id):
+    """Free slots of a professional as JSON, e.g. ``?start=2025-03-01&end=2025-03-31&slot=30``."""
+    prof = await aget_object_or_404(Staff, pk=staff_id)
+    today = timezone.localdate()
+    try:
+        start = date.fromisoformat(request.GET['start']) if 'start' in request.GET else today
+        end = date.fromisoformat(request.GET['end']) if 'end' in request.GET else start + timedelta(days=AVAILABILITY_DAYS - 1)
+        slot_minutes = int(request.GET.get('slot', settings.CLINIC_SLOT_MINUTES))
+        if not 1 <= slot_minutes <= 24 * 60:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': 'Invalid start, end or slot parameter.'}, status=400)
+    if end < start or (end - start).days >= AVAILABILITY_MAX_DAYS:
+        return JsonResponse({'error': f'The range must be at most {AVAILABILITY_MAX_DAYS} days.'}, status=400)
+
+    slots = await sync_to_async(free_slots)(prof, start, end, slot_minutes=slot_minutes, not_before=timezone.now())
+    return JsonResponse({
+        'staff': prof.pk,
+        'slot_minutes': slot_minutes,
+        'slots': [{'start': slot_start.isoformat(), 'end': slot_end.isoformat()} for slot_start, slot_end in slots],
+    })
+
+
+@login_required
+def clinical_history_file(request, pk):
+    """Download a clinical history file; only its patient and their professionals may."""
+    history = get_object_or_404(ClinicalHistory.objects.select_related('patient'), pk=pk)
+    user_id = request.user.pk
+    allowed = user_id in (history.patient_id, history.prof_id) or (
+        history.patient is not None and history.patient.prof_in_charge_id == user_id
+    )
+    # Answer 404 either way so record ids cannot be probed.
+    if not allowed or not history.file:
+        raise Http404
+    return file_response(request, history.file)
+
+
+@login_required
+def upload_clinical_history(request):
+    return render(request, 'upload_clinical_history.html', {
+        'is_patient': request.user.role == 'patient',
+    })
+
+@require_POST
+@login_required
+def upload_start(request):
+    """Open a chunked upload; see app.uploads for the protocol."""
+    try:
+        patient_id = int(request.POST.get('patient') or request.user.pk)
+        size = int(request.POST['size'])
+        filename = request.POST['filename']
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'patient, filename and size are required.'}, status=400)
+    max_length = UploadSession._meta.get_field('filename').max_length
+    if not filename.strip() or len(filename) > max_length:
+        return JsonResponse({'error': f'The file name must be 1 to {max_length} characters long.'}, status=400)
+
+    is_staff = request.user.role in STAFF_ROLES
+    # Patients may only add to their own history.
+    if not is_staff and patient_id != request.user.pk:
+        return JsonResponse({'error': 'You may only upload your own files.'}, status=403)
+    profile = request.profile
+    if isinstance(profile, Patient) and profile.pk == patient_id:
+        patient = profile
+    else:
+        patient = Patient.objects.filter(pk=patient_id).first()
+    if patient is None:
+        return JsonResponse({'error': 'Unknown patient.'}, status=400)
+
+    try:
+        session = start_upload(
+            request.user, patient, filename, size,
+            name=request.POST.get('name', '')[:100],
+            prof_id=request.user.pk if isinstance(request.profile, Staff) else patient.prof_in_charge_id,
+        )
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    return JsonResponse(session_state(session), status=201)
+
+@require_http_methods(['GET', 'HEAD', 'PUT', 'DELETE'])
+@login_required
+def upload_session(request, pk):
+    session = get_object_or_404(UploadSession, pk=pk, owner=request.user)
+    if request.method == 'PUT':
+        try:
+            session = append_chunk(
+                session.pk, request, request.headers.get('Content-Range'), request.headers.get('X-Chunk-SHA256'),
+            )
+        except UploadError as e:
+            state = session_state(e.session) if e.session else {}
+            return JsonResponse({'error': str(e), **state}, status=e.status)
+    elif request.method == 'DELETE':
+        abandon_upload(session)
+        return HttpResponse(status=204)
+    return JsonResponse(session_state(session))
+
+
 ## DOCTOR/ASSISTANT VIEWS ##
 @login_required
 def manage_appointments(request):
     form = MessageForm(request.POST)
     return render(request, 'doctor_assist/manage_appointments.html', {'form': form})
+
+@staff_required
+async def inbox(request):
+    try:
+        messages, next_cursor = await ainbox_page(
+            request.user.pk, cursor=request.GET.get('before'), unread_only=bool(request.GET.get('unread')),
+        )
+    except ValueError:
+        return await arender(request, 'error.html', {'error': 'Invalid inbox page.'}, status=400)
+    return await arender(request, 'doctor_assist/inbox.html', {
+        'inbox_messages': messages,
+        'next_cursor': next_cursor,
+        'unread_only': bool(request.GET.get('unread')),
+    })
+
+@staff_required
+async def inbox_api(request):
+    """JSON inbox page: ``?before=<cursor>&unread=1&limit=25``."""
+    try:
+        messages, next_cursor = await ainbox_page(
+            request.user.pk,
+            cursor=request.GET.get('before'),
+            unread_only=bool(request.GET.get('unread')),
+            limit=int(request.GET.get('limit', PAGE_SIZE)),
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor or limit.'}, status=400)
+    return JsonResponse({
+        'messages': [message_event(message) for message in messages],
+        'next': next_cursor,
+    })
+
+@require_POST
+@staff_required
+async def inbox_mark_read(request):
+    """Mark the posted ``ids`` as read, or every unread message when ``all`` is set."""
+    if request.POST.get('all'):
+        ids = None
+    else:
+        try:
+            ids = [int(pk) for pk in request.POST.getlist('ids')]
+        except ValueError:
+            return JsonResponse({'error': 'Invalid message id.'}, status=400)
+    updated = await sync_to_async(mark_read)(request.user.pk, ids)
+    if request.headers.get('Accept') == 'application/json':
+        return JsonResponse({'updated': updated})
+    next_url = request.POST.get('next')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        next_url = 'inbox'
+    return redirect(next_url)
+
+async def inbox_stream(request):
+    """
+    Server-Sent Events stream of new messages for the logged-in professional.
+
+    Served through asgi.py, each open stream is a suspended coroutine rather
+    than a worker thread, so thousands of idle doctors cost little.
+    """
+    user = await auser(request)
+    if not user.is_authenticated or user.role not in STAFF_ROLES:
+        return HttpResponseForbidden()
+
+    subscription = get_broker().subscribe(channel_name(user.pk))
+    heartbeat = settings.INBOX_STREAM_HEARTBEAT
+
+    async def events():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection.
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f'event: message\nid: {event["id"]}\ndata: {json.dumps(event)}\n\n'
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
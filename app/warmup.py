@@ -0,0 +1,43 @@
+"""
+Worker boot warm-up for TEMPLATE_PRODUCTION.
+
+The first render of a template reads and compiles it and every template it
+extends or includes; the cached loader then keeps the result for the life of
+the process. ``compile_templates`` pays that cost when wsgi.py or asgi.py is
+imported by a new worker, before it accepts requests, instead of on the first
+request of each page.
+"""
+import logging
+import time
+from pathlib import Path
+
+from django.apps import apps
+from django.template import TemplateSyntaxError
+from django.template.loader import get_template
+
+logger = logging.getLogger(__name__)
+
+
+def templates_root():
+    return Path(apps.get_app_config('app').path) / 'templates'
+
+
+def template_names():
+    """Names of every template under app/templates, as passed to ``get_template``."""
+    root = templates_root()
+    return sorted(path.relative_to(root).as_posix() for path in root.rglob('*.html'))
+
+
+def compile_templates():
+    """Load every template through the configured loaders. Returns the number compiled."""
+    started = time.perf_counter()
+    compiled = 0
+    for name in template_names():
+        try:
+            get_template(name)
+        except TemplateSyntaxError:
+            logger.exception("Template %s does not compile.", name)
+        else:
+            compiled += 1
+    logger.info("Compiled %d templates in %.0f ms.", compiled, (time.perf_counter() - started) * 1000)
+    return compiled
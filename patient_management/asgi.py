@@ -9,8 +9,20 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
+from django.core.exceptions import ImproperlyConfigured
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'patient_management.settings')
 
 application = get_asgi_application()
+
+# Every ASGI request runs its sync code in a new thread, so a persistent
+# connection would never be reused, only left open.
+if settings.DB_CONN_MODE == 'persistent':
+    raise ImproperlyConfigured("DB_CONN_MODE=persistent is for WSGI; use DB_CONN_MODE=pool under ASGI.")
+
+if settings.TEMPLATE_PRODUCTION:
+    from app.warmup import compile_templates
+
+    compile_templates()
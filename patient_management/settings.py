@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,11 +44,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'app.profiles.ProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -55,7 +59,8 @@ ROOT_URLCONF = 'patient_management.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # The stock backend plus render timing for app.instrumentation.
+        'BACKEND': 'app.instrumentation.DjangoTemplates',
         'DIRS': [BASE_DIR / "templates"],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -69,6 +74,24 @@ TEMPLATES = [
     },
 ]
 
+# TEMPLATE_PRODUCTION pins the production template setup whatever DEBUG says:
+# compiled templates are cached for the life of the process, template debug
+# information is off, {% shared_fragment %} blocks such as the role sidebars
+# are rendered once per process, and wsgi.py/asgi.py compile every template at
+# boot (see app.warmup). Template edits then need a restart.
+
+TEMPLATE_PRODUCTION = os.environ.get("TEMPLATE_PRODUCTION", "False") == "True"
+
+if TEMPLATE_PRODUCTION:
+    TEMPLATES[0]["APP_DIRS"] = False
+    TEMPLATES[0]["OPTIONS"]["debug"] = False
+    TEMPLATES[0]["OPTIONS"]["loaders"] = [
+        ("django.template.loaders.cached.Loader", [
+            "django.template.loaders.filesystem.Loader",
+            "django.template.loaders.app_directories.Loader",
+        ]),
+    ]
+
 WSGI_APPLICATION = 'patient_management.wsgi.application'
 
 
@@ -83,9 +106,132 @@ DATABASES = {
         "PASSWORD": os.environ.get("SQL_PASSWORD", "password"),
         "HOST": os.environ.get("SQL_HOST", "localhost"),
         "PORT": os.environ.get("SQL_PORT", "5432"),
+        "OPTIONS": {},
+    }
+}
+
+# Database connections
+# DB_CONN_MODE is "close" (a new connection per request), "persistent" (each
+# worker thread keeps its connection for DB_CONN_MAX_AGE seconds, checked
+# before reuse; WSGI only, since ASGI serves every request from a new thread)
+# or "pool" (a psycopg 3 pool per process, for WSGI or ASGI on PostgreSQL).
+
+DB_CONN_MODE = os.environ.get("DB_CONN_MODE", "close")
+
+if DB_CONN_MODE not in ("close", "persistent", "pool"):
+    raise ImproperlyConfigured(f"Unknown DB_CONN_MODE {DB_CONN_MODE!r}.")
+
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = DB_CONN_MODE != "close"
+
+if DB_CONN_MODE == "persistent":
+    DATABASES["default"]["CONN_MAX_AGE"] = int(os.environ.get("DB_CONN_MAX_AGE", "600"))
+
+if "postgresql" in DATABASES["default"]["ENGINE"]:
+    DATABASES["default"]["OPTIONS"]["connect_timeout"] = int(os.environ.get("DB_CONNECT_TIMEOUT", "5"))
+    if DB_CONN_MODE == "pool":
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+            # Seconds a request waits for a free connection before failing.
+            "timeout": float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+            "max_idle": float(os.environ.get("DB_POOL_MAX_IDLE", "300")),
+            "max_lifetime": float(os.environ.get("DB_POOL_MAX_LIFETIME", "3600")),
+        }
+elif DB_CONN_MODE == "pool":
+    raise ImproperlyConfigured("DB_CONN_MODE=pool requires PostgreSQL.")
+
+
+# SQLite production profile
+# With SQLITE_PRODUCTION, every connection switches to WAL (readers no longer
+# block the writer), waits up to SQLITE_BUSY_TIMEOUT ms for a lock instead of
+# failing with "database is locked", and syncs to disk at checkpoints only.
+# Transactions start with BEGIN IMMEDIATE, so a transaction that reads before
+# writing queues for the write lock up front instead of failing to upgrade.
+
+SQLITE_PRODUCTION = os.environ.get("SQLITE_PRODUCTION", "False") == "True"
+
+if SQLITE_PRODUCTION and "sqlite3" in DATABASES["default"]["ENGINE"]:
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get("SQLITE_BUSY_TIMEOUT", "5000"))
+    DATABASES["default"]["OPTIONS"].update({
+        "transaction_mode": "IMMEDIATE",
+        "timeout": SQLITE_BUSY_TIMEOUT / 1000,
+        "init_command": (
+            "PRAGMA journal_mode=WAL;"
+            "PRAGMA synchronous=NORMAL;"
+            f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT};"
+            f"PRAGMA mmap_size={int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 ** 2)))};"
+            # Negative: in KiB rather than pages.
+            f"PRAGMA cache_size=-{int(os.environ.get('SQLITE_CACHE_SIZE_KB', '65536'))};"
+            "PRAGMA temp_store=MEMORY;"
+        ),
+    })
+
+
+# Cache
+# CACHE_BACKEND is "locmem" (per process), "file" (CACHE_LOCATION on disk) or
+# "shm", a file cache in /dev/shm shared by every worker process on the host
+# without touching the disk.
+# Cached fragments, unread counters and availability are invalidated by
+# bumping keys in this cache. With locmem, only the worker that handled the
+# write sees the bump; the others serve stale data until the entries time
+# out. locmem is therefore refused when WEB_CONCURRENCY, the worker count
+# gunicorn reads, is above 1.
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "locmem")
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "1"))
+
+if CACHE_BACKEND == "locmem" and WEB_CONCURRENCY > 1:
+    raise ImproperlyConfigured("CACHE_BACKEND=locmem is per process; use shm or file with several workers.")
+
+CACHE_LOCATION = os.environ.get("CACHE_LOCATION", {
+    "locmem": "patient-management",
+    "file": str(BASE_DIR / "cache"),
+    "shm": "/dev/shm/patient-management-cache",
+}.get(CACHE_BACKEND, ""))
+
+CACHES = {
+    "default": {
+        "BACKEND": {
+            "locmem": "django.core.cache.backends.locmem.LocMemCache",
+            "file": "django.core.cache.backends.filebased.FileBasedCache",
+            "shm": "django.core.cache.backends.filebased.FileBasedCache",
+        }[CACHE_BACKEND],
+        "LOCATION": CACHE_LOCATION,
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.environ.get("CACHE_MAX_ENTRIES", "10000")),
+        },
     }
 }
 
+# Sessions
+# SESSION_MODE is "db" (a query per request), "cached_db" (read from the
+# cache, written through to the database; pair it with a cache shared by the
+# workers, e.g. CACHE_BACKEND=shm) or "signed_cookies" (no server-side
+# storage; sessions must stay well under the 4 KB cookie limit). Expired
+# database sessions are removed by manage.py purge_sessions.
+
+SESSION_MODE = os.environ.get("SESSION_MODE", "db")
+
+SESSION_ENGINE = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}[SESSION_MODE]
+
+# Per-user dashboard fragments (see app.fragments); 0 disables them.
+
+FRAGMENT_CACHE_TIMEOUT = int(os.environ.get("FRAGMENT_CACHE_TIMEOUT", "300"))
+
+
+# Public pages (see app.conditional)
+# RELEASE_ID names the deployed version: it is part of the ETags of the home,
+# login and signup pages and of nginx's page cache key, so each deploy
+# invalidates both. Without it, the ETags follow the newest template.
+# PUBLIC_PAGE_MAX_AGE is how many seconds browsers and nginx may reuse the
+# anonymous home page before revalidating it.
+
+RELEASE_ID = os.environ.get("RELEASE_ID", "")
+PUBLIC_PAGE_MAX_AGE = int(os.environ.get("PUBLIC_PAGE_MAX_AGE", "10"))
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -105,6 +251,25 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing
+# The first hasher encodes new passwords; the others only verify older hashes.
+
+PASSWORD_HASHERS = [
+    'app.hashers.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+PASSWORD_HASH_ITERATIONS = int(os.environ.get("PASSWORD_HASH_ITERATIONS", "870000"))
+
+# Pool used by app.hashing: "thread" or "process", and its size per worker process.
+PASSWORD_HASH_EXECUTOR = os.environ.get("PASSWORD_HASH_EXECUTOR", "thread")
+
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "2"))
+
 AUTH_USER_MODEL = "app.CustomUser"
 
 LOGIN_REDIRECT_URL = "home"
@@ -134,9 +299,81 @@ STATICFILES_DIRS = [
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# With STATIC_COMPRESSED, collectstatic writes content-hashed copies, a manifest
+# and .gz/.br siblings (see app.staticfiles) that nginx serves precompressed and
+# caches as immutable. {% static %} then needs the manifest: run collectstatic
+# before starting the server.
+
+STATIC_COMPRESSED = os.environ.get("STATIC_COMPRESSED", "False") == "True"
+
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": (
+            "app.staticfiles.CompressedManifestStaticFilesStorage"
+            if STATIC_COMPRESSED
+            else "django.contrib.staticfiles.storage.StaticFilesStorage"
+        ),
+    },
+}
+
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "mediafiles"
 
+# Background threads generating avatar thumbnails (see app.thumbnails), per worker process.
+
+THUMBNAIL_WORKERS = int(os.environ.get("THUMBNAIL_WORKERS", "2"))
+
+# Chunked clinical history uploads (see app.uploads).
+
+UPLOAD_CHUNK_MAX_SIZE = int(os.environ.get("UPLOAD_CHUNK_MAX_SIZE", str(8 * 1024 * 1024)))
+
+UPLOAD_MAX_SIZE = int(os.environ.get("UPLOAD_MAX_SIZE", str(4 * 1024 ** 3)))
+
+# Internal nginx location mapped to MEDIA_ROOT. When set, protected downloads
+# are handed to nginx with X-Accel-Redirect instead of streamed by Django.
+MEDIA_ACCEL_REDIRECT = os.environ.get("MEDIA_ACCEL_REDIRECT", "")
+
+# Scheduling
+# Working hours are expressed in TIME_ZONE; workdays use Monday=0.
+
+CLINIC_WORKING_HOURS = os.environ.get("CLINIC_WORKING_HOURS", "09:00-17:00")
+
+CLINIC_WORKDAYS = [int(day) for day in os.environ.get("CLINIC_WORKDAYS", "0 1 2 3 4").split()]
+
+CLINIC_SLOT_MINUTES = int(os.environ.get("CLINIC_SLOT_MINUTES", "30"))
+
+AVAILABILITY_CACHE_TIMEOUT = int(os.environ.get("AVAILABILITY_CACHE_TIMEOUT", "300"))
+
+# Push notifications
+# LocalBroker only reaches clients connected to the same process; use
+# app.pubsub.PostgresBroker when running several workers against PostgreSQL.
+
+PUBSUB_BACKEND = os.environ.get("PUBSUB_BACKEND", "app.pubsub.LocalBroker")
+
+INBOX_STREAM_HEARTBEAT = int(os.environ.get("INBOX_STREAM_HEARTBEAT", "15"))
+
+# Keep each user's Patient/Staff profile in the session (see app.profiles),
+# saving a query per request at the cost of a cache version check. Never
+# with signed cookie sessions, which the client can read.
+
+PROFILE_SESSION_CACHE = (
+    os.environ.get("PROFILE_SESSION_CACHE", "False") == "True" and SESSION_MODE != "signed_cookies"
+)
+
+# Patient search backend (see app.search). Empty picks the one matching the
+# database: SQLite FTS5 or PostgreSQL pg_trgm.
+
+PATIENT_SEARCH_BACKEND = os.environ.get("PATIENT_SEARCH_BACKEND", "")
+
+# Per-request instrumentation (see app.instrumentation)
+# When enabled, query counts and timings of every request are appended to
+# INSTRUMENTATION_LOG; summarize them with "manage.py query_report".
+
+INSTRUMENTATION_ENABLED = os.environ.get("INSTRUMENTATION_ENABLED", "False") == "True"
+
+INSTRUMENTATION_LOG = os.environ.get("INSTRUMENTATION_LOG", BASE_DIR / "instrumentation.jsonl")
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -15,19 +15,25 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
-from django.contrib.auth.views import LogoutView
+from django.contrib.auth.views import LoginView, LogoutView
 from django.views.generic.base import TemplateView
 
+from app.conditional import public_form_page, public_page
+from app.downloads import serve_public_media
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path("", TemplateView.as_view(template_name="home.html"), name="home"),
+    path("", public_page(TemplateView.as_view(template_name="home.html")), name="home"),
     path("app/", include('app.urls')),
+    path("auth/login/", public_form_page(LoginView.as_view()), name="login"),
     path("auth/logout/", LogoutView.as_view(template_name="logout.html"), name="logout"),
     path("auth/", include('django.contrib.auth.urls')),
 ]
 
 if bool(settings.DEBUG):
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # Clinical files are only reachable through the authorized download view.
+    urlpatterns += [
+        re_path(r'^media/(?P<path>.*)$', serve_public_media),
+    ]
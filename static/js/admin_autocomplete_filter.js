@@ -0,0 +1,18 @@
+'use strict';
+{
+    // Reload the changelist when an autocomplete list filter changes.
+    const $ = django.jQuery;
+
+    $(function () {
+        $('select.admin-autocomplete-filter').on('change', function () {
+            const params = new URLSearchParams(window.location.search);
+            params.delete('p');
+            if (this.value) {
+                params.set(this.dataset.lookup, this.value);
+            } else {
+                params.delete(this.dataset.lookup);
+            }
+            window.location.search = params.toString();
+        });
+    });
+}
@@ -0,0 +1,63 @@
+document.addEventListener('DOMContentLoaded', function () {
+    // Fill select[data-autocomplete-url] with matches of a search box, a page at a time.
+    document.querySelectorAll("select[data-autocomplete-url]").forEach(function (select) {
+        const input = document.createElement("input");
+        input.type = "search";
+        input.className = "form-control";
+        input.placeholder = "Search…";
+        input.autocomplete = "off";
+        const more = document.createElement("button");
+        more.type = "button";
+        more.className = "btn btn-link";
+        more.textContent = "More results";
+        more.hidden = true;
+        select.before(input);
+        select.after(more);
+
+        let timer = null;
+        let pending = null;
+        let next = null;
+
+        function load(append) {
+            if (pending) {
+                pending.abort();
+            }
+            pending = new AbortController();
+            const params = new URLSearchParams({q: input.value.trim()});
+            if (append && next) {
+                params.set("after", next);
+            }
+            fetch(select.dataset.autocompleteUrl + "?" + params, {signal: pending.signal})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    if (!append) {
+                        // Keep the current choice and the empty option.
+                        Array.from(select.options).forEach(function (option) {
+                            if (option.value && !option.selected) {
+                                option.remove();
+                            }
+                        });
+                    }
+                    data.results.forEach(function (result) {
+                        if (!select.querySelector('option[value="' + result.id + '"]')) {
+                            select.add(new Option(result.text, result.id));
+                        }
+                    });
+                    next = data.next;
+                    more.hidden = !next;
+                })
+                .catch(function () {});
+        }
+
+        input.addEventListener("input", function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () { load(false); }, 200);
+        });
+        input.addEventListener("focus", function () {
+            if (select.options.length <= 2) {
+                load(false);
+            }
+        }, {once: true});
+        more.addEventListener("click", function () { load(true); });
+    });
+});
@@ -0,0 +1,75 @@
+document.addEventListener('DOMContentLoaded', function () {
+    const form = document.getElementById("chunked-upload");
+
+    if (!form) {
+        return;
+    }
+
+    const progress = document.getElementById("upload-progress");
+    const status = document.getElementById("upload-status");
+    const csrfToken = document.querySelector('[name="csrf-token"]').content;
+
+    async function sha256(buffer) {
+        const digest = await crypto.subtle.digest("SHA-256", buffer);
+        return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, "0")).join("");
+    }
+
+    async function sendChunks(file, session) {
+        let offset = session.offset;
+        while (offset < file.size) {
+            const end = Math.min(offset + session.chunk_size, file.size);
+            const chunk = await file.slice(offset, end).arrayBuffer();
+            let response;
+            try {
+                response = await fetch(form.dataset.startUrl + session.id + "/", {
+                    method: "PUT",
+                    headers: {
+                        "X-CSRFToken": csrfToken,
+                        "Content-Range": "bytes " + offset + "-" + (end - 1) + "/" + file.size,
+                        "X-Chunk-SHA256": await sha256(chunk),
+                    },
+                    body: chunk,
+                });
+            } catch (e) {
+                // Connection dropped: ask the server where to resume from.
+                await new Promise(resolve => setTimeout(resolve, 2000));
+                response = await fetch(form.dataset.startUrl + session.id + "/");
+            }
+            const state = await response.json();
+            if (!response.ok && response.status !== 409) {
+                throw new Error(state.error);
+            }
+            offset = state.offset;
+            progress.value = Math.round(offset / file.size * 100);
+        }
+    }
+
+    form.addEventListener("submit", async function (e) {
+        e.preventDefault();
+        const file = form.elements.file.files[0];
+        const data = new FormData();
+        data.append("filename", file.name);
+        data.append("size", file.size);
+        data.append("name", form.elements.name.value);
+        if (form.elements.patient) {
+            data.append("patient", form.elements.patient.value);
+        }
+
+        status.textContent = "Uploading...";
+        try {
+            const response = await fetch(form.dataset.startUrl, {
+                method: "POST",
+                headers: {"X-CSRFToken": csrfToken},
+                body: data,
+            });
+            const session = await response.json();
+            if (!response.ok) {
+                throw new Error(session.error);
+            }
+            await sendChunks(file, session);
+            status.textContent = "Upload complete.";
+        } catch (err) {
+            status.textContent = "Upload failed: " + err.message;
+        }
+    });
+});
@@ -0,0 +1,23 @@
+document.addEventListener('DOMContentLoaded', function () {
+    const feed = document.getElementById("inbox-feed");
+
+    if (!feed || !window.EventSource) {
+        return;
+    }
+
+    // The browser reconnects on its own using the retry delay sent by the server.
+    const source = new EventSource(feed.dataset.streamUrl);
+
+    source.addEventListener("message", function (e) {
+        const message = JSON.parse(e.data);
+
+        const counter = document.getElementById("unread-count");
+        if (counter) {
+            counter.textContent = parseInt(counter.textContent, 10) + 1;
+        }
+
+        const item = document.createElement("li");
+        item.textContent = message.sender.name + ": " + message.subject;
+        feed.prepend(item);
+    });
+});
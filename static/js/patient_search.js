@@ -0,0 +1,45 @@
+document.addEventListener('DOMContentLoaded', function () {
+    const input = document.getElementById("patient-search");
+    const list = document.getElementById("patient-suggestions");
+
+    if (!input || !list) {
+        return;
+    }
+
+    let timer = null;
+    let pending = null;
+
+    function show(results) {
+        list.replaceChildren();
+        results.forEach(function (patient) {
+            const item = document.createElement("li");
+            item.textContent = patient.name + " <" + patient.email + "> SSN " + patient.social_sec_number;
+            item.addEventListener("click", function () {
+                input.value = patient.email;
+                input.form.submit();
+            });
+            list.appendChild(item);
+        });
+    }
+
+    input.addEventListener("input", function () {
+        clearTimeout(timer);
+        // Wait for a pause in typing, and drop the answer to an outdated query.
+        timer = setTimeout(function () {
+            if (pending) {
+                pending.abort();
+            }
+            const query = input.value.trim();
+            if (query.length < 2) {
+                show([]);
+                return;
+            }
+            pending = new AbortController();
+            const params = new URLSearchParams({q: query});
+            fetch(input.dataset.searchUrl + "?" + params, {signal: pending.signal})
+                .then(function (response) { return response.json(); })
+                .then(function (data) { show(data.results); })
+                .catch(function () {});
+        }, 150);
+    });
+});